@@ -0,0 +1 @@
+Add `aioredis.Codec`, a value codec passed as `codec=` to `Redis`, `ConnectionPool` or `Connection`. It serializes values the encoder can't send natively (with `json`, `pickle`, `msgpack`, ...) and compresses large values with zlib, lz4 or zstd, marking encoded values with a five byte header so they decode transparently on read. Only the values of string, hash, list and set commands and PUBLISH messages are encoded; keys and all other arguments are sent as they are, and replies without the header or that can't be decoded are returned unchanged.
@@ -0,0 +1 @@
+Add `CommandHook` instrumentation hooks around command and pipeline execution via `Redis.add_command_hook()`.
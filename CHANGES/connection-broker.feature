@@ -0,0 +1 @@
+Add `aioredis.broker.Broker`, which shares one connection pool between local processes over a Unix socket so server connection counts stay flat as worker counts grow.
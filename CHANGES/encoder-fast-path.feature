@@ -0,0 +1 @@
+Speed up `Encoder.encode` and `pack_command`: exact str, bytes, int and float arguments are dispatched on their type, small integers and RESP length prefixes come from a precomputed cache, and floats are formatted straight to bytes.
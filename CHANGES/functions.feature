@@ -0,0 +1 @@
+Add Redis 7 Functions support: `function_load`, `function_list`, `function_delete`, `function_flush`, `function_dump`, `function_restore`, `function_kill`, `function_stats`, `fcall` and `fcall_ro`, and `register_library()`, which returns a `Library` that loads its code only on servers that don't have it yet.
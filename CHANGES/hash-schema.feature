@@ -0,0 +1 @@
+Add `aioredis.schema.HashSchema`, which declares the fields and types of a kind of hash once and reads hashes into compact `namedtuple` records converted in one pass, and writes them from a precomputed field list.
@@ -0,0 +1 @@
+Speed up parsing of INFO, CLIENT LIST and CLUSTER NODES replies. `Redis.info()` and `Redis.client_list()` accept `fields` to only keep the named fields and `lazy` to defer parsing until a value is accessed, and `diff_info()`/`diff_client_list()` compare consecutive polls.
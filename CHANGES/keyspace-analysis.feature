@@ -0,0 +1 @@
+Add `aioredis.keyspace.analyze_keyspace()`, which scans the keyspace and yields the type, TTL and memory usage of every key. The lookups for each SCAN page are pipelined, optionally over several pool connections, and overlap with the next SCAN.
@@ -0,0 +1 @@
+Add `aioredis.numeric`, which returns large numeric replies (ZRANGE/ZRANGEBYSCORE scores, MGET, HMGET, LRANGE) as `array.array` or NumPy arrays parsed in one pass, with sorted set members in a parallel list.
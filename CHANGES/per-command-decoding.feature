@@ -0,0 +1 @@
+Commands accept a `decode` option, e.g. `execute_command("GET", key, decode=False)`, which overrides `decode_responses` for that reply only, in plain commands as well as pipelines and transactions. Parsers and `Connection.read_response` take a matching `disable_decoding` argument.
@@ -0,0 +1 @@
+Pipelines resolve each command's response callback once when the command is queued and skip the awaitable check for the built-in callbacks; `Pipeline.execute(lazy_callbacks=True)` returns a `PipelineResults` sequence that only parses a reply when it is first accessed.
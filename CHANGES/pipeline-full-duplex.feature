@@ -0,0 +1 @@
+Non-transactional pipelines whose packed request exceeds 64 KiB are now written from a separate task while the replies are read, instead of reading only after the whole request has been written.
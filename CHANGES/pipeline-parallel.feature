@@ -0,0 +1 @@
+`Pipeline.execute(parallel=K)` splits a non-transactional pipeline into K slices that run concurrently on separate pool connections, then merges the replies in command order.
@@ -0,0 +1 @@
+Add `Pipeline.stream()`, which pipelines an (async) iterable of commands on one connection with at most `window` commands in flight and yields replies as they arrive.
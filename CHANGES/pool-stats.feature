@@ -0,0 +1 @@
+Add opt-in connection pool statistics (`collect_stats=True`) with checkout, connect and per-command latency histograms, and `ConnectionPool.get_stats()` snapshots.
@@ -0,0 +1 @@
+PubSub message handlers may be async: they run on a bounded set of worker tasks (`AsyncHandler`) with configurable concurrency, optional per-channel ordering and backpressure on the pubsub connection when their queue fills.
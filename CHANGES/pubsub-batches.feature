@@ -0,0 +1 @@
+Add `PubSub.get_messages()` and `PubSub.listen_batches()` to receive all buffered pubsub messages in one call, bounded by a message count or payload byte budget.
@@ -0,0 +1 @@
+Add `message_format="compact"` (a `PubSubMessage` named tuple) and `message_format="raw"` to `PubSub`; message types are now interned instead of being decoded for every message.
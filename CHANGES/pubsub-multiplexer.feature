@@ -0,0 +1 @@
+Add `aioredis.multiplexer.PubSubMultiplexer`, which shares reference-counted channel and pattern subscriptions of many local consumers over a few sharded pubsub connections.
@@ -0,0 +1 @@
+Multiplexer subscriptions can bound their queues (`max_queue_size`) with a `block`, `drop_oldest`, `drop_newest` or `disconnect` overflow policy, and count dropped messages.
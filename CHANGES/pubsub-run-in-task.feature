@@ -0,0 +1 @@
+Add `PubSub.run_in_task()`, which handles messages on an asyncio task on the current loop with clean stop, join and exception handler support.
@@ -0,0 +1 @@
+Add `scan_batches()`, `sscan_batches()`, `hscan_batches()` and `zscan_batches()`, which yield a whole SCAN page at a time. They send the next SCAN while the caller processes the current page, and can adapt COUNT so that each call takes a target latency.
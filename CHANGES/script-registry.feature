@@ -0,0 +1 @@
+Track the Lua scripts each connection pool has registered, and which of them each of its servers has loaded, in a `ScriptRegistry`. Connections checked out of the pool load the registered scripts their server isn't known to have when they connect, pipelines skip the `SCRIPT EXISTS` round trip when their scripts are known to be cached, and reconnects, `SCRIPT FLUSH` or unexpected `NOSCRIPT` errors invalidate what is known.
@@ -1,4 +1,5 @@
 from aioredis.client import Redis, StrictRedis
+from aioredis.codecs import Codec
 from aioredis.connection import (
     BlockingConnectionPool,
     Connection,
@@ -40,6 +41,7 @@ __all__ = [
     "BlockingConnectionPool",
     "BusyLoadingError",
     "ChildDeadlockedError",
+    "Codec",
     "Connection",
     "ConnectionError",
     "ConnectionPool",
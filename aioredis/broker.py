@@ -0,0 +1,456 @@
+"""
+A local connection broker that lets several processes share one pool of
+Redis connections.
+
+Connection pools are per-process: after a fork every worker builds its own
+pool, so N workers hold N times as many server connections. A
+:class:`Broker` runs in a single process (the parent, or a sidecar started
+with ``python -m aioredis.broker``), owns the only pool of connections to
+Redis and listens on a Unix socket. Workers point their clients at that
+socket and their commands are relayed over the broker's pool::
+
+    # in the process owning the connections
+    broker = Broker("/run/app/redis.sock", host="redis.internal", max_connections=16)
+    await broker.start()
+
+    # in every worker
+    redis = aioredis.Redis(unix_socket_path="/run/app/redis.sock")
+
+The broker speaks plain RESP to the workers and forwards requests without
+decoding them, pipelining every batch of commands a worker has sent onto a
+single pooled connection. Commands that need connection state are handled
+specially:
+
+* ``MULTI``/``WATCH`` pin a pooled connection to the worker until the
+  transaction ends with ``EXEC``, ``DISCARD`` or ``UNWATCH``.
+* ``SUBSCRIBE``, ``PSUBSCRIBE`` and ``MONITOR`` hand a pooled connection to
+  the worker for the rest of its connection's lifetime.
+* ``AUTH``, ``CLIENT SETNAME`` and ``QUIT`` are answered by the broker, and
+  ``SELECT`` only succeeds for the database the broker's pool uses.
+
+The pool is a :class:`~aioredis.connection.BlockingConnectionPool` by
+default, so once ``max_connections`` are busy, workers wait for one to be
+released instead of failing.
+"""
+import argparse
+import asyncio
+import os
+import stat
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import async_timeout
+
+from .connection import BlockingConnectionPool, Connection, ConnectionPool
+from .exceptions import ConnectionError, TimeoutError
+from .log import logger
+
+READ_SIZE = 65536
+
+# commands answered by the broker itself
+LOCAL_COMMANDS = frozenset((b"AUTH", b"QUIT", b"SELECT", b"CLIENT"))
+# commands after which the worker connection only streams server pushes
+BRIDGE_COMMANDS = frozenset((b"SUBSCRIBE", b"PSUBSCRIBE", b"MONITOR"))
+# commands which tie the following commands to the same server connection
+PIN_COMMANDS = frozenset((b"MULTI", b"WATCH"))
+
+
+def frame_end(buffer: bytearray, pos: int) -> Optional[int]:
+    """
+    Return the position right after the RESP value starting at ``pos``, or
+    None if ``buffer`` doesn't hold all of it yet. Inline commands (a line
+    that isn't a RESP array) are framed by their line ending.
+    """
+    end = buffer.find(b"\r\n", pos)
+    if end == -1:
+        return None
+    kind = buffer[pos]
+    if kind == 36:  # $
+        length = int(buffer[pos + 1 : end])
+        if length < 0:
+            return end + 2
+        stop = end + length + 4
+        return stop if len(buffer) >= stop else None
+    if kind == 42:  # *
+        count = int(buffer[pos + 1 : end])
+        pos = end + 2
+        for _ in range(max(count, 0)):
+            pos = frame_end(buffer, pos)
+            if pos is None:
+                return None
+        return pos
+    return end + 2
+
+
+def request_args(request: bytes) -> List[bytes]:
+    """Split a framed request into its arguments"""
+    if request[:1] != b"*":
+        return request.split()
+    args = []
+    pos = request.index(b"\r\n") + 2
+    while pos < len(request):
+        end = request.index(b"\r\n", pos)
+        start = end + 2
+        stop = start + int(request[pos + 1 : end])
+        args.append(request[start:stop])
+        pos = stop + 2
+    return args
+
+
+def command_name(request: bytes) -> bytes:
+    """The upper-cased name of a framed request's command"""
+    if request[:1] != b"*":
+        return request.split(None, 1)[0].upper() if request.strip() else b""
+    pos = request.index(b"\r\n") + 2
+    end = request.index(b"\r\n", pos)
+    start = end + 2
+    return request[start : start + int(request[pos + 1 : end])].upper()
+
+
+def error_reply(message: str) -> bytes:
+    return b"-" + message.replace("\r\n", " ").encode() + b"\r\n"
+
+
+class BrokerSession:
+    """Relays the requests of a single worker connection"""
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ):
+        self.pool = pool
+        self.reader = reader
+        self.writer = writer
+        self.db = int(pool.connection_kwargs.get("db") or 0)
+        self.pinned: Optional[Connection] = None
+        self.in_multi = False
+        self.closing = False
+
+    async def run(self):
+        buffer = bytearray()
+        try:
+            while not self.closing:
+                data = await self.reader.read(READ_SIZE)
+                if not data:
+                    break
+                buffer += data
+                requests = []
+                pos = 0
+                while pos < len(buffer):
+                    end = frame_end(buffer, pos)
+                    if end is None:
+                        break
+                    request = bytes(buffer[pos:end])
+                    pos = end
+                    name = command_name(request)
+                    if name:
+                        requests.append((name, request))
+                del buffer[:pos]
+                if requests:
+                    bridge = await self.handle(requests, buffer)
+                    if bridge:
+                        return
+                await self.writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            if self.pinned is not None:
+                # the worker went away mid transaction, drop the server side
+                # MULTI/WATCH state along with the connection
+                await self.pinned.disconnect()
+                await self.pool.release(self.pinned)
+                self.pinned = None
+            self.writer.close()
+
+    async def handle(self, requests: List[Tuple[bytes, bytes]], rest: bytearray):
+        """
+        Forward ``requests`` in as few round trips as possible. Returns True
+        if the session switched to bridging a pubsub or monitor connection.
+        """
+        batch: List[bytes] = []
+        for i, (name, request) in enumerate(requests):
+            if name in BRIDGE_COMMANDS and not self.in_multi:
+                await self.flush(batch)
+                pending = b"".join(r for _, r in requests[i:]) + bytes(rest)
+                await self.bridge(pending)
+                return True
+            if name in LOCAL_COMMANDS and not self.in_multi:
+                reply = self.local_reply(name, request)
+                if reply is not None:
+                    await self.flush(batch)
+                    batch = []
+                    self.writer.write(reply)
+                    if self.closing:
+                        return False
+                    continue
+            if name in PIN_COMMANDS and self.pinned is None:
+                await self.flush(batch)
+                batch = []
+                self.pinned = await self.pool.get_connection(name.decode())
+            batch.append(request)
+            if name == b"MULTI":
+                self.in_multi = True
+            elif name in (b"EXEC", b"DISCARD") or (
+                name == b"UNWATCH" and not self.in_multi
+            ):
+                self.in_multi = False
+                await self.flush(batch)
+                batch = []
+                await self.unpin()
+        await self.flush(batch)
+        return False
+
+    def local_reply(self, name: bytes, request: bytes) -> Optional[bytes]:
+        """The broker's own reply to ``request``, or None to forward it"""
+        if name == b"AUTH":
+            # workers are trusted by having access to the socket, the broker
+            # authenticates its own connections
+            return b"+OK\r\n"
+        if name == b"QUIT":
+            self.closing = True
+            return b"+OK\r\n"
+        args = request_args(request)
+        if name == b"SELECT":
+            try:
+                db = int(args[1])
+            except (IndexError, ValueError):
+                return error_reply("ERR invalid DB index")
+            if db != self.db:
+                return error_reply(f"ERR broker only serves database {self.db}")
+            return b"+OK\r\n"
+        if name == b"CLIENT" and len(args) > 1 and args[1].upper() == b"SETNAME":
+            return b"+OK\r\n"
+        return None
+
+    async def unpin(self):
+        connection, self.pinned = self.pinned, None
+        if connection is not None:
+            await self.pool.release(connection)
+
+    async def flush(self, batch: List[bytes]):
+        """Send ``batch`` and relay its replies to the worker"""
+        if not batch:
+            return
+        connection = self.pinned
+        was_pinned = connection is not None
+        if not was_pinned:
+            connection = await self.pool.get_connection("_")
+        replies = 0
+        try:
+            await connection.send_packed_command(batch, check_health=False)
+            async for chunk, count in self.read_replies(connection, len(batch)):
+                self.writer.write(chunk)
+                replies += count
+        except (ConnectionError, TimeoutError, OSError, asyncio.TimeoutError) as e:
+            await connection.disconnect()
+            self.writer.write(error_reply(f"ERR broker: {e}") * (len(batch) - replies))
+            if was_pinned:
+                self.in_multi = False
+                await self.unpin()
+        except asyncio.CancelledError:
+            # replies may be left unread on the connection
+            await connection.disconnect()
+            raise
+        finally:
+            # a pinned connection is released by unpin()
+            if not was_pinned:
+                await self.pool.release(connection)
+
+    async def read_replies(self, connection: Connection, count: int):
+        """
+        Read ``count`` raw replies from ``connection``, yielding complete
+        replies as soon as they're available along with how many they are.
+        """
+        reader = connection._reader
+        if reader is None:
+            raise ConnectionError("Connection closed by server.")
+        buffer = bytearray()
+        while count:
+            async with async_timeout.timeout(connection.socket_timeout):
+                data = await reader.read(READ_SIZE)
+            if not data:
+                raise ConnectionError("Connection closed by server.")
+            buffer += data
+            pos = 0
+            done = 0
+            while done < count:
+                end = frame_end(buffer, pos)
+                if end is None:
+                    break
+                pos = end
+                done += 1
+            if done:
+                yield bytes(buffer[:pos]), done
+                del buffer[:pos]
+                count -= done
+        if buffer:
+            raise ConnectionError("Unexpected data after the last reply")
+
+    async def bridge(self, pending: bytes):
+        """Hand a pooled connection to the worker until either side closes"""
+        connection = await self.pool.get_connection("_")
+        pumps: List[asyncio.Future] = []
+        try:
+            await connection.send_packed_command(pending, check_health=False)
+            pumps.append(
+                asyncio.ensure_future(self.pump(self.reader, connection._writer))
+            )
+            pumps.append(
+                asyncio.ensure_future(self.pump(connection._reader, self.writer))
+            )
+            await asyncio.wait(pumps, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            # stop the direction that is still running
+            for pump in pumps:
+                pump.cancel()
+            if pumps:
+                await asyncio.wait(pumps)
+            # pubsub and monitor state can't be reset, so the connection is
+            # closed before it goes back to the pool
+            await connection.disconnect()
+            await self.pool.release(connection)
+
+    @staticmethod
+    async def pump(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    return
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+
+
+class Broker:
+    """
+    Serve ``connection_pool`` to other processes over the Unix socket at
+    ``path``. Without a pool, a :class:`~aioredis.connection.BlockingConnectionPool`
+    is created from ``pool_kwargs``.
+
+    ``mode`` sets the socket file's permissions, which are the only access
+    control the broker applies to workers.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        connection_pool: Optional[ConnectionPool] = None,
+        mode: int = 0o600,
+        **pool_kwargs,
+    ):
+        self.path = path
+        self.mode = mode
+        self.connection_pool = connection_pool or BlockingConnectionPool(**pool_kwargs)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._closed: Optional[asyncio.Event] = None
+        # the task running each worker connection's session
+        self._sessions: Dict[BrokerSession, asyncio.Future] = {}
+
+    @classmethod
+    def from_url(cls, url: str, path: str, mode: int = 0o600, **kwargs):
+        """Create a broker relaying to the server at ``url``"""
+        pool = BlockingConnectionPool.from_url(url, **kwargs)
+        return cls(path, connection_pool=pool, mode=mode)
+
+    @property
+    def sessions(self) -> int:
+        """The number of worker connections currently being served"""
+        return len(self._sessions)
+
+    async def start(self):
+        self._remove_stale_socket()
+        self._closed = asyncio.Event()
+        self._server = await asyncio.start_unix_server(self._serve, path=self.path)
+        os.chmod(self.path, self.mode)
+        logger.debug("Broker listening on %s", self.path)
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        await self._closed.wait()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            self._closed.set()
+        # closing a worker's connection ends its session, which returns any
+        # pooled connection it holds. sessions waiting for a pooled
+        # connection don't notice, so they are cancelled as well
+        tasks = list(self._sessions.values())
+        for session in self._sessions:
+            session.writer.close()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.connection_pool.disconnect()
+        self._remove_stale_socket()
+
+    async def __aenter__(self) -> "Broker":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def _remove_stale_socket(self):
+        try:
+            if stat.S_ISSOCK(os.stat(self.path).st_mode):
+                os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = BrokerSession(self.connection_pool, reader, writer)
+        task = asyncio.ensure_future(session.run())
+        self._sessions[session] = task
+        try:
+            await task
+        except asyncio.CancelledError:
+            # cancelled by close()
+            pass
+        except Exception:
+            logger.exception("Broker session failed")
+            writer.close()
+        finally:
+            self._sessions.pop(session, None)
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m aioredis.broker",
+        description="Share a pool of Redis connections with local processes.",
+    )
+    parser.add_argument("path", help="Unix socket to listen on")
+    parser.add_argument(
+        "--url",
+        default="redis://localhost:6379/0",
+        help="server to relay to (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max-connections",
+        type=int,
+        default=16,
+        help="connections held to the server (default: %(default)s)",
+    )
+    args = parser.parse_args(argv)
+    broker = Broker.from_url(args.url, args.path, max_connections=args.max_connections)
+
+    async def serve():
+        try:
+            await broker.serve_forever()
+        finally:
+            await broker.close()
+
+    try:
+        asyncio.get_event_loop().run_until_complete(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,16 @@
 import asyncio
 import datetime
+import functools
 import hashlib
 import inspect
+import itertools
 import re
+import sys
 import threading
 import time
 import time as mod_time
 import warnings
+from collections import deque
 from itertools import chain
 from typing import (
     Any,
@@ -15,19 +19,24 @@ from typing import (
     Awaitable,
     Callable,
     Collection,
+    Deque,
     Dict,
     Iterable,
+    Iterator,
     List,
     Mapping,
+    NamedTuple,
     NoReturn,
     Optional,
     Sequence,
+    Set,
     Tuple,
     Type,
     TypeVar,
     Union,
 )
 
+from aioredis.codecs import Codec
 from aioredis.compat import Protocol, TypedDict
 from aioredis.connection import (
     Connection,
@@ -41,6 +50,7 @@ from aioredis.exceptions import (
     DataError,
     ExecAbortError,
     ModuleError,
+    NoFunctionError,
     NoScriptError,
     PubSubError,
     RedisError,
@@ -48,11 +58,23 @@ from aioredis.exceptions import (
     TimeoutError,
     WatchError,
 )
+from aioredis.hooks import (
+    CommandContext,
+    CommandHook,
+    run_after_reply,
+    run_before_send,
+    run_on_error,
+)
 from aioredis.lock import Lock
+from aioredis.log import logger
 from aioredis.utils import safe_str, str_if_bytes
 
 SYM_EMPTY = b""
 EMPTY_RESPONSE = "EMPTY_RESPONSE"
+# default COUNT of SCAN commands, also used as the lower bound when adapting it
+MIN_SCAN_COUNT = 10
+# command option overriding decode_responses for a single reply
+DECODE_OPTION = "decode"
 
 
 def list_or_args(keys, args):
@@ -139,50 +161,142 @@ def parse_object(response, infotype):
     return response
 
 
-def parse_info(response):
-    """Parse the result of Redis's INFO command into a Python dict"""
-    info = {}
-    response = str_if_bytes(response)
+class LazyMapping(Mapping):
+    """
+    A read-only mapping built by ``parse(raw)`` the first time it is
+    accessed. Two unparsed instances compare by their raw text, which lets
+    ``diff_info`` skip parsing sections that didn't change.
+    """
 
-    def get_value(value):
-        if "," not in value or "=" not in value:
-            try:
-                if "." in value:
-                    return float(value)
-                else:
-                    return int(value)
-            except ValueError:
-                return value
-        else:
-            sub_dict = {}
-            for item in value.split(","):
-                k, v = item.rsplit("=", 1)
-                sub_dict[k] = get_value(v)
-            return sub_dict
-
-    for line in response.splitlines():
-        if line and not line.startswith("#"):
-            if line.find(":") != -1:
-                # Split, the info fields keys and values.
-                # Note that the value may contain ':'. but the 'host:'
-                # pseudo-command is the only case where the key contains ':'
-                key, value = line.split(":", 1)
-                if key == "cmdstat_host":
-                    key, value = line.rsplit(":", 1)
-
-                if key == "module":
-                    # Hardcode a list for key 'modules' since there could be
-                    # multiple lines that started with 'module'
-                    info.setdefault("modules", []).append(get_value(value))
-                else:
-                    info[key] = get_value(value)
-            else:
-                # if the line isn't splittable, append it to the "__raw__" key
+    __slots__ = ("_raw", "_parse", "_data")
+
+    def __init__(self, raw: str, parse: Callable[[str], Dict[str, Any]]):
+        self._raw: Optional[str] = raw
+        self._parse = parse
+        self._data: Optional[Dict[str, Any]] = None
+
+    def _get(self) -> Dict[str, Any]:
+        if self._data is None:
+            self._data = self._parse(self._raw)
+            self._raw = None
+        return self._data
+
+    def __getitem__(self, key):
+        return self._get()[key]
+
+    def __iter__(self):
+        return iter(self._get())
+
+    def __len__(self):
+        return len(self._get())
+
+    def __eq__(self, other):
+        if (
+            isinstance(other, LazyMapping)
+            and self._raw is not None
+            and other._raw is not None
+        ):
+            return self._raw == other._raw
+        return super().__eq__(other)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self._get()!r})"
+
+
+def _info_value(value: str):
+    if "," not in value or "=" not in value:
+        try:
+            if "." in value:
+                return float(value)
+            return int(value)
+        except ValueError:
+            return value
+    return _info_sub_dict(value)
+
+
+def _info_sub_dict(value: str) -> Dict[str, Any]:
+    sub_dict = {}
+    for item in value.split(","):
+        k, v = item.rsplit("=", 1)
+        sub_dict[k] = _info_value(v)
+    return sub_dict
+
+
+def _field_filter(fields: Iterable[str]) -> Callable[[str], bool]:
+    """
+    Return a predicate for the names in ``fields``, where a trailing ``*``
+    matches any name with that prefix
+    """
+    fields = tuple(fields)
+    exact = {field for field in fields if not field.endswith("*")}
+    prefixes = tuple(field[:-1] for field in fields if field.endswith("*"))
+    if not prefixes:
+        return exact.__contains__
+    return lambda name: name in exact or name.startswith(prefixes)
+
+
+def parse_info(response, fields=None, lazy=False, **options):
+    """
+    Parse the result of Redis's INFO command into a Python dict
+
+    ``fields`` limits the result to the given keys; a trailing ``*`` selects
+    every key with that prefix, e.g. ``"cmdstat_*"``. Other lines are
+    skipped without converting their values. With ``lazy``, compound values
+    such as ``db0`` or ``cmdstat_get`` are returned as ``LazyMapping``
+    objects that only parse their contents when accessed.
+    """
+    info = {}
+    wanted = _field_filter(fields) if fields is not None else None
+
+    for line in str_if_bytes(response).splitlines():
+        if not line or line[0] == "#":
+            continue
+        # Split, the info fields keys and values.
+        # Note that the value may contain ':'. but the 'host:'
+        # pseudo-command is the only case where the key contains ':'
+        key, sep, value = line.partition(":")
+        if not sep:
+            # if the line isn't splittable, append it to the "__raw__" key
+            if wanted is None or wanted("__raw__"):
                 info.setdefault("__raw__", []).append(line)
+            continue
+        if key == "cmdstat_host":
+            key, value = line.rsplit(":", 1)
+        if key == "module":
+            # Hardcode a list for key 'modules' since there could be
+            # multiple lines that started with 'module'
+            if wanted is None or wanted("modules"):
+                info.setdefault("modules", []).append(_info_value(value))
+            continue
+        if wanted is not None and not wanted(key):
+            continue
+        if lazy and "," in value and "=" in value:
+            info[key] = LazyMapping(value, _info_sub_dict)
+        else:
+            info[key] = _info_value(value)
 
     return info
 
 
+def diff_info(
+    previous: Mapping[str, Any], current: Mapping[str, Any]
+) -> Dict[str, Tuple[Any, Any]]:
+    """
+    Compare two parsed INFO replies, e.g. from consecutive polls of the same
+    server, and return the keys whose value changed mapped to
+    ``(previous_value, current_value)``. Keys that only appear in one of the
+    replies have ``None`` on the other side.
+    """
+    changes = {}
+    for key, value in current.items():
+        old = previous.get(key)
+        if old != value:
+            changes[key] = (old, value)
+    for key in previous.keys() - current.keys():
+        changes[key] = (previous[key], None)
+    return changes
+
+
 def parse_memory_stats(response, **kwargs):
     """Parse the results of MEMORY STATS"""
     stats = pairs_to_dict(response, decode_keys=True, decode_string_values=True)
@@ -386,6 +500,35 @@ def float_or_none(response):
     return float(response)
 
 
+def is_library_exists_error(error: ResponseError) -> bool:
+    return str(error).endswith("already exists")
+
+
+def function_restore_args(payload: bytes, policy: Optional[str]) -> List[EncodableT]:
+    pieces: List[EncodableT] = [payload]
+    if policy is not None:
+        if policy.upper() not in ("APPEND", "REPLACE", "FLUSH"):
+            raise DataError("policy must be one of APPEND, REPLACE or FLUSH")
+        pieces.append(policy)
+    return pieces
+
+
+def is_flush_policy(policy: Optional[str]) -> bool:
+    return policy is not None and policy.upper() == "FLUSH"
+
+
+def parse_function_list(response, **options):
+    libraries = []
+    for item in response:
+        library = pairs_to_dict(item, decode_keys=True)
+        library["functions"] = [
+            pairs_to_dict(function, decode_keys=True)
+            for function in library["functions"]
+        ]
+        libraries.append(library)
+    return libraries
+
+
 def bool_ok(response):
     return str_if_bytes(response) == "OK"
 
@@ -398,14 +541,61 @@ def parse_zadd(response, **options):
     return int(response)
 
 
-def parse_client_list(response, **options):
+def _parse_client_line(line: str) -> Dict[str, str]:
+    # Values might contain '='
+    return dict(pair.split("=", 1) for pair in line.split(" "))
+
+
+def parse_client_list(response, fields=None, lazy=False, **options):
+    """
+    Parse CLIENT LIST into a list of dicts, one per client
+
+    ``fields`` limits every dict to the given field names, which is much
+    cheaper for long client lists. With ``lazy``, each client is returned
+    as a ``LazyMapping`` that only parses its line when accessed.
+    """
+    lines = str_if_bytes(response).splitlines()
+    if lazy:
+        return [LazyMapping(line, _parse_client_line) for line in lines]
+    if fields is None or not lines:
+        return [_parse_client_line(line) for line in lines]
+    fields = tuple(fields)
+
+    # the server writes the fields of every client in the same order, so
+    # their positions are taken from the first line
+    names = [pair.split("=", 1)[0] for pair in lines[0].split(" ")]
+    positions = [
+        (names.index(field), len(field) + 1, field)
+        for field in fields
+        if field in names
+    ]
     clients = []
-    for c in str_if_bytes(response).splitlines():
-        # Values might contain '='
-        clients.append(dict(pair.split("=", 1) for pair in c.split(" ")))
+    for line in lines:
+        pairs = line.split(" ")
+        if len(pairs) == len(names):
+            clients.append({field: pairs[i][start:] for i, start, field in positions})
+        else:
+            client = _parse_client_line(line)
+            clients.append({f: client[f] for f in fields if f in client})
     return clients
 
 
+def diff_client_list(
+    previous: Iterable[Mapping[str, str]],
+    current: Iterable[Mapping[str, str]],
+    key: str = "id",
+) -> Tuple[List[Mapping[str, str]], List[Mapping[str, str]]]:
+    """
+    Compare two parsed CLIENT LIST replies and return the clients that
+    connected and disconnected in between, identified by ``key``
+    """
+    before = {client[key]: client for client in previous}
+    after = {client[key]: client for client in current}
+    connected = [client for id_, client in after.items() if id_ not in before]
+    disconnected = [client for id_, client in before.items() if id_ not in after]
+    return connected, disconnected
+
+
 def parse_config_get(response, **options):
     response = [str_if_bytes(i) if i is not None else None for i in response]
     return response and pairs_to_dict(response) or {}
@@ -416,6 +606,20 @@ def parse_scan(response, **options):
     return int(cursor), r
 
 
+def adapt_scan_count(
+    count: int, elapsed: float, target_latency: float, max_count: int
+) -> int:
+    """
+    Scale a SCAN COUNT towards ``target_latency`` given that the last call
+    with ``count`` took ``elapsed`` seconds. The count changes by at most a
+    factor of two per call and stays between ``MIN_SCAN_COUNT`` and
+    ``max_count``.
+    """
+    factor = target_latency / elapsed if elapsed > 0 else 2.0
+    factor = min(2.0, max(0.5, factor))
+    return max(MIN_SCAN_COUNT, min(max_count, int(count * factor)))
+
+
 def parse_hscan(response, **options):
     cursor, r = response
     return int(cursor), r and pairs_to_dict(r) or {}
@@ -448,7 +652,7 @@ def parse_cluster_info(response, **options):
 
 def _parse_node_line(line):
     line_items = line.split(" ")
-    node_id, addr, flags, master_id, ping, pong, epoch, connected = line.split(" ")[:8]
+    node_id, addr, flags, master_id, ping, pong, epoch, connected = line_items[:8]
     slots = [sl.split("-") for sl in line_items[8:]]
     node_dict = {
         "node_id": node_id,
@@ -465,7 +669,7 @@ def _parse_node_line(line):
 
 def parse_cluster_nodes(response, **options):
     raw_lines = str_if_bytes(response).splitlines()
-    return dict(_parse_node_line(line) for line in raw_lines)
+    return dict(map(_parse_node_line, raw_lines))
 
 
 def parse_georadius_generic(response, **options):
@@ -702,6 +906,12 @@ class Redis:
         "INFO": parse_info,
         "LASTSAVE": timestamp_to_datetime,
         "MEMORY PURGE": bool_ok,
+        "FUNCTION DELETE": bool_ok,
+        "FUNCTION FLUSH": bool_ok,
+        "FUNCTION KILL": bool_ok,
+        "FUNCTION LIST": parse_function_list,
+        "FUNCTION LOAD": str_if_bytes,
+        "FUNCTION RESTORE": bool_ok,
         "MEMORY STATS": parse_memory_stats,
         "MEMORY USAGE": int_or_none,
         "MODULE LOAD": parse_module_result,
@@ -815,6 +1025,8 @@ class Redis:
         health_check_interval: int = 0,
         client_name: str = None,
         username: str = None,
+        collect_stats: bool = False,
+        codec: Optional[Codec] = None,
     ):
         kwargs: Dict[str, Any]
         if not connection_pool:
@@ -830,6 +1042,8 @@ class Redis:
                 "max_connections": max_connections,
                 "health_check_interval": health_check_interval,
                 "client_name": client_name,
+                "collect_stats": collect_stats,
+                "codec": codec,
             }
             # based on input, setup appropriate connection args
             if unix_socket_path is not None:
@@ -866,6 +1080,7 @@ class Redis:
         self.connection_pool = connection_pool
         self.single_connection_client = single_connection_client
         self.connection = None
+        self.command_hooks: List[CommandHook] = []
 
         self.response_callbacks = CaseInsensitiveDict(self.__class__.RESPONSE_CALLBACKS)
 
@@ -884,6 +1099,18 @@ class Redis:
         """Set a custom Response Callback"""
         self.response_callbacks[command] = callback
 
+    def add_command_hook(self, hook: CommandHook):
+        """
+        Register a :py:class:`~aioredis.hooks.CommandHook` that is notified
+        before each command is sent, after its reply is parsed, and on errors.
+        Pipelines created by this client afterwards share the same hooks.
+        """
+        self.command_hooks.append(hook)
+
+    def remove_command_hook(self, hook: CommandHook):
+        """Unregister a hook previously added with ``add_command_hook``"""
+        self.command_hooks.remove(hook)
+
     def pipeline(self, transaction: bool = True, shard_hint: str = None) -> "Pipeline":
         """
         Return a new pipeline object that can queue multiple commands for
@@ -893,7 +1120,11 @@ class Redis:
         between the client and server.
         """
         return Pipeline(
-            self.connection_pool, self.response_callbacks, transaction, shard_hint
+            self.connection_pool,
+            self.response_callbacks,
+            transaction,
+            shard_hint,
+            command_hooks=self.command_hooks,
         )
 
     async def transaction(
@@ -1000,9 +1231,11 @@ class Redis:
         return Monitor(self.connection_pool)
 
     def client(self) -> "Redis":
-        return self.__class__(
+        client = self.__class__(
             connection_pool=self.connection_pool, single_connection_client=True
         )
+        client.command_hooks = self.command_hooks
+        return client
 
     __aenter__ = initialize
 
@@ -1032,25 +1265,56 @@ class Redis:
         pool = self.connection_pool
         command_name = args[0]
         conn = self.connection or await pool.get_connection(command_name, **options)
+        stats = pool.stats
+        if stats is not None:
+            started = time.monotonic()
+        hooks = self.command_hooks
+        if hooks:
+            context = CommandContext(command_name, args, conn)
         try:
-            await conn.send_command(*args)
-            return await self.parse_response(conn, command_name, **options)
-        except (ConnectionError, TimeoutError) as e:
-            await conn.disconnect()
-            if not (conn.retry_on_timeout and isinstance(e, TimeoutError)):
-                raise
-            await conn.send_command(*args)
-            return await self.parse_response(conn, command_name, **options)
+            if hooks:
+                run_before_send(hooks, context)
+            try:
+                await conn.send_command(*args)
+                response = await self.parse_response(conn, command_name, **options)
+            except (ConnectionError, TimeoutError) as e:
+                await conn.disconnect()
+                if not (conn.retry_on_timeout and isinstance(e, TimeoutError)):
+                    raise
+                await conn.send_command(*args)
+                response = await self.parse_response(conn, command_name, **options)
+        except Exception as e:
+            if hooks:
+                run_on_error(hooks, context, e)
+            raise
         finally:
+            if stats is not None:
+                stats.record_command(command_name, time.monotonic() - started)
             if not self.connection:
                 await pool.release(conn)
+        if hooks:
+            run_after_reply(hooks, context, response)
+        return response
 
     async def parse_response(
         self, connection: Connection, command_name: Union[str, bytes], **options
     ):
-        """Parses a response from the Redis server"""
+        """
+        Parses a response from the Redis server
+
+        A ``decode`` option of True or False, as in
+        ``execute_command("GET", "key", decode=False)``, overrides the
+        connection's ``decode_responses`` for this reply only.
+        """
         try:
-            response = await connection.read_response()
+            # not passed on, as many response callbacks take no options
+            decode = options.pop(DECODE_OPTION, None)
+            if decode is None or decode == connection.encoder.decode_responses:
+                response = await connection.read_response()
+            else:
+                response = connection.encoder.decode_as(
+                    await connection.read_response(disable_decoding=True), decode
+                )
         except ResponseError:
             if EMPTY_RESPONSE in options:
                 return options[EMPTY_RESPONSE]
@@ -1358,20 +1622,28 @@ class Redis:
             )
         return self.execute_command("CLIENT KILL", *args)
 
-    def client_list(self, _type: str = None) -> Awaitable:
+    def client_list(
+        self, _type: str = None, fields: Iterable[str] = None, lazy: bool = False
+    ) -> Awaitable:
         """
         Returns a list of currently connected clients.
         If type of client specified, only that type will be returned.
         :param _type: optional. one of the client types (normal, master,
          replica, pubsub)
-        """
-        "Returns a list of currently connected clients"
+        :param fields: optional. only return these fields of every client
+        :param lazy: optional. only parse a client's fields when accessed
+        """
+        options: Dict[str, Any] = {}
+        if fields is not None:
+            options["fields"] = fields
+        if lazy:
+            options["lazy"] = True
         if _type is not None:
             client_types = ("normal", "master", "replica", "pubsub")
             if str(_type).lower() not in client_types:
                 raise DataError(f"CLIENT LIST _type must be one of {client_types!r}")
-            return self.execute_command("CLIENT LIST", b"TYPE", _type)
-        return self.execute_command("CLIENT LIST")
+            return self.execute_command("CLIENT LIST", b"TYPE", _type, **options)
+        return self.execute_command("CLIENT LIST", **options)
 
     def client_getname(self) -> Awaitable:
         """Returns the current connection name"""
@@ -1470,7 +1742,9 @@ class Redis:
         """Swap two databases"""
         return self.execute_command("SWAPDB", first, second)
 
-    def info(self, section: str = None) -> Awaitable:
+    def info(
+        self, section: str = None, fields: Iterable[str] = None, lazy: bool = False
+    ) -> Awaitable:
         """
         Returns a dictionary containing information about the Redis server
 
@@ -1479,11 +1753,20 @@ class Redis:
 
         The section option is not supported by older versions of Redis Server,
         and will generate ResponseError
+
+        ``fields`` and ``lazy`` are passed to ``parse_info``: ``fields``
+        only keeps the given keys (``"cmdstat_*"`` selects a prefix) and
+        ``lazy`` defers parsing compound values until they are accessed.
         """
+        options = {}
+        if fields is not None:
+            options["fields"] = fields
+        if lazy:
+            options["lazy"] = True
         if section is None:
-            return self.execute_command("INFO")
+            return self.execute_command("INFO", **options)
         else:
-            return self.execute_command("INFO", section)
+            return self.execute_command("INFO", section, **options)
 
     def lastsave(self) -> Awaitable:
         """
@@ -2377,6 +2660,78 @@ class Redis:
             for d in data:
                 yield d
 
+    def scan_batches(
+        self,
+        match: str = None,
+        count: int = None,
+        _type: str = None,
+        target_latency: float = None,
+        max_count: int = 10000,
+        prefetch: bool = True,
+    ) -> AsyncIterator[List]:
+        """
+        Like ``scan_iter``, but yields the keys of each SCAN page as a list.
+        Empty pages are skipped.
+
+        ``target_latency`` adapts the COUNT of each call, starting from
+        ``count``, so that a SCAN takes about that many seconds, without
+        going over ``max_count``.
+
+        With ``prefetch``, the next SCAN is sent before a page is yielded,
+        so it runs while the caller processes the page. Clients with a single
+        connection never prefetch, because the caller might use the
+        connection in the meantime.
+        """
+        return self._scan_batches(
+            lambda cursor, count: self.scan(cursor, match, count, _type),
+            count,
+            target_latency,
+            max_count,
+            prefetch,
+        )
+
+    async def _scan_batches(
+        self,
+        scan: Callable[[Any, Optional[int]], Awaitable],
+        count: Optional[int],
+        target_latency: Optional[float],
+        max_count: int,
+        prefetch: bool,
+    ) -> AsyncIterator:
+        async def fetch(cursor, count):
+            started = time.monotonic()
+            cursor, data = await scan(cursor, count)
+            return cursor, data, time.monotonic() - started
+
+        if target_latency is not None and count is None:
+            count = MIN_SCAN_COUNT
+        prefetch = prefetch and self.connection is None
+        pending: Optional[asyncio.Future] = None
+        try:
+            result = await fetch("0", count)
+            while True:
+                cursor, data, elapsed = result
+                if target_latency is not None:
+                    count = adapt_scan_count(count, elapsed, target_latency, max_count)
+                if cursor != 0 and prefetch:
+                    pending = asyncio.ensure_future(fetch(cursor, count))
+                if data:
+                    yield data
+                if cursor == 0:
+                    break
+                if pending is None:
+                    result = await fetch(cursor, count)
+                else:
+                    # shielded, so that cancelling the caller doesn't leave
+                    # an unread reply on the connection
+                    result = await asyncio.shield(pending)
+                    pending = None
+        finally:
+            if pending is not None:
+                await asyncio.wait((pending,))
+                if not pending.cancelled():
+                    pending.exception()
+
     def sscan(
         self, name: str, cursor: int = 0, match: str = None, count: int = None
     ) -> Awaitable:
@@ -2412,6 +2767,27 @@ class Redis:
             for d in data:
                 yield d
 
+    def sscan_batches(
+        self,
+        name: str,
+        match: str = None,
+        count: int = None,
+        target_latency: float = None,
+        max_count: int = 10000,
+        prefetch: bool = True,
+    ) -> AsyncIterator[List]:
+        """
+        Like ``sscan_iter``, but yields the members of each SSCAN page as a
+        list. See ``scan_batches`` for the other arguments.
+        """
+        return self._scan_batches(
+            lambda cursor, count: self.sscan(name, cursor, match, count),
+            count,
+            target_latency,
+            max_count,
+            prefetch,
+        )
+
     def hscan(
         self, name: str, cursor: int = 0, match: str = None, count: int = None
     ) -> Awaitable:
@@ -2449,6 +2825,27 @@ class Redis:
             for it in data.items():
                 yield it
 
+    def hscan_batches(
+        self,
+        name: str,
+        match: str = None,
+        count: int = None,
+        target_latency: float = None,
+        max_count: int = 10000,
+        prefetch: bool = True,
+    ) -> AsyncIterator[Dict]:
+        """
+        Like ``hscan_iter``, but yields the fields of each HSCAN page as a
+        dict. See ``scan_batches`` for the other arguments.
+        """
+        return self._scan_batches(
+            lambda cursor, count: self.hscan(name, cursor, match, count),
+            count,
+            target_latency,
+            max_count,
+            prefetch,
+        )
+
     def zscan(
         self,
         name: str,
@@ -2504,6 +2901,30 @@ class Redis:
             for d in data:
                 yield d
 
+    def zscan_batches(
+        self,
+        name: str,
+        match: str = None,
+        count: int = None,
+        score_cast_func: Union[Type, Callable] = float,
+        target_latency: float = None,
+        max_count: int = 10000,
+        prefetch: bool = True,
+    ) -> AsyncIterator[List[Tuple]]:
+        """
+        Like ``zscan_iter``, but yields the ``(member, score)`` pairs of each
+        ZSCAN page as a list. See ``scan_batches`` for the other arguments.
+        """
+        return self._scan_batches(
+            lambda cursor, count: self.zscan(
+                name, cursor, match, count, score_cast_func
+            ),
+            count,
+            target_latency,
+            max_count,
+            prefetch,
+        )
+
     # SET COMMANDS
     def sadd(self, name: str, *values: EncodableT) -> Awaitable:
         """Add ``value(s)`` to set ``name``"""
@@ -3501,9 +3922,14 @@ class Redis:
         """
         return self.execute_command("SCRIPT EXISTS", *args)
 
-    def script_flush(self) -> Awaitable:
+    async def script_flush(self):
         """Flush all scripts from the script cache"""
-        return self.execute_command("SCRIPT FLUSH")
+        try:
+            return await self.execute_command("SCRIPT FLUSH")
+        finally:
+            # only after the flush, so that scripts preloaded by connections
+            # checked out in the meantime aren't taken to be cached
+            self.connection_pool.scripts.invalidate()
 
     def script_kill(self) -> Awaitable:
         """Kill the currently executing Lua script"""
@@ -3522,6 +3948,101 @@ class Redis:
         """
         return Script(self, script)
 
+    # FUNCTION COMMANDS
+    def function_load(self, code: str, replace: bool = False) -> Awaitable:
+        """
+        Load a library of Redis Functions. ``code`` starts with a
+        ``#!lua name=<library>`` line. If ``replace`` is set, an existing
+        library of the same name is replaced. Returns the library name.
+        """
+        pieces: List[EncodableT] = [b"REPLACE"] if replace else []
+        return self.execute_command("FUNCTION LOAD", *pieces, code)
+
+    async def function_delete(self, library: str):
+        """Delete the library called ``library`` and all of its functions"""
+        try:
+            return await self.execute_command("FUNCTION DELETE", library)
+        finally:
+            self.connection_pool.scripts.forget_libraries(library, self.connection)
+
+    async def function_flush(self, mode: str = None):
+        """
+        Delete all libraries. ``mode`` is ``"ASYNC"`` or ``"SYNC"``, the
+        default depends on the server's ``lazyfree-lazy-user-flush``.
+        """
+        pieces: List[EncodableT] = [mode] if mode is not None else []
+        try:
+            return await self.execute_command("FUNCTION FLUSH", *pieces)
+        finally:
+            self.connection_pool.scripts.forget_libraries(connection=self.connection)
+
+    def function_list(self, library: str = None, withcode: bool = False) -> Awaitable:
+        """
+        Return a list of the loaded libraries and their functions. ``library``
+        is a glob-style pattern that filters libraries by name. With
+        ``withcode`` each library includes its source code.
+        """
+        pieces: List[EncodableT] = []
+        if library is not None:
+            pieces.extend((b"LIBRARYNAME", library))
+        if withcode:
+            pieces.append(b"WITHCODE")
+        return self.execute_command("FUNCTION LIST", *pieces)
+
+    def function_dump(self) -> Awaitable:
+        """
+        Return a serialized payload of all loaded libraries, to be passed to
+        ``function_restore`` on another server
+        """
+        return self.execute_command("FUNCTION DUMP", decode=False)
+
+    async def function_restore(self, payload: bytes, policy: str = None):
+        """
+        Restore the libraries in ``payload``, created by ``function_dump``.
+        ``policy`` is one of ``"APPEND"``, the default, which fails if a
+        library already exists, ``"REPLACE"`` or ``"FLUSH"``, which deletes
+        all existing libraries first.
+        """
+        pieces = function_restore_args(payload, policy)
+        try:
+            return await self.execute_command("FUNCTION RESTORE", *pieces)
+        finally:
+            if is_flush_policy(policy):
+                registry = self.connection_pool.scripts
+                registry.forget_libraries(connection=self.connection)
+
+    def function_kill(self) -> Awaitable:
+        """Kill the currently executing function that hasn't written yet"""
+        return self.execute_command("FUNCTION KILL")
+
+    def function_stats(self) -> Awaitable:
+        """Return information about the currently running function"""
+        return self.execute_command("FUNCTION STATS")
+
+    def fcall(self, function: str, numkeys: int, *keys_and_args: str) -> Awaitable:
+        """
+        Invoke the Redis Function ``function``. The first ``numkeys``
+        arguments of ``keys_and_args`` are key names. Returns the result of
+        the function.
+        """
+        return self.execute_command("FCALL", function, numkeys, *keys_and_args)
+
+    def fcall_ro(self, function: str, numkeys: int, *keys_and_args: str) -> Awaitable:
+        """
+        Invoke the read-only Redis Function ``function``, which may also run
+        on replicas. The first ``numkeys`` arguments of ``keys_and_args``
+        are key names.
+        """
+        return self.execute_command("FCALL_RO", function, numkeys, *keys_and_args)
+
+    def register_library(self, code: str) -> "Library":
+        """
+        Register a library of Redis Functions. Returns a Library object that
+        calls its functions and loads the library on servers that don't have
+        it yet, so that its source only has to be sent once per server.
+        """
+        return Library(self, code)
+
     # GEO COMMANDS
     def geoadd(self, name: str, *values: EncodableT) -> Awaitable:
         """
@@ -3810,6 +4331,190 @@ class Monitor:
             yield await self.next_command()
 
 
+class PubSubMessage(NamedTuple):
+    """A pubsub message as returned by ``PubSub(message_format="compact")``"""
+
+    type: str
+    pattern: Optional[EncodableT]
+    channel: Optional[EncodableT]
+    data: Any
+
+
+_new_tuple = tuple.__new__
+
+# message types as sent by the server (bytes, or str with decode_responses)
+# mapped to a single interned str each, so handling a message never decodes
+# its type and comparing types is mostly an identity check
+PUBSUB_MESSAGE_TYPES: Dict[Union[bytes, str], str] = {}
+for _type in (
+    "message",
+    "pmessage",
+    "subscribe",
+    "psubscribe",
+    "unsubscribe",
+    "punsubscribe",
+    "pong",
+):
+    _type = sys.intern(_type)
+    PUBSUB_MESSAGE_TYPES[_type] = PUBSUB_MESSAGE_TYPES[_type.encode()] = _type
+del _type
+
+
+def is_async_callable(func: Any) -> bool:
+    """
+    Whether calling ``func`` returns a coroutine, including partials of
+    async functions and objects with an async ``__call__``
+    """
+    while isinstance(func, functools.partial):
+        func = func.func
+    return inspect.iscoroutinefunction(func) or inspect.iscoroutinefunction(
+        getattr(func, "__call__", None)
+    )
+
+
+class AsyncHandler:
+    """
+    Runs an async message handler on a bounded set of worker tasks, so slow
+    handlers don't hold up reading from the pubsub connection.
+
+    Up to ``concurrency`` messages are handled at once. With ``ordered``,
+    messages of one channel are always handled one after another, in the
+    order they were published, while different channels (e.g. those
+    matching one pattern) are still handled concurrently. At most
+    ``max_pending`` messages wait for a worker; when they're all taken, the
+    pubsub stops reading from its connection until there's room again.
+
+    Async functions passed as handlers to ``subscribe()`` or
+    ``psubscribe()`` are wrapped in an ``AsyncHandler`` with the default
+    options. Wrap them explicitly to change those::
+
+        await pubsub.subscribe(events=AsyncHandler(on_event, concurrency=8))
+    """
+
+    def __init__(
+        self,
+        func: Callable[[Any], Awaitable],
+        concurrency: int = 1,
+        ordered: bool = False,
+        max_pending: int = 1000,
+    ):
+        if concurrency < 1:
+            raise DataError("AsyncHandler concurrency must be at least 1")
+        self.func = func
+        self.concurrency = concurrency
+        self.ordered = ordered
+        self.max_pending = max_pending
+        self._queues: List[asyncio.Queue] = []
+        # number of workers running per queue; workers exit once their queue
+        # is empty, so idle handlers don't hold on to any tasks
+        self._running: List[int] = []
+        self._workers: Set[asyncio.Task] = set()
+        # (queue index, message) held back while queues are full
+        self._overflow: deque = deque()
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}<{self.func!r},"
+            f"concurrency={self.concurrency},ordered={self.ordered}>"
+        )
+
+    @property
+    def pending(self) -> int:
+        """The number of messages waiting to be handled"""
+        return sum(q.qsize() for q in self._queues) + len(self._overflow)
+
+    def dispatch(
+        self, channel: EncodableT, message: Any, started: Optional[Awaitable] = None
+    ) -> bool:
+        """
+        Queue ``message`` for a worker. Returns False if it had to be held
+        back because the queue is full, see ``wait_for_room()``.
+
+        ``started`` is the awaitable the handler already returned for
+        ``message``, which the worker awaits instead of calling the handler.
+        """
+        queues = self._queues
+        if not queues:
+            if self.ordered:
+                maxsize = max(self.max_pending // self.concurrency, 1)
+                queues = [asyncio.Queue(maxsize) for _ in range(self.concurrency)]
+            else:
+                queues = [asyncio.Queue(self.max_pending)]
+            self._queues = queues
+            self._running = [0] * len(queues)
+        index = hash(channel) % len(queues) if len(queues) > 1 else 0
+        item = (message, started)
+        if not self._overflow:
+            try:
+                queues[index].put_nowait(item)
+            except asyncio.QueueFull:
+                pass
+            else:
+                self._spawn(index)
+                return True
+        self._overflow.append((index, item))
+        return False
+
+    async def wait_for_room(self):
+        """Wait until every message held back by ``dispatch()`` is queued"""
+        overflow = self._overflow
+        while overflow:
+            index, item = overflow[0]
+            await self._queues[index].put(item)
+            overflow.popleft()
+            self._spawn(index)
+
+    async def join(self):
+        """Wait until all dispatched messages have been handled"""
+        await self.wait_for_room()
+        for queue in self._queues:
+            await queue.join()
+
+    async def stop(self):
+        """Cancel the workers, dropping messages that weren't handled yet"""
+        workers, self._workers = self._workers, set()
+        for worker in workers:
+            worker.cancel()
+        if workers:
+            await asyncio.gather(*workers, return_exceptions=True)
+        self._queues = []
+        self._running = []
+        self._overflow.clear()
+
+    def _spawn(self, index: int):
+        limit = 1 if self.ordered else self.concurrency
+        if self._running[index] < limit:
+            self._running[index] += 1
+            worker = asyncio.ensure_future(self._work(index))
+            self._workers.add(worker)
+            worker.add_done_callback(self._workers.discard)
+
+    async def _work(self, index: int):
+        func = self.func
+        queue = self._queues[index]
+        try:
+            while True:
+                try:
+                    message, result = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    if result is None:
+                        result = func(message)
+                    if inspect.isawaitable(result):
+                        await result
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("Error in pubsub message handler %r", func)
+                finally:
+                    queue.task_done()
+        finally:
+            # unless stop() already replaced the queues and counters
+            if self._queues and self._queues[index] is queue:
+                self._running[index] -= 1
+
+
 class PubSub:
     """
     PubSub provides publish, subscribe and listen support to Redis channels.
@@ -3817,22 +4522,36 @@ class PubSub:
     After subscribing to one or more channels, the listen() method will block
     until a message arrives on one of the subscribed channels. That message
     will be returned and it's safe to start listening again.
+
+    ``message_format`` selects how messages are represented: ``"dict"``
+    (the default) returns a dict with ``type``, ``pattern``, ``channel`` and
+    ``data`` keys, ``"compact"`` returns a :class:`PubSubMessage` named
+    tuple with the same fields and ``"raw"`` returns the list read from the
+    connection untouched, e.g. ``[b"message", b"channel", b"data"]``.
+    Message handlers receive messages in the same format.
     """
 
     PUBLISH_MESSAGE_TYPES = ("message", "pmessage")
     UNSUBSCRIBE_MESSAGE_TYPES = ("unsubscribe", "punsubscribe")
     HEALTH_CHECK_MESSAGE = "redis-py-health-check"
+    MESSAGE_FORMATS = ("dict", "compact", "raw")
 
     def __init__(
         self,
         connection_pool: ConnectionPool,
         shard_hint: str = None,
         ignore_subscribe_messages: bool = False,
+        message_format: str = "dict",
     ):
+        self.connection = None
+        if message_format not in self.MESSAGE_FORMATS:
+            raise DataError(
+                f"PubSub message_format must be one of {self.MESSAGE_FORMATS!r}"
+            )
         self.connection_pool = connection_pool
         self.shard_hint = shard_hint
         self.ignore_subscribe_messages = ignore_subscribe_messages
-        self.connection = None
+        self.message_format = message_format
         # we need to know the encoding options for this connection in order
         # to lookup channel and pattern names for callback handlers.
         self.encoder = self.connection_pool.get_encoder()
@@ -3850,6 +4569,8 @@ class PubSub:
         self.pending_unsubscribe_channels = set()
         self.patterns = {}
         self.pending_unsubscribe_patterns = set()
+        # async handlers holding back messages until their queue has room
+        self._backlogged: Set[AsyncHandler] = set()
         self._lock = asyncio.Lock()
 
     async def __aenter__(self):
@@ -3869,6 +4590,9 @@ class PubSub:
                 self.connection.clear_connect_callbacks()
                 await self.connection_pool.release(self.connection)
                 self.connection = None
+            for handler in self._async_handlers():
+                await handler.stop()
+            self._backlogged = set()
             self.channels = {}
             self.pending_unsubscribe_channels = set()
             self.patterns = {}
@@ -3942,6 +4666,8 @@ class PubSub:
                 "did you forget to call subscribe() or psubscribe()?"
             )
 
+        if self._backlogged:
+            await self._wait_for_handlers_room()
         await self.check_health()
 
         if not block and not await conn.can_read(timeout=timeout):
@@ -3970,11 +4696,62 @@ class PubSub:
         """
         normalize channel/pattern names to be either bytes or strings
         based on whether responses are automatically decoded. this saves us
-        from coercing the value for each message coming in.
+        from coercing the value for each message coming in. async handlers
+        are wrapped in an ``AsyncHandler`` with the default options.
         """
         encode = self.encoder.encode
         decode = self.encoder.decode
-        return {decode(encode(k)): v for k, v in data.items()}
+        return {
+            decode(encode(k)): AsyncHandler(v) if is_async_callable(v) else v
+            for k, v in data.items()
+        }
+
+    def _call_handler(
+        self,
+        handler: Callable[[Any], Any],
+        pattern: Optional[EncodableT],
+        channel: EncodableT,
+        message: Any,
+    ):
+        if isinstance(handler, AsyncHandler):
+            if not handler.dispatch(channel, message):
+                self._backlogged.add(handler)
+            return
+        result = handler(message)
+        if not inspect.isawaitable(result):
+            return
+        # the handler wasn't recognized as async when it was subscribed, so
+        # from now on it runs on an ``AsyncHandler`` like other async ones
+        async_handler = AsyncHandler(handler)
+        if pattern is None:
+            self.channels[channel] = async_handler
+        else:
+            self.patterns[pattern] = async_handler
+        # the handler already ran up to its awaitable, which the worker
+        # awaits instead of calling it again
+        if not async_handler.dispatch(channel, message, result):
+            self._backlogged.add(async_handler)
+
+    def _async_handlers(self) -> Set[AsyncHandler]:
+        handlers = {
+            h
+            for h in itertools.chain(self.channels.values(), self.patterns.values())
+            if isinstance(h, AsyncHandler)
+        }
+        return handlers | self._backlogged
+
+    async def _wait_for_handlers_room(self):
+        # stop reading from the connection until every message held back by
+        # a full handler queue is queued
+        backlogged = self._backlogged
+        while backlogged:
+            await backlogged.pop().wait_for_room()
+
+    async def join_handlers(self):
+        """Wait until async handlers have handled every message dispatched"""
+        for handler in self._async_handlers():
+            await handler.join()
+        self._backlogged.clear()
 
     async def psubscribe(self, *args: Union[str, bytes], **kwargs: EncodableT):
         """
@@ -3982,7 +4759,8 @@ class PubSub:
         expect a pattern name as the key and a callable as the value. A
         pattern's callable will be invoked automatically when a message is
         received on that pattern rather than producing a message via
-        ``listen()``.
+        ``listen()``. Async callables are run on worker tasks, see
+        ``AsyncHandler``.
         """
         if args:
             args = list_or_args(args[0], args[1:])
@@ -4016,7 +4794,8 @@ class PubSub:
         a channel name as the key and a callable as the value. A channel's
         callable will be invoked automatically when a message is received on
         that channel rather than producing a message via ``listen()`` or
-        ``get_message()``.
+        ``get_message()``. Async callables are run on worker tasks, see
+        ``AsyncHandler``.
         """
         if args:
             args = list_or_args(args[0], args[1:])
@@ -4066,6 +4845,73 @@ class PubSub:
             return self.handle_message(response, ignore_subscribe_messages)
         return None
 
+    async def get_messages(
+        self,
+        max_messages: int = 1000,
+        timeout: Optional[float] = 0.0,
+        max_bytes: Optional[int] = None,
+        ignore_subscribe_messages: bool = False,
+    ) -> List[Any]:
+        """
+        Get all messages that are already available, up to ``max_messages``,
+        as a list. The list is empty if nothing arrived within ``timeout``
+        seconds (``None`` waits indefinitely).
+
+        Only the first message is waited for; after it, messages are taken
+        for as long as they're buffered and reading stops as soon as the
+        connection would have to wait for more data. ``max_bytes`` stops the
+        batch once the message payloads add up to at least that many bytes.
+        """
+        conn = self.connection
+        if conn is None:
+            raise RuntimeError(
+                "pubsub connection not set: "
+                "did you forget to call subscribe() or psubscribe()?"
+            )
+        if self._backlogged:
+            await self._wait_for_handlers_room()
+        await self.check_health()
+        messages: List[Any] = []
+        # through _execute, so a dead connection is disconnected and the next
+        # call reconnects and subscribes again
+        if not await self._execute(conn, conn.can_read, timeout=timeout):
+            return messages
+
+        check_health_response = bool(conn.health_check_interval)
+        handle_message = self.handle_message
+        size = 0
+        while True:
+            response = await self._execute(conn, conn.read_response)
+            if not (check_health_response and response == self.health_check_response):
+                message = handle_message(response, ignore_subscribe_messages)
+                if message is not None:
+                    messages.append(message)
+                    if len(messages) >= max_messages:
+                        break
+                if max_bytes is not None:
+                    data = response[-1]
+                    if isinstance(data, (bytes, str)):
+                        size += len(data)
+                        if size >= max_bytes:
+                            break
+            if not conn.can_read_buffered():
+                break
+        return messages
+
+    async def listen_batches(
+        self, max_messages: int = 1000, max_bytes: Optional[int] = None
+    ) -> AsyncIterator[List[Any]]:
+        """
+        Like ``listen()``, but yields lists of all the messages available at
+        once, see ``get_messages()``.
+        """
+        while self.subscribed:
+            messages = await self.get_messages(
+                max_messages=max_messages, timeout=None, max_bytes=max_bytes
+            )
+            if messages:
+                yield messages
+
     def ping(self, message=None) -> Awaitable:
         """
         Ping the Redis server
@@ -4079,38 +4925,39 @@ class PubSub:
         with a message handler, the handler is invoked instead of a parsed
         message being returned.
         """
-        message_type = str_if_bytes(response[0])
-        if message_type == "pmessage":
-            message = {
-                "type": message_type,
-                "pattern": response[1],
-                "channel": response[2],
-                "data": response[3],
-            }
+        message_type = PUBSUB_MESSAGE_TYPES.get(response[0])
+        if message_type is None:
+            message_type = str_if_bytes(response[0])
+        if message_type == "message":
+            pattern, channel, data = None, response[1], response[2]
+        elif message_type == "pmessage":
+            pattern, channel, data = response[1], response[2], response[3]
         elif message_type == "pong":
-            message = {
-                "type": message_type,
-                "pattern": None,
-                "channel": None,
-                "data": response[1],
-            }
+            pattern, channel, data = None, None, response[1]
         else:
+            pattern, channel, data = None, response[1], response[2]
+
+        message_format = self.message_format
+        if message_format == "dict":
             message = {
                 "type": message_type,
-                "pattern": None,
-                "channel": response[1],
-                "data": response[2],
+                "pattern": pattern,
+                "channel": channel,
+                "data": data,
             }
+        elif message_format == "compact":
+            # skips the named tuple's Python level __new__
+            message = _new_tuple(PubSubMessage, (message_type, pattern, channel, data))
+        else:
+            message = response
 
         # if this is an unsubscribe message, remove it from memory
         if message_type in self.UNSUBSCRIBE_MESSAGE_TYPES:
             if message_type == "punsubscribe":
-                pattern = response[1]
-                if pattern in self.pending_unsubscribe_patterns:
-                    self.pending_unsubscribe_patterns.remove(pattern)
-                    self.patterns.pop(pattern, None)
+                if channel in self.pending_unsubscribe_patterns:
+                    self.pending_unsubscribe_patterns.remove(channel)
+                    self.patterns.pop(channel, None)
             else:
-                channel = response[1]
                 if channel in self.pending_unsubscribe_channels:
                     self.pending_unsubscribe_channels.remove(channel)
                     self.channels.pop(channel, None)
@@ -4118,11 +4965,11 @@ class PubSub:
         if message_type in self.PUBLISH_MESSAGE_TYPES:
             # if there's a message handler, invoke it
             if message_type == "pmessage":
-                handler = self.patterns.get(message["pattern"], None)
+                handler = self.patterns.get(pattern, None)
             else:
-                handler = self.channels.get(message["channel"], None)
+                handler = self.channels.get(channel, None)
             if handler:
-                handler(message)
+                self._call_handler(handler, pattern, channel, message)
                 return None
         elif message_type != "pong":
             # this is a subscribe/unsubscribe message. ignore if we don't
@@ -4132,9 +4979,7 @@ class PubSub:
 
         return message
 
-    def run_in_thread(
-        self, daemon: bool = False, exception_handler: Callable = None
-    ) -> "PubSubWorkerThread":
+    def _check_handlers(self):
         for channel, handler in self.channels.items():
             if handler is None:
                 raise PubSubError(f"Channel: '{channel}' has no handler registered")
@@ -4142,6 +4987,38 @@ class PubSub:
             if handler is None:
                 raise PubSubError(f"Pattern: '{pattern}' has no handler registered")
 
+    def run_in_task(
+        self,
+        poll_timeout: float = 1.0,
+        exception_handler: "PSWorkerExcHandlerT" = None,
+    ) -> "PubSubWorker":
+        """
+        Handle messages on a task running on the current event loop until
+        the returned worker is stopped. Every subscribed channel and pattern
+        must have a handler.
+
+        Exceptions raised while getting messages end the task unless an
+        ``exception_handler(exception, pubsub, worker)`` is given, which may
+        be a coroutine function and may stop the worker.
+        """
+        self._check_handlers()
+        worker = PubSubWorker(
+            self, poll_timeout=poll_timeout, exception_handler=exception_handler
+        )
+        worker.start()
+        return worker
+
+    def run_in_thread(
+        self, daemon: bool = False, exception_handler: Callable = None
+    ) -> "PubSubWorkerThread":
+        warnings.warn(
+            DeprecationWarning(
+                "PubSub.run_in_thread() uses the pubsub connection from another "
+                "thread, use PubSub.run_in_task() instead"
+            )
+        )
+        self._check_handlers()
+
         thread = PubSubWorkerThread(
             self, daemon=daemon, exception_handler=exception_handler
         )
@@ -4162,6 +5039,83 @@ class AsyncPubsubWorkerExceptionHandler(Protocol):
 PSWorkerThreadExcHandlerT = Union[
     PubsubWorkerExceptionHandler, AsyncPubsubWorkerExceptionHandler
 ]
+PSWorkerExcHandlerT = Callable[[BaseException, PubSub, "PubSubWorker"], Any]
+
+
+class PubSubWorker:
+    """
+    Handles a PubSub's messages on an asyncio task, see
+    ``PubSub.run_in_task()``.
+    """
+
+    def __init__(
+        self,
+        pubsub: PubSub,
+        poll_timeout: float = 1.0,
+        exception_handler: PSWorkerExcHandlerT = None,
+    ):
+        self.pubsub = pubsub
+        self.poll_timeout = poll_timeout
+        self.exception_handler = exception_handler
+        self.task: Optional[asyncio.Future] = None
+        self._running = False
+        self._in_exception_handler = False
+
+    @property
+    def is_running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self):
+        if self.is_running:
+            return
+        self._running = True
+        self.task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        """
+        Stop handling messages. The task is cancelled, so this returns
+        right away even if it's waiting for a message; ``join()`` waits for
+        the pubsub to be closed.
+        """
+        self._running = False
+        # when called from the exception handler, the loop simply ends once
+        # the handler returns
+        if self.is_running and not self._in_exception_handler:
+            self.task.cancel()
+
+    async def join(self):
+        """
+        Wait for the task to finish, re-raising the exception that ended it,
+        if any.
+        """
+        if self.task is None:
+            return
+        await asyncio.wait([self.task])
+        if not self.task.cancelled():
+            self.task.result()
+
+    async def _run(self):
+        pubsub = self.pubsub
+        try:
+            while self._running:
+                try:
+                    await pubsub.get_message(
+                        ignore_subscribe_messages=True, timeout=self.poll_timeout
+                    )
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    if self.exception_handler is None:
+                        raise
+                    self._in_exception_handler = True
+                    try:
+                        res = self.exception_handler(e, pubsub, self)
+                        if inspect.isawaitable(res):
+                            await res
+                    finally:
+                        self._in_exception_handler = False
+        finally:
+            await pubsub.close()
 
 
 class PubSubWorkerThread(threading.Thread):
@@ -4214,6 +5168,54 @@ class PubSubWorkerThread(threading.Thread):
 
 CommandT = Tuple[Tuple[Union[str, bytes], ...], Mapping[str, Any]]
 CommandStackT = List[CommandT]
+# a response callback resolved when its command was queued, paired with
+# whether it is known to return plain values rather than awaitables
+ResolvedCallbackT = Optional[Tuple[ResponseCallbackT, bool]]
+
+
+class PipelineResults(Sequence):
+    """
+    The replies of a pipeline whose response callbacks run on first access.
+
+    Returned by ``Pipeline.execute(lazy_callbacks=True)``. Each reply is
+    converted by its command's response callback the first time it is
+    read and the converted value is cached, so replies that are never
+    looked at cost nothing beyond reading them off the socket.
+    """
+
+    __slots__ = ("_replies", "_callbacks", "_options")
+
+    def __init__(
+        self,
+        replies: List[Any],
+        callbacks: List[ResolvedCallbackT],
+        options: List[Mapping[str, Any]],
+    ):
+        self._replies = replies
+        self._callbacks = callbacks
+        self._options = options
+
+    def __len__(self):
+        return len(self._replies)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self._replies)))]
+        value = self._replies[index]
+        resolved = self._callbacks[index]
+        if resolved is not None:
+            value = resolved[0](value, **self._options[index])
+            self._replies[index] = value
+            self._callbacks[index] = None
+        return value
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, PipelineResults)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({list(self)!r})"
 
 
 class Pipeline(Redis):  # lgtm [py/init-calls-subclass]
@@ -4236,6 +5238,18 @@ class Pipeline(Redis):  # lgtm [py/init-calls-subclass]
     """
 
     UNWATCH_COMMANDS = {"DISCARD", "EXEC", "UNWATCH"}
+    # the default callbacks that are classes or plain functions never return
+    # an awaitable, so their results skip the ``isawaitable`` check. ids are
+    # stable since the class keeps them alive
+    SYNC_CALLBACK_IDS = frozenset(
+        id(callback)
+        for callback in Redis.RESPONSE_CALLBACKS.values()
+        if isinstance(callback, type)
+        or (inspect.isfunction(callback) and not is_async_callable(callback))
+    )
+    # requests larger than this are written from a separate task while the
+    # replies are being read
+    WRITE_CHUNK_SIZE = 65536
 
     def __init__(
         self,
@@ -4243,15 +5257,21 @@ class Pipeline(Redis):  # lgtm [py/init-calls-subclass]
         response_callbacks: Mapping[str, ResponseCallbackT],
         transaction: bool,
         shard_hint: Optional[str],
+        command_hooks: List[CommandHook] = None,
     ):
         self.connection_pool = connection_pool
         self.connection = None
         self.response_callbacks = response_callbacks
+        self.command_hooks = command_hooks if command_hooks is not None else []
         self.transaction = transaction
         self.shard_hint = shard_hint
         self.watching = False
         self.command_stack = []
+        self._callbacks: List[ResolvedCallbackT] = []
         self.scripts = set()
+        self.libraries = set()
+        self.flushes_scripts = False
+        self.flushes_libraries = False
         self.explicit_transaction = False
 
     async def __aenter__(self) -> "Pipeline":
@@ -4280,7 +5300,11 @@ class Pipeline(Redis):  # lgtm [py/init-calls-subclass]
 
     async def reset(self):
         self.command_stack = []
+        self._callbacks = []
         self.scripts = set()
+        self.libraries = set()
+        self.flushes_scripts = False
+        self.flushes_libraries = False
         # make sure to reset the connection state in the event that we were
         # watching something
         if self.watching and self.connection:
@@ -4381,10 +5405,63 @@ class Pipeline(Redis):  # lgtm [py/init-calls-subclass]
         which will execute all commands queued in the pipe.
         """
         self.command_stack.append((args, options))
+        self._callbacks.append(self._resolve_callback(args[0]))
         return self
 
+    def _resolve_callback(self, command_name: Union[str, bytes]) -> ResolvedCallbackT:
+        callback = self.response_callbacks.get(command_name)
+        if callback is None:
+            return None
+        return callback, id(callback) in self.SYNC_CALLBACK_IDS
+
+    def _resolved_callbacks(self, commands: CommandStackT) -> List[ResolvedCallbackT]:
+        callbacks = self._callbacks
+        if len(callbacks) != len(commands):
+            # the stack was modified behind pipeline_execute_command's back
+            callbacks = [self._resolve_callback(args[0]) for args, _ in commands]
+        return list(callbacks)
+
+    async def _run_callbacks(
+        self,
+        commands: CommandStackT,
+        response: List[Any],
+        callbacks: List[ResolvedCallbackT],
+        lazy: bool,
+    ):
+        """
+        Run the response callbacks resolved for ``commands`` over
+        ``response``. With ``lazy``, callbacks known to be synchronous are
+        left for ``PipelineResults`` to run when a reply is first read.
+        """
+        options = [options for _, options in commands]
+        for i, resolved in enumerate(callbacks):
+            if resolved is None:
+                continue
+            r = response[i]
+            if isinstance(r, Exception):
+                callbacks[i] = None
+                continue
+            if DECODE_OPTION in options[i]:
+                options[i] = {k: v for k, v in options[i].items() if k != DECODE_OPTION}
+            callback, is_sync = resolved
+            if is_sync:
+                if lazy:
+                    continue
+                response[i] = callback(r, **options[i])
+            else:
+                r = callback(r, **options[i])
+                response[i] = await r if inspect.isawaitable(r) else r
+            callbacks[i] = None
+        if lazy:
+            return PipelineResults(response, callbacks, options)
+        return response
+
     async def _execute_transaction(
-        self, connection: Connection, commands: CommandStackT, raise_on_error
+        self,
+        connection: Connection,
+        commands: CommandStackT,
+        raise_on_error,
+        lazy_callbacks: bool = False,
     ):
         cmds = chain([(("MULTI",), {})], commands, [(("EXEC",), {})])
         all_cmds = connection.pack_commands(
@@ -4392,13 +5469,22 @@ class Pipeline(Redis):  # lgtm [py/init-calls-subclass]
         )
         await connection.send_packed_command(all_cmds)
         errors = []
+        read_response = connection.read_response
+        # EXEC returns all replies at once, so if any command overrides
+        # decode_responses the whole EXEC is read raw and decoded below
+        decode_responses = connection.encoder.decode_responses
+        decode_overrides = [options.get(DECODE_OPTION) for _, options in commands]
+        read_raw = any(
+            decode is not None and decode != decode_responses
+            for decode in decode_overrides
+        )
 
         # parse off the response for MULTI
         # NOTE: we need to handle ResponseErrors here and continue
         # so that we read all the additional command messages from
         # the socket
         try:
-            await self.parse_response(connection, "_")
+            await read_response()
         except ResponseError as err:
             errors.append((0, err))
 
@@ -4408,14 +5494,14 @@ class Pipeline(Redis):  # lgtm [py/init-calls-subclass]
                 errors.append((i, command[1][EMPTY_RESPONSE]))
             else:
                 try:
-                    await self.parse_response(connection, "_")
+                    await read_response()
                 except ResponseError as err:
                     self.annotate_exception(err, i + 1, command[0])
                     errors.append((i, err))
 
         # parse the EXEC.
         try:
-            response = await self.parse_response(connection, "_")
+            response = await read_response(disable_decoding=read_raw)
         except ExecAbortError as err:
             if errors:
                 raise errors[0][1] from err
@@ -4437,43 +5523,191 @@ class Pipeline(Redis):  # lgtm [py/init-calls-subclass]
                 "Wrong number of response items from pipeline execution"
             ) from None
 
+        if read_raw:
+            decode_as = connection.encoder.decode_as
+            for i, (r, decode) in enumerate(zip(response, decode_overrides)):
+                if isinstance(r, Exception) or EMPTY_RESPONSE in commands[i][1]:
+                    continue
+                response[i] = decode_as(
+                    r, decode_responses if decode is None else decode
+                )
+
         # find any errors in the response and raise if necessary
         if raise_on_error:
             self.raise_first_error(commands, response)
 
         # We have to run response callbacks manually
-        data = []
-        for r, cmd in zip(response, commands):
-            if not isinstance(r, Exception):
-                args, options = cmd
-                command_name = args[0]
-                if command_name in self.response_callbacks:
-                    r = self.response_callbacks[command_name](r, **options)
-                    if inspect.isawaitable(r):
-                        r = await r
-            data.append(r)
-        return data
+        callbacks = self._resolved_callbacks(commands)
+        return await self._run_callbacks(commands, response, callbacks, lazy_callbacks)
 
     async def _execute_pipeline(
-        self, connection: Connection, commands: CommandStackT, raise_on_error: bool
+        self,
+        connection: Connection,
+        commands: CommandStackT,
+        raise_on_error: bool,
+        lazy_callbacks: bool = False,
     ):
+        callbacks = self._resolved_callbacks(commands)
+        response = await self._pipeline_replies(connection, commands, callbacks)
+        if raise_on_error:
+            self.raise_first_error(commands, response)
+        return await self._run_callbacks(commands, response, callbacks, lazy_callbacks)
+
+    async def _execute_parallel(
+        self,
+        connection: Connection,
+        commands: CommandStackT,
+        raise_on_error: bool,
+        lazy_callbacks: bool = False,
+        parallel: int = 2,
+    ):
+        """
+        Split ``commands`` into up to ``parallel`` contiguous slices and
+        pipeline each one on its own connection, the first slice on
+        ``connection`` and the rest on connections checked out of the pool
+        for the duration of the call. Replies are merged in command order.
+        """
+        callbacks = self._resolved_callbacks(commands)
+        # the pipeline never waits on a blocking pool for more connections
+        # than the pool can hold
+        parallel = min(parallel, self.connection_pool.max_connections)
+        size = -(-len(commands) // parallel)
+        starts = range(0, len(commands), size)
+        connections = [connection]
+        sent = False
+        results: Optional[List[Any]] = None
+        try:
+            for _ in starts[1:]:
+                connections.append(
+                    await self.connection_pool.get_connection(
+                        "PIPELINE", self.shard_hint
+                    )
+                )
+            slices = [
+                (commands[start : start + size], callbacks[start : start + size])
+                for start in starts
+            ]
+            sent = True
+            results = await asyncio.gather(
+                *(
+                    self._pipeline_replies(conn, *slice_)
+                    for conn, slice_ in zip(connections, slices)
+                ),
+                return_exceptions=True,
+            )
+        finally:
+            for i, conn in enumerate(connections[1:], 1):
+                if sent and (results is None or isinstance(results[i], BaseException)):
+                    # the slice was cancelled or failed, so its replies may be
+                    # left unread on the connection
+                    await conn.disconnect()
+                await self.connection_pool.release(conn)
+        response: List[Any] = []
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+            response.extend(result)
+        callbacks = [resolved for _, part in slices for resolved in part]
+
+        if raise_on_error:
+            self.raise_first_error(commands, response)
+        return await self._run_callbacks(commands, response, callbacks, lazy_callbacks)
+
+    async def _pipeline_replies(
+        self,
+        connection: Connection,
+        commands: CommandStackT,
+        callbacks: List[ResolvedCallbackT],
+    ) -> List[Any]:
         # build up all commands into a single request to increase network perf
         all_cmds = connection.pack_commands([args for args, _ in commands])
-        await connection.send_packed_command(all_cmds)
+        if sum(map(len, all_cmds)) <= self.WRITE_CHUNK_SIZE:
+            await connection.send_packed_command(all_cmds)
+            return await self._read_replies(connection, commands, callbacks)
+        return await self._send_and_read(connection, all_cmds, commands, callbacks)
 
+    async def _read_replies(
+        self,
+        connection: Connection,
+        commands: CommandStackT,
+        callbacks: List[ResolvedCallbackT],
+    ) -> List[Any]:
+        read_response = connection.read_response
+        decode_responses = connection.encoder.decode_responses
         response = []
-        for args, options in commands:
+        for i, (args, options) in enumerate(commands):
             try:
-                response.append(
-                    await self.parse_response(connection, args[0], **options)
-                )
+                decode = options.get(DECODE_OPTION)
+                if decode is None or decode == decode_responses:
+                    response.append(await read_response())
+                else:
+                    raw = await read_response(disable_decoding=True)
+                    response.append(connection.encoder.decode_as(raw, decode))
             except ResponseError as e:
-                response.append(e)
-
-        if raise_on_error:
-            self.raise_first_error(commands, response)
+                if EMPTY_RESPONSE in options:
+                    response.append(options[EMPTY_RESPONSE])
+                    callbacks[i] = None
+                else:
+                    response.append(e)
         return response
 
+    async def _send_and_read(
+        self,
+        connection: Connection,
+        packed: List[bytes],
+        commands: CommandStackT,
+        callbacks: List[ResolvedCallbackT],
+    ) -> List[Any]:
+        """
+        Write ``packed`` from a separate task in ``WRITE_CHUNK_SIZE`` pieces
+        while the replies are read, so that large pipelines run full duplex
+        instead of leaving the replies to pile up until the whole request
+        has been written.
+        """
+        chunks = iter(packed)
+        first: List[bytes] = []
+        size = 0
+        for chunk in chunks:
+            first.append(chunk)
+            size += len(chunk)
+            if size >= self.WRITE_CHUNK_SIZE:
+                break
+        # the first write connects and health checks the connection
+        await connection.send_packed_command(first)
+
+        async def write():
+            batch: List[bytes] = []
+            size = 0
+            for chunk in chunks:
+                batch.append(chunk)
+                size += len(chunk)
+                if size >= self.WRITE_CHUNK_SIZE:
+                    await connection.send_packed_command(batch, check_health=False)
+                    batch = []
+                    size = 0
+            if batch:
+                await connection.send_packed_command(batch, check_health=False)
+
+        writer = asyncio.ensure_future(write())
+        reader = asyncio.ensure_future(
+            self._read_replies(connection, commands, callbacks)
+        )
+        tasks = {writer, reader}
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        finally:
+            pending = {task for task in tasks if not task.done()}
+            if pending:
+                # one side failed or we were cancelled: stop the other side
+                # and let it finish unwinding before the connection is reused
+                for task in pending:
+                    task.cancel()
+                await asyncio.wait(pending)
+        for task in (writer, reader):
+            if not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+        return reader.result()
+
     def raise_first_error(self, commands: CommandStackT, response: Iterable[Any]):
         for i, r in enumerate(response):
             if isinstance(r, ResponseError):
@@ -4495,11 +5729,55 @@ class Pipeline(Redis):  # lgtm [py/init-calls-subclass]
             self.watching = True
         return result
 
+    def script_flush(self):
+        """Flush all scripts from the script cache"""
+        # the pool's registry is invalidated once the pipeline has run
+        self.flushes_scripts = True
+        return self.execute_command("SCRIPT FLUSH")
+
+    def function_delete(self, library: str):
+        """Delete the library called ``library`` and all of its functions"""
+        # the pool's registry forgets the libraries once the pipeline has run
+        self.flushes_libraries = True
+        return self.execute_command("FUNCTION DELETE", library)
+
+    def function_flush(self, mode: str = None):
+        """
+        Delete all libraries. ``mode`` is ``"ASYNC"`` or ``"SYNC"``, the
+        default depends on the server's ``lazyfree-lazy-user-flush``.
+        """
+        self.flushes_libraries = True
+        pieces: List[EncodableT] = [mode] if mode is not None else []
+        return self.execute_command("FUNCTION FLUSH", *pieces)
+
+    def function_restore(self, payload: bytes, policy: str = None):
+        """
+        Restore the libraries in ``payload``, created by ``function_dump``.
+        ``policy`` is one of ``"APPEND"``, the default, which fails if a
+        library already exists, ``"REPLACE"`` or ``"FLUSH"``, which deletes
+        all existing libraries first.
+        """
+        pieces = function_restore_args(payload, policy)
+        if is_flush_policy(policy):
+            self.flushes_libraries = True
+        return self.execute_command("FUNCTION RESTORE", *pieces)
+
     async def load_scripts(self):
         # make sure all scripts that are about to be run on this pipeline exist
         scripts = list(self.scripts)
-        immediate = self.immediate_execute_command
+        registry = self.connection_pool.scripts
         shas = [s.sha for s in scripts]
+        conn = self.connection
+        if not conn:
+            conn = await self.connection_pool.get_connection(
+                "SCRIPT EXISTS", self.shard_hint
+            )
+            self.connection = conn
+        if not registry.is_loaded(shas, conn):
+            await registry.preload(conn)
+        if registry.is_loaded(shas, conn):
+            return
+        immediate = self.immediate_execute_command
         # we can't use the normal script_* methods because they would just
         # get buffered in the pipeline.
         exists = await immediate("SCRIPT EXISTS", *shas)
@@ -4507,45 +5785,281 @@ class Pipeline(Redis):  # lgtm [py/init-calls-subclass]
             for s, exist in zip(scripts, exists):
                 if not exist:
                     s.sha = await immediate("SCRIPT LOAD", s.script)
+        for s in scripts:
+            registry.register(s.sha, s.script)
+        registry.mark_loaded((s.sha for s in scripts), conn)
+
+    async def load_libraries(self):
+        # make sure the function libraries called in this pipeline exist
+        registry = self.connection_pool.scripts
+        immediate = self.immediate_execute_command
+        conn = self.connection
+        for library in self.libraries:
+            if registry.has_library(library.name, conn):
+                continue
+            # check first to avoid sending the code to servers that have it.
+            # LIBRARYNAME is a glob pattern, so look for the exact name
+            names = (library.name, library.name.encode())
+            listed = await immediate("FUNCTION LIST", b"LIBRARYNAME", library.name)
+            if not any(item["library_name"] in names for item in listed):
+                try:
+                    await immediate("FUNCTION LOAD", library.code)
+                except ResponseError as e:
+                    if not is_library_exists_error(e):
+                        raise
+            registry.mark_library(library.name, conn)
 
-    async def execute(self, raise_on_error: bool = True):
-        """Execute all the commands in the current pipeline"""
+    async def execute(
+        self,
+        raise_on_error: bool = True,
+        lazy_callbacks: bool = False,
+        parallel: int = 1,
+    ):
+        """
+        Execute all the commands in the current pipeline
+
+        With ``lazy_callbacks``, the replies are returned as a
+        ``PipelineResults`` sequence that only runs each command's response
+        callback when that reply is first accessed.
+
+        ``parallel`` splits a non-transactional pipeline into that many
+        slices, at most the pool's ``max_connections``, which run
+        concurrently on separate pool connections. The
+        replies are still returned in command order, but commands in
+        different slices may be processed by the server in any order.
+        """
         stack = self.command_stack
+        if parallel < 1:
+            raise DataError("parallel must be a positive integer")
+        transaction = self.transaction or self.explicit_transaction
+        if parallel > 1 and (transaction or self.watching):
+            raise DataError(
+                "parallel execution is only supported for pipelines "
+                "created with transaction=False and not WATCHing keys"
+            )
         if not stack and not self.watching:
             return []
-        if self.scripts:
-            await self.load_scripts()
-        if self.transaction or self.explicit_transaction:
-            execute = self._execute_transaction
-        else:
-            execute = self._execute_pipeline
-
         conn = self.connection
         if not conn:
             conn = await self.connection_pool.get_connection("MULTI", self.shard_hint)
             # assign to self.connection so reset() releases the connection
             # back to the pool after we're done
             self.connection = conn
-
+        execute = await self._prepare_execute(transaction, parallel)
+
+        command_name = "MULTI" if transaction else "PIPELINE"
+        stats = self.connection_pool.stats
+        if stats is not None:
+            started = time.monotonic()
+        hooks = self.command_hooks
+        if hooks:
+            context = CommandContext(command_name, (), conn, len(stack))
         try:
-            return await execute(conn, stack, raise_on_error)
-        except (ConnectionError, TimeoutError) as e:
-            await conn.disconnect()
-            # if we were watching a variable, the watch is no longer valid
-            # since this connection has died. raise a WatchError, which
-            # indicates the user should retry this transaction.
-            if self.watching:
-                raise WatchError(
-                    "A ConnectionError occurred on while " "watching one or more keys"
-                ) from e
-            # if retry_on_timeout is not set, or the error is not
-            # a TimeoutError, raise it
-            if not (conn.retry_on_timeout and isinstance(e, TimeoutError)):
-                raise
-            # retry a TimeoutError when retry_on_timeout is set
-            return await execute(conn, stack, raise_on_error)
+            if hooks:
+                run_before_send(hooks, context)
+            try:
+                response = await execute(conn, stack, raise_on_error, lazy_callbacks)
+            except (ConnectionError, TimeoutError) as e:
+                await conn.disconnect()
+                # if we were watching a variable, the watch is no longer valid
+                # since this connection has died. raise a WatchError, which
+                # indicates the user should retry this transaction.
+                if self.watching:
+                    raise WatchError(
+                        "A ConnectionError occurred on while "
+                        "watching one or more keys"
+                    ) from e
+                # if retry_on_timeout is not set, or the error is not
+                # a TimeoutError, raise it
+                if not (conn.retry_on_timeout and isinstance(e, TimeoutError)):
+                    raise
+                # retry a TimeoutError when retry_on_timeout is set
+                response = await execute(conn, stack, raise_on_error, lazy_callbacks)
+        except Exception as e:
+            if hooks:
+                run_on_error(hooks, context, e)
+            raise
         finally:
+            if stats is not None:
+                stats.record_command(command_name, time.monotonic() - started)
+            self._forget_flushed()
             await self.reset()
+        if hooks:
+            run_after_reply(hooks, context, response)
+        return response
+
+    def _forget_flushed(self):
+        # only once the pipeline has run, so that loads sent in the meantime
+        # aren't taken to have survived the flush
+        registry = self.connection_pool.scripts
+        if self.flushes_scripts:
+            registry.invalidate()
+        if self.flushes_libraries:
+            registry.forget_libraries(connection=self.connection)
+
+    async def _prepare_execute(self, transaction: bool, parallel: int) -> Callable:
+        """
+        Make sure the server has the scripts and libraries the pipeline
+        calls, and return the method that executes the command stack
+        """
+        if self.scripts:
+            await self.load_scripts()
+        if self.libraries:
+            await self.load_libraries()
+        if transaction:
+            execute = self._execute_transaction
+        elif parallel > 1 and len(self.command_stack) > 1:
+            execute = functools.partial(self._execute_parallel, parallel=parallel)
+        else:
+            execute = self._execute_pipeline
+        if self.scripts or self.libraries:
+            execute = functools.partial(self._execute_scripted, execute)
+        return execute
+
+    async def _execute_scripted(
+        self,
+        execute: Callable,
+        connection: Connection,
+        commands: CommandStackT,
+        raise_on_error: bool,
+        lazy_callbacks: bool = False,
+    ):
+        """
+        Run ``execute`` for a pipeline that calls scripts or functions.
+
+        If the server has lost scripts or libraries it was thought to have,
+        e.g. to a SCRIPT FLUSH or FUNCTION FLUSH from another client, the
+        pool's registry forgets them so that the next pipeline loads them
+        again. The commands that failed aren't rerun, as the rest of the
+        pipeline has already run after them.
+        """
+        response = await execute(connection, commands, False, lazy_callbacks)
+        replies = getattr(response, "_replies", response)
+        registry = self.connection_pool.scripts
+        if any(isinstance(r, NoScriptError) for r in replies):
+            registry.invalidate(connection)
+        if any(isinstance(r, NoFunctionError) for r in replies):
+            registry.forget_libraries(connection=connection)
+        if raise_on_error:
+            self.raise_first_error(commands, replies)
+        return response
+
+    async def stream(
+        self,
+        commands: Union[Iterable[Sequence[Any]], AsyncIterator],
+        window: int = 1000,
+        raise_on_error: bool = True,
+    ) -> AsyncIterator[Any]:
+        """
+        Pipeline ``commands`` on a single connection, yielding each reply
+        as it arrives.
+
+        ``commands`` is an iterable or async iterable of argument tuples,
+        such as ``("SET", "key", "value")``, or of ``(args, options)`` pairs
+        like those the pipeline's command methods put on ``command_stack``.
+        At most ``window`` commands are in flight at any time: whenever half
+        of them have been answered, the next batch is pulled from
+        ``commands`` and written, so arbitrarily long command streams run in
+        constant memory. Replies are parsed as by ``execute_command``, with
+        the command's options passed on to its response callback. Commands
+        are not wrapped in MULTI/EXEC and the command stack of this pipeline
+        is not used. Command hooks see each command on its own.
+
+        If ``raise_on_error`` is False, error replies are yielded as
+        ``ResponseError`` instances instead of being raised. Closing the
+        generator early disconnects the connection so that unread replies
+        never reach the next user of the pool.
+        """
+        if window < 1:
+            raise DataError("window must be a positive integer")
+        is_async = hasattr(commands, "__aiter__")
+        source = commands.__aiter__() if is_async else iter(commands)
+        conn = await self.connection_pool.get_connection("PIPELINE", self.shard_hint)
+        stats = self.connection_pool.stats
+        if stats is not None:
+            started = time.monotonic()
+        hooks = self.command_hooks
+        in_flight: Deque[
+            Tuple[Sequence[EncodableT], Dict[str, Any], Optional[CommandContext]]
+        ] = deque()
+        low_water = window // 2
+        exhausted = False
+        number = 0
+        try:
+            while True:
+                if not exhausted and len(in_flight) <= low_water:
+                    batch = await self._stream_batch(
+                        source, is_async, window - len(in_flight)
+                    )
+                    exhausted = len(batch) < window - len(in_flight)
+                    for args, options in batch:
+                        context = None
+                        if hooks:
+                            context = CommandContext(args[0], args, conn)
+                            run_before_send(hooks, context)
+                        in_flight.append((args, options, context))
+                    if batch:
+                        await conn.send_packed_command(
+                            conn.pack_commands([args for args, _ in batch])
+                        )
+                if not in_flight:
+                    break
+                args, options, context = in_flight[0]
+                number += 1
+                try:
+                    response = await Redis.parse_response(
+                        self, conn, args[0], **options
+                    )
+                except ResponseError as e:
+                    in_flight.popleft()
+                    if context is not None:
+                        run_on_error(hooks, context, e)
+                    if raise_on_error:
+                        self.annotate_exception(e, number, args)
+                        raise
+                    yield e
+                    continue
+                in_flight.popleft()
+                if context is not None:
+                    run_after_reply(hooks, context, response)
+                yield response
+        except Exception as e:
+            # the commands still in flight won't be answered
+            for _, _, context in in_flight:
+                if context is not None:
+                    run_on_error(hooks, context, e)
+            raise
+        finally:
+            if stats is not None:
+                stats.record_command("PIPELINE", time.monotonic() - started)
+            if in_flight:
+                await conn.disconnect()
+            await self.connection_pool.release(conn)
+
+    @staticmethod
+    async def _stream_batch(
+        source: Union[Iterator, AsyncIterator], is_async: bool, count: int
+    ) -> List[Tuple[Sequence[EncodableT], Dict[str, Any]]]:
+        """
+        Pull up to ``count`` commands from ``source`` as ``(args, options)``
+        pairs. Fewer are returned once ``source`` is exhausted.
+        """
+        batch = []
+        for _ in range(count):
+            try:
+                if is_async:
+                    item = await source.__anext__()
+                else:
+                    item = next(source)
+            except (StopIteration, StopAsyncIteration):
+                break
+            if item is None:
+                raise DataError("stream commands must not be None")
+            if len(item) == 2 and isinstance(item[1], Mapping):
+                batch.append((tuple(item[0]), dict(item[1])))
+            else:
+                batch.append((item, {}))
+        return batch
 
     async def watch(self, *names: str):
         """Watches the values at keys ``names``"""
@@ -4572,6 +6086,7 @@ class Script:
             encoder = registered_client.connection_pool.get_encoder()
             script = encoder.encode(script)
         self.sha = hashlib.sha1(script).hexdigest()
+        registered_client.connection_pool.scripts.register(self.sha, self.script)
 
     async def __call__(
         self,
@@ -4593,13 +6108,107 @@ class Script:
         try:
             return await client.evalsha(self.sha, len(keys), *args)
         except NoScriptError:
+            registry = client.connection_pool.scripts
+            # the server may have lost its script cache, e.g. to a restart or
+            # a SCRIPT FLUSH from another client. which of the pool's servers
+            # answered isn't known here, so none of them is trusted
+            registry.invalidate()
             # Maybe the client is pointed to a differnet server than the client
             # that created this instance?
             # Overwrite the sha just in case there was a discrepancy.
             self.sha = await client.script_load(self.script)
+            registry.register(self.sha, self.script)
             return await client.evalsha(self.sha, len(keys), *args)
 
 
+class Library:
+    """
+    A library of Redis Functions returned by ``register_library``
+
+    Unlike scripts, functions persist across restarts and are replicated, so
+    the library's code is only sent to servers that don't have it yet: when
+    it is first called through a pool, or after "Function not found".
+    """
+
+    def __init__(self, registered_client: Redis, code: AnyStr):
+        self.registered_client = registered_client
+        self.code: AnyStr = code
+        header = code if isinstance(code, str) else code.decode()
+        header = header.split("\n", 1)[0]
+        match = re.match(r"#!\w+\s.*?\bname=(\S+)", header)
+        if match is None:
+            raise DataError(
+                "Library code must start with a '#!<engine> name=<library>' line"
+            )
+        self.name: str = match.group(1)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}<name={self.name}>"
+
+    async def load(self, client: Redis = None, replace: bool = False):
+        """
+        Load the library, unless the server already has a library of the
+        same name and ``replace`` isn't set
+        """
+        if client is None:
+            client = self.registered_client
+        pieces: List[EncodableT] = [b"REPLACE"] if replace else []
+        try:
+            await client.execute_command("FUNCTION LOAD", *pieces, self.code)
+        except ResponseError as e:
+            if not is_library_exists_error(e):
+                raise
+        # only a single connection client knows which server it talks to
+        if client.connection is not None:
+            client.connection_pool.scripts.mark_library(self.name, client.connection)
+
+    async def fcall(
+        self,
+        function: str,
+        keys: Collection[str] = None,
+        args: Iterable[EncodableT] = None,
+        client: Redis = None,
+    ):
+        """Invoke the library's ``function`` with ``keys`` and ``args``"""
+        return await self._call("FCALL", function, keys, args, client)
+
+    async def fcall_ro(
+        self,
+        function: str,
+        keys: Collection[str] = None,
+        args: Iterable[EncodableT] = None,
+        client: Redis = None,
+    ):
+        """
+        Invoke the library's read-only ``function`` with ``keys`` and
+        ``args``
+        """
+        return await self._call("FCALL_RO", function, keys, args, client)
+
+    async def _call(self, command, function, keys, args, client):
+        keys = tuple(keys or ())
+        args = keys + tuple(args or ())
+        if client is None:
+            client = self.registered_client
+        if isinstance(client, Pipeline):
+            # Make sure the pipeline can load the library before executing.
+            client.libraries.add(self)
+            return client.execute_command(command, function, len(keys), *args)
+        registry = client.connection_pool.scripts
+        try:
+            response = await client.execute_command(command, function, len(keys), *args)
+        except NoFunctionError:
+            # the server doesn't have the library, e.g. a fresh node or after
+            # a FUNCTION FLUSH from another client, so it may have lost the
+            # pool's other libraries as well
+            registry.forget_libraries(connection=client.connection)
+            await self.load(client)
+            return await client.execute_command(command, function, len(keys), *args)
+        if client.connection is not None:
+            registry.mark_library(self.name, client.connection)
+        return response
+
+
 class BitFieldOperation:
     """
     Command builder for BITFIELD commands.
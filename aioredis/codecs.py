@@ -0,0 +1,226 @@
+import zlib
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+from .exceptions import DataError
+
+try:
+    import lz4.frame
+
+    LZ4_AVAILABLE = True
+except ImportError:
+    LZ4_AVAILABLE = False
+
+try:
+    import zstandard
+
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+
+# Values written by a codec are either stored verbatim or prefixed with
+# MAGIC and a flags byte. The low two bits of the flags name the compressor
+# and bit 2 marks a serialized value. Flags of 0 escape raw values that
+# happen to start with MAGIC, so that they read back unchanged.
+MAGIC = b"\xf5\xf7RC"
+HEADER_SIZE = len(MAGIC) + 1
+HEADER_SERIALIZED = 0x04
+HEADER_COMPRESSION_MASK = 0x03
+HEADER_FLAGS_MASK = 0x07
+
+
+class Compressor(NamedTuple):
+    name: str
+    compress: Callable[[bytes, Optional[int]], bytes]
+    decompress: Callable[[bytes], bytes]
+
+
+def _zlib_compress(data: bytes, level: Optional[int]) -> bytes:
+    return zlib.compress(data, -1 if level is None else level)
+
+
+def _lz4_compress(data: bytes, level: Optional[int]) -> bytes:
+    return lz4.frame.compress(data, compression_level=level or 0)
+
+
+def _zstd_compress(data: bytes, level: Optional[int]) -> bytes:
+    return zstandard.ZstdCompressor(level=3 if level is None else level).compress(data)
+
+
+def _zstd_decompress(data: bytes) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+# compressor ids are part of the stored format and must never change
+COMPRESSORS: Dict[int, Compressor] = {
+    1: Compressor("zlib", _zlib_compress, zlib.decompress)
+}
+if LZ4_AVAILABLE:
+    COMPRESSORS[2] = Compressor("lz4", _lz4_compress, lz4.frame.decompress)
+if ZSTD_AVAILABLE:
+    COMPRESSORS[3] = Compressor("zstd", _zstd_compress, _zstd_decompress)
+COMPRESSION_IDS = {"zlib": 1, "lz4": 2, "zstd": 3}
+COMPRESSION_PACKAGES = {"lz4": "lz4", "zstd": "zstandard"}
+
+# the arguments of each command that hold values, which the codec applies
+# to. Every other argument, e.g. keys, hash fields and options, is sent as is
+VALUE_ARGS: Dict[bytes, slice] = {
+    b"SET": slice(2, 3),
+    b"SETNX": slice(2, 3),
+    b"GETSET": slice(2, 3),
+    b"SETEX": slice(3, 4),
+    b"PSETEX": slice(3, 4),
+    b"MSET": slice(2, None, 2),
+    b"MSETNX": slice(2, None, 2),
+    b"HSET": slice(3, None, 2),
+    b"HMSET": slice(3, None, 2),
+    b"HSETNX": slice(3, 4),
+    b"LPUSH": slice(2, None),
+    b"RPUSH": slice(2, None),
+    b"LPUSHX": slice(2, None),
+    b"RPUSHX": slice(2, None),
+    b"LSET": slice(3, 4),
+    b"LINSERT": slice(3, 5),
+    b"LREM": slice(3, 4),
+    b"LPOS": slice(2, 3),
+    b"SADD": slice(2, None),
+    b"SREM": slice(2, None),
+    b"SISMEMBER": slice(2, None),
+    b"SMISMEMBER": slice(2, None),
+    b"SMOVE": slice(3, 4),
+    b"PUBLISH": slice(2, 3),
+}
+
+
+class Codec:
+    """
+    Serializes and compresses values on their way to Redis and reverses it
+    on the way back. Pass an instance as ``codec`` to ``Redis``,
+    ``ConnectionPool`` or ``Connection``::
+
+        redis = Redis(codec=Codec(serializer=json, compression="zlib"))
+        await redis.set("doc", {"a": 1})
+        await redis.get("doc")  # {'a': 1}
+
+    ``serializer`` is any object with ``dumps`` and ``loads`` functions,
+    such as the ``json``, ``pickle`` or ``msgpack`` modules. It is applied
+    to values the encoder can't send natively, that is anything other than
+    bytes, str, int and float. Only use ``pickle`` with a server whose
+    contents you trust.
+
+    ``compression`` is one of ``"zlib"``, ``"lz4"`` or ``"zstd"``; the
+    latter two need the ``lz4`` and ``zstandard`` packages. Values of at
+    least ``compress_threshold`` bytes are compressed at ``compress_level``
+    when that makes them smaller.
+
+    The codec only applies to the values of the string, hash, list and set
+    commands and PUBLISH messages listed in ``VALUE_ARGS``. Keys, hash
+    fields, sorted set members, options and the arguments of scripts and
+    functions are sent as they are, and so are all arguments of other
+    commands.
+
+    Encoded values start with a five byte header, ``MAGIC`` and a flags
+    byte, so serialized, compressed and plain values can be mixed under the
+    same client and are told apart when read back. Replies without the
+    header, such as values written by other clients, are returned as they
+    are, and so are those that can't be decoded, e.g. a ``GETRANGE`` of a
+    compressed value.
+    """
+
+    __slots__ = ("serializer", "compression", "compress_threshold", "compress_level")
+
+    def __init__(
+        self,
+        serializer: Any = None,
+        compression: Optional[str] = None,
+        compress_threshold: int = 1024,
+        compress_level: Optional[int] = None,
+    ):
+        if serializer is not None and not (
+            callable(getattr(serializer, "dumps", None))
+            and callable(getattr(serializer, "loads", None))
+        ):
+            raise DataError("serializer must provide dumps() and loads()")
+        self.serializer = serializer
+        self.compression: Optional[int] = None
+        if compression is not None:
+            compression_id = COMPRESSION_IDS.get(compression)
+            if compression_id is None:
+                raise DataError(f"Unknown compression {compression!r}")
+            if compression_id not in COMPRESSORS:
+                package = COMPRESSION_PACKAGES[compression]
+                raise DataError(f"{compression} compression requires {package}")
+            self.compression = compression_id
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+
+    def __repr__(self):
+        serializer = getattr(self.serializer, "__name__", self.serializer)
+        compression = self.compression and COMPRESSORS[self.compression].name
+        return (
+            f"{self.__class__.__name__}<serializer={serializer},"
+            f"compression={compression}>"
+        )
+
+    def dumps(self, value: Any) -> bytes:
+        """Serialize ``value``, which the encoder can't send natively"""
+        if self.serializer is None:
+            typename = value.__class__.__name__
+            raise DataError(
+                f"Invalid input of type: {typename!r}. "
+                "Convert to a bytes, string, int or float first."
+            )
+        data = self.serializer.dumps(value)
+        if isinstance(data, str):
+            data = data.encode()
+        return self._pack(data, HEADER_SERIALIZED)
+
+    def pack(self, data: bytes) -> bytes:
+        """Compress or escape an already encoded value as needed"""
+        if (
+            self.compression is None or len(data) < self.compress_threshold
+        ) and not data.startswith(MAGIC):
+            return data
+        return self._pack(data, 0)
+
+    def _pack(self, data: bytes, flags: int) -> bytes:
+        if self.compression is not None and len(data) >= self.compress_threshold:
+            compressed = COMPRESSORS[self.compression].compress(
+                data, self.compress_level
+            )
+            if len(compressed) < len(data):
+                return MAGIC + bytes((flags | self.compression,)) + compressed
+        if not flags and not data.startswith(MAGIC):
+            return data
+        return MAGIC + bytes((flags,)) + data
+
+    def loads(self, data: bytes) -> Any:
+        """
+        Reverse ``dumps`` or ``pack``. Data without the header, or that
+        can't be decoded, is returned as is.
+        """
+        if (
+            len(data) < HEADER_SIZE
+            or not data.startswith(MAGIC)
+            or data[HEADER_SIZE - 1] & ~HEADER_FLAGS_MASK
+        ):
+            return data
+        flags = data[HEADER_SIZE - 1]
+        compression_id = flags & HEADER_COMPRESSION_MASK
+        compressor = COMPRESSORS.get(compression_id)
+        if compression_id and compressor is None:
+            name = {v: k for k, v in COMPRESSION_IDS.items()}[compression_id]
+            package = COMPRESSION_PACKAGES[name]
+            raise DataError(f"Decoding {name} compressed values requires {package}")
+        if flags & HEADER_SERIALIZED and self.serializer is None:
+            raise DataError("Decoding serialized values requires a serializer")
+        try:
+            value = data[HEADER_SIZE:]
+            if compressor is not None:
+                value = compressor.decompress(value)
+            if flags & HEADER_SERIALIZED:
+                value = self.serializer.loads(value)
+        except Exception:
+            # e.g. part of a value read with GETRANGE
+            return data
+        return value
@@ -1,4 +1,5 @@
 import asyncio
+import codecs
 import errno
 import inspect
 import io
@@ -12,6 +13,8 @@ from distutils.version import StrictVersion
 from itertools import chain
 from typing import (
     Any,
+    Callable,
+    Dict,
     Iterable,
     List,
     Mapping,
@@ -26,6 +29,7 @@ from urllib.parse import ParseResult, parse_qs, unquote, urlparse
 
 import async_timeout
 
+from .codecs import VALUE_ARGS, Codec
 from .compat import Protocol, TypedDict
 from .exceptions import (
     AuthenticationError,
@@ -37,6 +41,7 @@ from .exceptions import (
     ExecAbortError,
     InvalidResponse,
     ModuleError,
+    NoFunctionError,
     NoPermissionError,
     NoScriptError,
     ReadOnlyError,
@@ -44,6 +49,8 @@ from .exceptions import (
     ResponseError,
     TimeoutError,
 )
+from .scripts import ScriptRegistry
+from .stats import PoolStats
 from .utils import str_if_bytes
 
 NONBLOCKING_EXCEPTION_ERROR_NUMBERS = {
@@ -71,12 +78,25 @@ else:
         )
         HIREDIS_AVAILABLE = False
 
+# whether Reader.gets() takes a flag to skip decoding a single reply
+HIREDIS_GETS_CAN_SKIP_DECODING = False
+if HIREDIS_AVAILABLE:
+    try:
+        hiredis.Reader().gets(False)
+    except TypeError:
+        pass
+    else:
+        HIREDIS_GETS_CAN_SKIP_DECODING = True
+
 SYM_STAR = b"*"
 SYM_DOLLAR = b"$"
 SYM_CRLF = b"\r\n"
 SYM_LF = b"\n"
 SYM_EMPTY = b""
 
+# the commands connections are checked out for that don't preload scripts
+UNSCRIPTED_COMMANDS = frozenset(("pubsub", "MONITOR"))
+
 SERVER_CLOSED_CONNECTION_ERROR = "Connection closed by server."
 
 SENTINEL = object()
@@ -94,18 +114,58 @@ DecodedT = Union[str, int, float]
 EncodableT = Union[EncodedT, DecodedT, None]
 
 
+# integers in this range are encoded once at import and looked up afterwards
+SMALL_INT_ENCODINGS: Dict[int, bytes] = {i: b"%d" % i for i in range(-256, 4096)}
+
+
+def encode_length(length: int) -> bytes:
+    """Encode a non-negative ``int`` such as a RESP length prefix"""
+    return SMALL_INT_ENCODINGS.get(length) or b"%d" % length
+
+
 class Encoder:
     """Encode strings to bytes-like and decode bytes-like to strings"""
 
-    __slots__ = "encoding", "encoding_errors", "decode_responses"
+    __slots__ = (
+        "encoding",
+        "encoding_errors",
+        "decode_responses",
+        "codec",
+        "_default_encoding",
+    )
 
-    def __init__(self, encoding: str, encoding_errors: str, decode_responses: bool):
+    def __init__(
+        self,
+        encoding: str,
+        encoding_errors: str,
+        decode_responses: bool,
+        codec: Optional[Codec] = None,
+    ):
         self.encoding = encoding
         self.encoding_errors = encoding_errors
         self.decode_responses = decode_responses
+        self.codec = codec
+        # str.encode() without arguments is noticeably faster
+        self._default_encoding = (
+            codecs.lookup(encoding).name == "utf-8" and encoding_errors == "strict"
+        )
 
     def encode(self, value: EncodableT) -> EncodedT:
         """Return a bytestring or bytes-like representation of the value"""
+        # fast path for exact builtin types; subclasses such as bool and
+        # str enums take the isinstance checks below
+        kind = type(value)
+        if kind is str:
+            if self._default_encoding:
+                return value.encode()
+            return value.encode(self.encoding, self.encoding_errors)
+        if kind is bytes:
+            return value
+        if kind is int:
+            return SMALL_INT_ENCODINGS.get(value) or b"%d" % value
+        if kind is float:
+            # same bytes as repr(value).encode() without the str copy
+            return b"%r" % value
         if isinstance(value, (bytes, memoryview)):
             return value
         if isinstance(value, bool):
@@ -123,12 +183,24 @@ class Encoder:
                 f"Invalid input of type: {typename!r}. "
                 "Convert to a bytes, string, int or float first."
             )
-        if isinstance(value, str):
-            return value.encode(self.encoding, self.encoding_errors)
-        return value
+        return value.encode(self.encoding, self.encoding_errors)
+
+    def encode_value(self, value: EncodableT) -> EncodedT:
+        """
+        Encode a stored value such as the value of SET, serializing and
+        compressing it with the codec if one is configured
+        """
+        codec = self.codec
+        if codec is None or isinstance(value, memoryview):
+            return self.encode(value)
+        if isinstance(value, bool) or not isinstance(value, (bytes, str, int, float)):
+            return codec.dumps(value)
+        return codec.pack(self.encode(value))
 
     def decode(self, value: EncodableT, force=False) -> EncodableT:
         """Return a unicode string from the bytes-like representation"""
+        if self.codec is not None and isinstance(value, bytes):
+            value = self.codec.loads(value)
         if self.decode_responses or force:
             if isinstance(value, memoryview):
                 return value.tobytes().decode(self.encoding, self.encoding_errors)
@@ -136,6 +208,48 @@ class Encoder:
                 return value.decode(self.encoding, self.encoding_errors)
         return value
 
+    def decode_as(self, value: Any, decode: bool) -> Any:
+        """
+        Decode a reply read with ``disable_decoding``, applying the codec
+        and decoding bulk strings to text if ``decode`` is True, whatever
+        ``decode_responses`` says
+        """
+        if not decode and self.codec is None:
+            return value
+        if isinstance(value, bytes):
+            if self.codec is not None:
+                value = self.codec.loads(value)
+            if decode and isinstance(value, bytes):
+                return value.decode(self.encoding, self.encoding_errors)
+            return value
+        if isinstance(value, list):
+            return [self.decode_as(item, decode) for item in value]
+        return value
+
+    def decode_nested(self, value: Any, force=False) -> Any:
+        """``decode`` every bulk string of a parsed, possibly nested, reply"""
+        if isinstance(value, bytes):
+            return self.decode(value, force)
+        if isinstance(value, list):
+            return [self.decode_nested(item, force) for item in value]
+        return value
+
+
+def make_encoder(
+    encoder_class: Type[Encoder],
+    encoding: str,
+    encoding_errors: str,
+    decode_responses: bool,
+    codec: Optional[Codec] = None,
+) -> Encoder:
+    """
+    Instantiate ``encoder_class``, passing ``codec`` only if one is given so
+    that custom encoder classes without a codec parameter keep working
+    """
+    if codec is None:
+        return encoder_class(encoding, encoding_errors, decode_responses)
+    return encoder_class(encoding, encoding_errors, decode_responses, codec=codec)
+
 
 ExceptionMappingT = Mapping[str, Union[Type[Exception], Mapping[str, Type[Exception]]]]
 
@@ -143,7 +257,7 @@ ExceptionMappingT = Mapping[str, Union[Type[Exception], Mapping[str, Type[Except
 class BaseParser:
     """Plain Python parsing class"""
 
-    __slots__ = "_stream", "_buffer", "_read_size"
+    __slots__ = "_stream", "_buffer", "_read_size", "_bytes_received"
 
     EXCEPTION_CLASSES: ExceptionMappingT = {
         "ERR": {
@@ -160,6 +274,7 @@ class BaseParser:
             MODULE_EXPORTS_DATA_TYPES_ERROR: ModuleError,
             NO_SUCH_MODULE_ERROR: ModuleError,
             MODULE_UNLOAD_NOT_POSSIBLE_ERROR: ModuleError,
+            "Function not found": NoFunctionError,
         },
         "EXECABORT": ExecAbortError,
         "LOADING": BusyLoadingError,
@@ -173,6 +288,7 @@ class BaseParser:
         self._stream: Optional[asyncio.StreamReader] = None
         self._buffer: Optional[SocketBuffer] = None
         self._read_size = socket_read_size
+        self._bytes_received = 0
 
     def __del__(self):
         try:
@@ -191,6 +307,11 @@ class BaseParser:
             return exception_class(response)
         return ResponseError(response)
 
+    @property
+    def bytes_received(self) -> int:
+        """Total number of bytes read from the socket by this parser"""
+        return self._bytes_received
+
     def on_disconnect(self):
         raise NotImplementedError()
 
@@ -200,7 +321,21 @@ class BaseParser:
     async def can_read(self, timeout: float) -> bool:
         raise NotImplementedError()
 
-    async def read_response(self) -> Union[EncodableT, ResponseError, None]:
+    def can_read_buffered(self) -> bool:
+        """
+        Whether a response has already been read from the socket, so
+        ``read_response()`` can return it without waiting for more data.
+        """
+        raise NotImplementedError()
+
+    async def read_response(
+        self, disable_decoding: bool = False
+    ) -> Union[EncodableT, ResponseError, None]:
+        """
+        Read the next reply. With ``disable_decoding``, bulk strings are
+        returned as the raw bytes sent by the server, regardless of
+        ``decode_responses`` or a configured codec.
+        """
         raise NotImplementedError()
 
 
@@ -226,6 +361,9 @@ class SocketBuffer:
         self.bytes_written = 0
         # number of bytes read from the buffer
         self.bytes_read = 0
+        # number of bytes read from the socket over the buffer's lifetime;
+        # unlike ``bytes_written`` this isn't reset by ``purge()``
+        self.bytes_received = 0
 
     @property
     def length(self):
@@ -252,6 +390,7 @@ class SocketBuffer:
                 buf.write(data)
                 data_length = len(data)
                 self.bytes_written += data_length
+                self.bytes_received += data_length
                 marker += data_length
 
                 if length is not None and length > marker:
@@ -270,6 +409,9 @@ class SocketBuffer:
             if not raise_on_timeout and ex.errno == allowed:
                 return False
             raise ConnectionError(f"Error while reading from socket: {ex.args}")
+        except OSError as ex:
+            # e.g. a reset by the peer while replies were still being read
+            raise ConnectionError(f"Error while reading from socket: {ex.args}")
 
     async def can_read(self, timeout: float) -> bool:
         return bool(self.length) or await self._read_from_socket(
@@ -355,14 +497,28 @@ class PythonParser(BaseParser):
         if self._stream is not None:
             self._stream = None
         if self._buffer is not None:
+            self._bytes_received += self._buffer.bytes_received
             self._buffer.close()
             self._buffer = None
         self.encoder = None
 
+    @property
+    def bytes_received(self) -> int:
+        if self._buffer is not None:
+            return self._bytes_received + self._buffer.bytes_received
+        return self._bytes_received
+
     async def can_read(self, timeout: float):
         return self._buffer and bool(await self._buffer.can_read(timeout))
 
-    async def read_response(self) -> Union[EncodableT, ResponseError, None]:
+    def can_read_buffered(self) -> bool:
+        # the buffer may only hold the beginning of a response, in which case
+        # the rest is already on its way
+        return bool(self._buffer and self._buffer.length)
+
+    async def read_response(
+        self, disable_decoding: bool = False
+    ) -> Union[EncodableT, ResponseError, None]:
         if not self._buffer:
             raise ConnectionError(SERVER_CLOSED_CONNECTION_ERROR)
         raw = await self._buffer.readline()
@@ -404,8 +560,10 @@ class PythonParser(BaseParser):
             length = int(response)
             if length == -1:
                 return None
-            response = [(await self.read_response()) for _ in range(length)]
-        if isinstance(response, bytes):
+            response = [
+                (await self.read_response(disable_decoding)) for _ in range(length)
+            ]
+        if isinstance(response, bytes) and not disable_decoding:
             response = self.encoder.decode(response)
         return response
 
@@ -413,7 +571,13 @@ class PythonParser(BaseParser):
 class HiredisParser(BaseParser):
     """Parser class for connections using Hiredis"""
 
-    __slots__ = BaseParser.__slots__ + ("_next_response", "_reader", "_socket_timeout")
+    __slots__ = BaseParser.__slots__ + (
+        "_next_response",
+        "_reader",
+        "_socket_timeout",
+        "_decode",
+        "_encoding",
+    )
 
     def __init__(self, socket_read_size: int):
         if not HIREDIS_AVAILABLE:
@@ -422,6 +586,8 @@ class HiredisParser(BaseParser):
         self._next_response = ...
         self._reader: Optional[hiredis.Reader] = None
         self._socket_timeout: Optional[float] = None
+        self._decode: Optional[Callable[[Any], Any]] = None
+        self._encoding: Optional[Tuple[str, str]] = None
 
     def on_connect(self, connection: "Connection"):
         self._stream = connection._reader
@@ -429,11 +595,17 @@ class HiredisParser(BaseParser):
             "protocolError": InvalidResponse,
             "replyError": self.parse_error,
         }
-        if connection.encoder.decode_responses:
+        encoder = connection.encoder
+        # hiredis can't apply a codec, so with one the replies are decoded
+        # once parsed rather than handing the encoding to hiredis
+        self._decode = encoder.decode_nested if encoder.codec is not None else None
+        self._encoding = None
+        if encoder.decode_responses and self._decode is None:
             kwargs.update(
-                encoding=connection.encoder.encoding,
-                errors=connection.encoder.encoding_errors,
+                encoding=encoder.encoding,
+                errors=encoder.encoding_errors,
             )
+            self._encoding = (encoder.encoding, encoder.encoding_errors)
 
         self._reader = hiredis.Reader(**kwargs)
         self._next_response = False
@@ -448,12 +620,26 @@ class HiredisParser(BaseParser):
         if not self._reader:
             raise ConnectionError(SERVER_CLOSED_CONNECTION_ERROR)
 
-        if self._next_response is False:
-            self._next_response = self._reader.gets()
+        self._peek()
         if self._next_response is False:
             return await self.read_from_socket(timeout=timeout, raise_on_timeout=False)
         return True
 
+    def can_read_buffered(self) -> bool:
+        if not self._reader:
+            return False
+        self._peek()
+        return self._next_response is not False
+
+    def _peek(self):
+        # the reply is cached undecoded where hiredis allows, so that
+        # read_response can still honour disable_decoding
+        if self._next_response is False:
+            if HIREDIS_GETS_CAN_SKIP_DECODING:
+                self._next_response = self._reader.gets(False)
+            else:
+                self._next_response = self._reader.gets()
+
     async def read_from_socket(
         self, timeout: Optional[float] = SENTINEL, raise_on_timeout: bool = True
     ):
@@ -464,6 +650,7 @@ class HiredisParser(BaseParser):
             if not isinstance(buffer, bytes) or len(buffer) == 0:
                 raise ConnectionError(SERVER_CLOSED_CONNECTION_ERROR) from None
             self._reader.feed(buffer)
+            self._bytes_received += len(buffer)
             # data was read from the socket and added to the buffer.
             # return True to indicate that data was read.
             return True
@@ -482,8 +669,11 @@ class HiredisParser(BaseParser):
             if not raise_on_timeout and ex.errno == allowed:
                 return False
             raise ConnectionError(f"Error while reading from socket: {ex.args}")
+        except OSError as ex:
+            # e.g. a reset by the peer while replies were still being read
+            raise ConnectionError(f"Error while reading from socket: {ex.args}")
 
-    async def read_response(self) -> EncodableT:
+    async def read_response(self, disable_decoding: bool = False) -> EncodableT:
         if not self._stream or not self._reader:
             self.on_disconnect()
             raise ConnectionError(SERVER_CLOSED_CONNECTION_ERROR) from None
@@ -492,12 +682,21 @@ class HiredisParser(BaseParser):
         if self._next_response is not False:
             response = self._next_response
             self._next_response = False
-            return response
-
-        response = self._reader.gets()
-        while response is False:
-            await self.read_from_socket()
-            response = self._reader.gets()
+            if (
+                not disable_decoding
+                and self._encoding is not None
+                and HIREDIS_GETS_CAN_SKIP_DECODING
+            ):
+                response = self._decode_nested(response)
+        else:
+            gets = self._reader.gets
+            args = ()
+            if disable_decoding and HIREDIS_GETS_CAN_SKIP_DECODING:
+                args = (False,)
+            response = gets(*args)
+            while response is False:
+                await self.read_from_socket()
+                response = gets(*args)
 
         # if the response is a ConnectionError or the response is a list and
         # the first item is a ConnectionError, raise it as something bad
@@ -510,6 +709,27 @@ class HiredisParser(BaseParser):
             and isinstance(response[0], ConnectionError)
         ):
             raise response[0]
+        if disable_decoding:
+            if self._encoding is not None and not HIREDIS_GETS_CAN_SKIP_DECODING:
+                # older hiredis decodes every reply; undo it
+                return self._encode_nested(response)
+            return response
+        if self._decode is not None:
+            return self._decode(response)
+        return response
+
+    def _encode_nested(self, response: Any) -> Any:
+        if isinstance(response, str):
+            return response.encode(*self._encoding)
+        if isinstance(response, list):
+            return [self._encode_nested(item) for item in response]
+        return response
+
+    def _decode_nested(self, response: Any) -> Any:
+        if isinstance(response, bytes):
+            return response.decode(*self._encoding)
+        if isinstance(response, list):
+            return [self._decode_nested(item) for item in response]
         return response
 
 
@@ -561,6 +781,10 @@ class Connection:
         "_connect_callbacks",
         "_buffer_cutoff",
         "_loop",
+        "_connected_before",
+        "stats",
+        "scripts",
+        "bytes_sent",
         "__dict__",
     )
 
@@ -586,6 +810,7 @@ class Connection:
         client_name: str = None,
         username: str = None,
         encoder_class: Type[Encoder] = Encoder,
+        codec: Optional[Codec] = None,
         loop: asyncio.AbstractEventLoop = None,
     ):
         self.pid = os.getpid()
@@ -604,7 +829,9 @@ class Connection:
         self.health_check_interval = health_check_interval
         self.next_health_check = 0
         self.ssl_context: Optional[RedisSSLContext] = None
-        self.encoder = encoder_class(encoding, encoding_errors, decode_responses)
+        self.encoder = make_encoder(
+            encoder_class, encoding, encoding_errors, decode_responses, codec
+        )
         self._reader: Optional[asyncio.StreamReader] = None
         self._writer: Optional[asyncio.StreamWriter] = None
         self._parser = parser_class(
@@ -613,6 +840,12 @@ class Connection:
         self._connect_callbacks: List[ConnectCallbackT] = []
         self._buffer_cutoff = 6000
         self._loop = loop
+        self._connected_before = False
+        # set by the owning pool when it collects statistics
+        self.stats: Optional[PoolStats] = None
+        # set by the owning pool for connections that preload its scripts
+        self.scripts: Optional[ScriptRegistry] = None
+        self.bytes_sent = 0
 
     def __repr__(self):
         repr_args = ",".join((f"{k}={v}" for k, v in self.repr_pieces()))
@@ -640,6 +873,11 @@ class Connection:
     def is_connected(self):
         return bool(self._reader and self._writer)
 
+    @property
+    def bytes_received(self) -> int:
+        """Total number of bytes read from the server by this connection"""
+        return self._parser.bytes_received
+
     def register_connect_callback(self, callback):
         self._connect_callbacks.append(callback)
 
@@ -650,24 +888,43 @@ class Connection:
         """Connects to the Redis server if not already connected"""
         if self.is_connected:
             return
+        stats = self.stats
+        if stats is not None:
+            started = time.monotonic()
         try:
             await self._connect()
         except asyncio.CancelledError:
             raise
         except (socket.timeout, asyncio.TimeoutError):
+            if stats is not None:
+                stats.record_timeout()
             raise TimeoutError("Timeout connecting to server")
         except OSError as e:
+            if stats is not None:
+                stats.record_error()
             raise ConnectionError(self._error_message(e))
         except Exception as exc:
+            if stats is not None:
+                stats.record_error()
             raise ConnectionError(exc) from exc
 
         try:
             await self.on_connect()
+            if self.scripts is not None:
+                await self.scripts.on_connect(self, self._connected_before)
         except RedisError:
             # clean up after any error in on_connect
             await self.disconnect()
+            if stats is not None:
+                stats.record_error()
             raise
 
+        if stats is not None:
+            stats.record_connect(
+                time.monotonic() - started, reconnect=self._connected_before
+            )
+        self._connected_before = True
+
         # run any user callbacks. right now the only internal callback
         # is for pubsub channel/pattern resubscription
         for callback in self._connect_callbacks:
@@ -692,16 +949,15 @@ class Connection:
                     sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
                     for k, v in self.socket_keepalive_options.items():
                         sock.setsockopt(socket.SOL_TCP, k, v)
-                # set the socket_timeout now that we're connected
-                if self.socket_timeout is not None:
-                    sock.settimeout(self.socket_timeout)
-
             except (OSError, TypeError):
                 # `socket_keepalive_options` might contain invalid options
                 # causing an error. Do not leave the connection open.
                 writer.close()
                 raise
 
+    def _host_error(self) -> str:
+        return f"{self.host}:{self.port}"
+
     def _error_message(self, exception):
         # args for socket.error can either be (errno, "message")
         # or just "message"
@@ -809,12 +1065,17 @@ class Connection:
             if isinstance(command, bytes):
                 command = [command]
             self._writer.writelines(command)
+            self.bytes_sent += sum(map(len, command))
             await self._writer.drain()
         except asyncio.TimeoutError:
             await self.disconnect()
+            if self.stats is not None:
+                self.stats.record_timeout()
             raise TimeoutError("Timeout writing to socket") from None
         except OSError as e:
             await self.disconnect()
+            if self.stats is not None:
+                self.stats.record_error()
             if len(e.args) == 1:
                 errno, errmsg = "UNKNOWN", e.args[0]
             else:
@@ -841,16 +1102,34 @@ class Connection:
             await self.connect()
         return await self._parser.can_read(timeout)
 
-    async def read_response(self):
-        """Read the response from a previously sent command"""
+    def can_read_buffered(self) -> bool:
+        """
+        Whether a response can be read without waiting for the socket. Unlike
+        ``can_read(timeout=0)`` this never yields to the event loop.
+        """
+        return self._parser.can_read_buffered()
+
+    async def read_response(self, disable_decoding: bool = False):
+        """
+        Read the response from a previously sent command. With
+        ``disable_decoding``, bulk strings are returned as raw bytes even if
+        the connection decodes responses.
+        """
         try:
             async with async_timeout.timeout(self.socket_timeout):
-                response = await self._parser.read_response()
+                response = await self._parser.read_response(disable_decoding)
         except asyncio.TimeoutError:
             await self.disconnect()
-            raise TimeoutError(f"Timeout reading from {self.host}:{self.port}")
-        except BaseException:
+            if self.stats is not None:
+                self.stats.record_timeout()
+            raise TimeoutError(f"Timeout reading from {self._host_error()}")
+        except BaseException as e:
             await self.disconnect()
+            if self.stats is not None:
+                if isinstance(e, TimeoutError):
+                    self.stats.record_timeout()
+                elif isinstance(e, ConnectionError):
+                    self.stats.record_error()
             raise
 
         if self.health_check_interval:
@@ -873,10 +1152,22 @@ class Connection:
         elif b" " in args[0]:
             args = tuple(args[0].split()) + args[1:]
 
-        buff = SYM_EMPTY.join((SYM_STAR, str(len(args)).encode(), SYM_CRLF))
-
+        buff = SYM_EMPTY.join((SYM_STAR, encode_length(len(args)), SYM_CRLF))
+
+        encoder = self.encoder
+        encoded = map(encoder.encode, args)
+        if encoder.codec is not None:
+            values = VALUE_ARGS.get(args[0].upper())
+            if values is not None:
+                # only stored values go through the codec, never the keys,
+                # fields or options around them
+                values = frozenset(range(len(args))[values])
+                encoded = (
+                    encoder.encode_value(arg) if i in values else encoder.encode(arg)
+                    for i, arg in enumerate(args)
+                )
         buffer_cutoff = self._buffer_cutoff
-        for arg in map(self.encoder.encode, args):
+        for arg in encoded:
             # to avoid large string mallocs, chunk the command into the
             # output list if we're sending large values or memoryviews
             arg_length = len(arg)
@@ -886,7 +1177,7 @@ class Connection:
                 or isinstance(arg, memoryview)
             ):
                 buff = SYM_EMPTY.join(
-                    (buff, SYM_DOLLAR, str(arg_length).encode(), SYM_CRLF)
+                    (buff, SYM_DOLLAR, encode_length(arg_length), SYM_CRLF)
                 )
                 output.append(buff)
                 output.append(arg)
@@ -896,7 +1187,7 @@ class Connection:
                     (
                         buff,
                         SYM_DOLLAR,
-                        str(arg_length).encode(),
+                        encode_length(arg_length),
                         SYM_CRLF,
                         arg,
                         SYM_CRLF,
@@ -1034,6 +1325,7 @@ class UnixDomainSocketConnection(Connection):  # lgtm [py/missing-call-to-init]
         username: str = None,
         password: str = None,
         socket_timeout: float = None,
+        socket_connect_timeout: float = None,
         encoding: str = "utf-8",
         encoding_errors: str = "strict",
         decode_responses: bool = False,
@@ -1042,6 +1334,8 @@ class UnixDomainSocketConnection(Connection):  # lgtm [py/missing-call-to-init]
         socket_read_size: int = 65536,
         health_check_interval: float = 0.0,
         client_name=None,
+        encoder_class: Type[Encoder] = Encoder,
+        codec: Optional[Codec] = None,
         loop: asyncio.AbstractEventLoop = None,
     ):
         self.pid = os.getpid()
@@ -1051,15 +1345,23 @@ class UnixDomainSocketConnection(Connection):  # lgtm [py/missing-call-to-init]
         self.client_name = client_name
         self.password = password
         self.socket_timeout = socket_timeout
+        self.socket_connect_timeout = socket_connect_timeout or socket_timeout or None
         self.retry_on_timeout = retry_on_timeout
         self.health_check_interval = health_check_interval
         self.next_health_check = 0
-        self.encoder = Encoder(encoding, encoding_errors, decode_responses)
-        self._sock = None
+        self.encoder = make_encoder(
+            encoder_class, encoding, encoding_errors, decode_responses, codec
+        )
+        self._reader = None
+        self._writer = None
         self._parser = parser_class(socket_read_size=socket_read_size)
         self._connect_callbacks = []
         self._buffer_cutoff = 6000
         self._loop = loop
+        self._connected_before = False
+        self.stats = None
+        self.scripts = None
+        self.bytes_sent = 0
 
     def repr_pieces(self) -> Iterable[Tuple[str, Union[str, int]]]:
         pieces = [
@@ -1071,11 +1373,13 @@ class UnixDomainSocketConnection(Connection):  # lgtm [py/missing-call-to-init]
         return pieces
 
     async def _connect(self):
-        async with async_timeout.timeout(self._connect_timeout):
+        async with async_timeout.timeout(self.socket_connect_timeout):
             reader, writer = await asyncio.open_unix_connection(path=self.path)
         self._reader = reader
         self._writer = writer
-        await self.on_connect()
+
+    def _host_error(self) -> str:
+        return self.path
 
     def _error_message(self, exception):
         # args for socket.error can either be (errno, "message")
@@ -1109,6 +1413,7 @@ URL_QUERY_ARGUMENT_PARSERS = {
     "max_connections": int,
     "health_check_interval": int,
     "ssl_check_hostname": to_bool,
+    "collect_stats": to_bool,
 }
 
 
@@ -1186,6 +1491,10 @@ class ConnectionPool:
     is specified. Use :py:class:`~redis.UnixDomainSocketConnection` for
     unix sockets.
 
+    If ``collect_stats`` is set, the pool and its connections record
+    checkout, connect and command latencies as well as error counters into
+    :py:attr:`stats`. See :py:meth:`get_stats` for a snapshot.
+
     Any additional keyword arguments are passed to the constructor of
     ``connection_class``.
     """
@@ -1238,6 +1547,7 @@ class ConnectionPool:
         self,
         connection_class: Type[Connection] = Connection,
         max_connections: int = None,
+        collect_stats: bool = False,
         **connection_kwargs,
     ):
         max_connections = max_connections or 2 ** 31
@@ -1247,6 +1557,8 @@ class ConnectionPool:
         self.connection_class = connection_class
         self.connection_kwargs = connection_kwargs
         self.max_connections = max_connections
+        self.stats: Optional[PoolStats] = PoolStats() if collect_stats else None
+        self.scripts = ScriptRegistry()
 
         # a lock to protect the critical section in _checkpid().
         # this lock is acquired when the process id changes, such as
@@ -1338,13 +1650,26 @@ class ConnectionPool:
     async def get_connection(self, command_name, *keys, **options):
         """Get a connection from the pool"""
         self._checkpid()
+        stats = self.stats
+        if stats is not None:
+            started = time.monotonic()
         async with self._lock:
             try:
                 connection = self._available_connections.pop()
             except IndexError:
-                connection = self.make_connection()
+                try:
+                    connection = self.make_connection()
+                except ConnectionError:
+                    if stats is not None:
+                        stats.record_checkout_error()
+                    raise
             self._in_use_connections.add(connection)
 
+        # pubsub and MONITOR connections can't run scripts, so they don't
+        # preload them
+        connection.scripts = (
+            None if command_name in UNSCRIPTED_COMMANDS else self.scripts
+        )
         try:
             # ensure this connection is connected to Redis
             await connection.connect()
@@ -1364,17 +1689,23 @@ class ConnectionPool:
             # release the connection back to the pool so that we don't
             # leak it
             await self.release(connection)
+            if stats is not None:
+                stats.record_checkout_error()
             raise
 
+        if stats is not None:
+            stats.record_checkout(time.monotonic() - started)
         return connection
 
     def get_encoder(self):
         """Return an encoder based on encoding settings"""
         kwargs = self.connection_kwargs
-        return self.encoder_class(
-            encoding=kwargs.get("encoding", "utf-8"),
-            encoding_errors=kwargs.get("encoding_errors", "strict"),
-            decode_responses=kwargs.get("decode_responses", False),
+        return make_encoder(
+            self.encoder_class,
+            kwargs.get("encoding", "utf-8"),
+            kwargs.get("encoding_errors", "strict"),
+            kwargs.get("decode_responses", False),
+            kwargs.get("codec"),
         )
 
     def make_connection(self):
@@ -1382,7 +1713,9 @@ class ConnectionPool:
         if self._created_connections >= self.max_connections:
             raise ConnectionError("Too many connections")
         self._created_connections += 1
-        return self.connection_class(**self.connection_kwargs)
+        connection = self.connection_class(**self.connection_kwargs)
+        connection.stats = self.stats
+        return connection
 
     async def release(self, connection: Connection):
         """Releases the connection back to the pool"""
@@ -1408,6 +1741,31 @@ class ConnectionPool:
     def owns_connection(self, connection: Connection):
         return connection.pid == self.pid
 
+    def _idle_and_in_use(self) -> Tuple[List[Connection], List[Connection]]:
+        return list(self._available_connections), list(self._in_use_connections)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Return a snapshot of the pool's state as a plain dict.
+
+        Connection counts and byte counters are always reported. Latency
+        histograms and error counters are included when the pool was
+        created with ``collect_stats=True``.
+        """
+        idle, in_use = self._idle_and_in_use()
+        connections = idle + in_use
+        snapshot: Dict[str, Any] = {
+            "max_connections": self.max_connections,
+            "created_connections": len(connections),
+            "in_use_connections": len(in_use),
+            "idle_connections": len(idle),
+            "bytes_sent": sum(c.bytes_sent for c in connections),
+            "bytes_received": sum(c.bytes_received for c in connections),
+        }
+        if self.stats is not None:
+            snapshot.update(self.stats.snapshot())
+        return snapshot
+
     async def disconnect(self, inuse_connections: bool = True):
         """
         Disconnects connections in the pool
@@ -1497,6 +1855,8 @@ class BlockingConnectionPool(ConnectionPool):
         # Keep a list of actual connection instances so that we can
         # disconnect them later.
         self._connections = []
+        self._in_use_connections = set()
+        self._lock = asyncio.Lock()
 
         # this must be the last operation in this method. while reset() is
         # called when holding _fork_lock, other threads in this process
@@ -1512,9 +1872,15 @@ class BlockingConnectionPool(ConnectionPool):
     def make_connection(self):
         """Make a fresh connection."""
         connection = self.connection_class(**self.connection_kwargs)
+        connection.stats = self.stats
         self._connections.append(connection)
         return connection
 
+    def _idle_and_in_use(self) -> Tuple[List[Connection], List[Connection]]:
+        in_use = list(self._in_use_connections)
+        idle = [c for c in self._connections if c not in self._in_use_connections]
+        return idle, in_use
+
     async def get_connection(self, command_name, *keys, **options):
         """
         Get a connection, blocking for ``self.timeout`` until a connection
@@ -1529,6 +1895,10 @@ class BlockingConnectionPool(ConnectionPool):
         """
         # Make sure we haven't changed process.
         self._checkpid()
+        stats = self.stats
+        if stats is not None:
+            started = time.monotonic()
+            stats.waiting += 1
 
         # Try and get a connection from the pool. If one isn't available within
         # self.timeout then raise a ``ConnectionError``.
@@ -1537,15 +1907,26 @@ class BlockingConnectionPool(ConnectionPool):
             async with async_timeout.timeout(self.timeout):
                 connection = await self.pool.get()
         except (asyncio.QueueEmpty, asyncio.TimeoutError):
+            if stats is not None:
+                stats.record_checkout_error()
             # Note that this is not caught by the redis client and will be
             # raised unless handled by application code. If you want never to
             raise ConnectionError("No connection available.")
+        finally:
+            if stats is not None:
+                stats.waiting -= 1
 
         # If the ``connection`` is actually ``None`` then that's a cue to make
         # a new connection to add to the pool.
         if connection is None:
             connection = self.make_connection()
+        self._in_use_connections.add(connection)
 
+        # pubsub and MONITOR connections can't run scripts, so they don't
+        # preload them
+        connection.scripts = (
+            None if command_name in UNSCRIPTED_COMMANDS else self.scripts
+        )
         try:
             # ensure this connection is connected to Redis
             await connection.connect()
@@ -1564,14 +1945,19 @@ class BlockingConnectionPool(ConnectionPool):
         except BaseException:
             # release the connection back to the pool so that we don't leak it
             await self.release(connection)
+            if stats is not None:
+                stats.record_checkout_error()
             raise
 
+        if stats is not None:
+            stats.record_checkout(time.monotonic() - started)
         return connection
 
     async def release(self, connection: Connection):
         """Releases the connection back to the pool."""
         # Make sure we haven't changed process.
         self._checkpid()
+        self._in_use_connections.discard(connection)
         if not self.owns_connection(connection):
             # pool doesn't own this connection. do not add it back
             # to the pool. instead add a None value which is a placeholder
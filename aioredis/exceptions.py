@@ -47,6 +47,10 @@ class NoScriptError(ResponseError):
     pass
 
 
+class NoFunctionError(ResponseError):
+    pass
+
+
 class ExecAbortError(ResponseError):
     pass
 
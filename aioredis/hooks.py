@@ -0,0 +1,213 @@
+import time
+from typing import TYPE_CHECKING, Any, Optional, Sequence
+
+if TYPE_CHECKING:
+    from aioredis.connection import Connection, EncodableT
+
+
+# commands for which every argument after the command name is a key
+ALL_KEY_COMMANDS = frozenset(
+    (
+        "DEL",
+        "EXISTS",
+        "MGET",
+        "PFCOUNT",
+        "PFMERGE",
+        "RENAME",
+        "RENAMENX",
+        "SDIFF",
+        "SDIFFSTORE",
+        "SINTER",
+        "SINTERSTORE",
+        "SUNION",
+        "SUNIONSTORE",
+        "TOUCH",
+        "UNLINK",
+        "WATCH",
+    )
+)
+# commands for which every argument except the trailing timeout is a key
+BLOCKING_KEY_COMMANDS = frozenset(("BLPOP", "BRPOP", "BZPOPMAX", "BZPOPMIN"))
+# commands whose arguments alternate between keys and values
+KEY_VALUE_COMMANDS = frozenset(("MSET", "MSETNX"))
+# commands with a numkeys argument right after the command name
+NUMKEYS_COMMANDS = frozenset(("EVAL", "EVALSHA"))
+# commands that don't operate on keys at all
+KEYLESS_COMMANDS = frozenset(
+    (
+        "ACL",
+        "AUTH",
+        "BGREWRITEAOF",
+        "BGSAVE",
+        "CLIENT",
+        "CLUSTER",
+        "COMMAND",
+        "CONFIG",
+        "DBSIZE",
+        "DEBUG",
+        "DISCARD",
+        "ECHO",
+        "EXEC",
+        "FLUSHALL",
+        "FLUSHDB",
+        "INFO",
+        "LASTSAVE",
+        "MEMORY",
+        "MODULE",
+        "MULTI",
+        "PING",
+        "PUBLISH",
+        "PUBSUB",
+        "RANDOMKEY",
+        "READONLY",
+        "READWRITE",
+        "ROLE",
+        "SAVE",
+        "SCAN",
+        "SCRIPT",
+        "SELECT",
+        "SENTINEL",
+        "SHUTDOWN",
+        "SLAVEOF",
+        "SLOWLOG",
+        "SWAPDB",
+        "TIME",
+        "UNWATCH",
+        "WAIT",
+    )
+)
+
+
+def command_key_count(args: Sequence["EncodableT"]) -> int:
+    """
+    Estimate how many keys a command operates on from its arguments.
+
+    This uses a small table of well-known command shapes and falls back to
+    assuming the first argument after the command name is the only key.
+    """
+    if not args:
+        return 0
+    name = args[0]
+    if isinstance(name, bytes):
+        name = name.decode("utf-8", errors="replace")
+    name = name.split(" ", 1)[0].upper()
+    nargs = len(args) - 1
+    if name in KEYLESS_COMMANDS:
+        return 0
+    if name in ALL_KEY_COMMANDS:
+        return nargs
+    if name in BLOCKING_KEY_COMMANDS:
+        return max(nargs - 1, 0)
+    if name in KEY_VALUE_COMMANDS:
+        return nargs // 2
+    if name in NUMKEYS_COMMANDS:
+        try:
+            return int(args[2])
+        except (IndexError, TypeError, ValueError):
+            return 0
+    return 1 if nargs else 0
+
+
+class CommandContext:
+    """
+    Describes a single command, or a whole pipeline, as it passes through
+    the client. The same instance is handed to every hook for the duration
+    of the command, so hooks may stash their own state on it (e.g. a tracing
+    span) through the ``extra`` dict.
+    """
+
+    __slots__ = (
+        "command_name",
+        "args",
+        "connection",
+        "pipeline_size",
+        "started",
+        "duration",
+        "bytes_sent",
+        "bytes_received",
+        "extra",
+        "_key_count",
+        "_sent_before",
+        "_received_before",
+    )
+
+    def __init__(
+        self,
+        command_name: str,
+        args: Sequence["EncodableT"],
+        connection: "Connection",
+        pipeline_size: int = 0,
+    ):
+        self.command_name = command_name
+        self.args = args
+        self.connection = connection
+        self.pipeline_size = pipeline_size
+        self.duration: Optional[float] = None
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.extra: dict = {}
+        self._key_count: Optional[int] = None
+        self._sent_before = connection.bytes_sent
+        self._received_before = connection.bytes_received
+        self.started = time.monotonic()
+
+    @property
+    def key_count(self) -> int:
+        if self._key_count is None:
+            self._key_count = command_key_count(self.args)
+        return self._key_count
+
+    @property
+    def connection_id(self) -> str:
+        """A string identifying the connection the command was sent on"""
+        connection = self.connection
+        return "{}@{:x}".format(
+            ",".join(f"{k}={v}" for k, v in connection.repr_pieces()), id(connection)
+        )
+
+    def finish(self):
+        self.duration = time.monotonic() - self.started
+        self.bytes_sent = self.connection.bytes_sent - self._sent_before
+        self.bytes_received = self.connection.bytes_received - self._received_before
+
+
+class CommandHook:
+    """
+    Base class for command instrumentation hooks.
+
+    Subclasses override any of the methods below. Hooks are registered on a
+    client with :meth:`~aioredis.client.Redis.add_command_hook` and are called
+    synchronously, in registration order, for every command and pipeline
+    executed by that client and the pipelines it creates. A client without
+    hooks doesn't pay for any of this.
+    """
+
+    def before_send(self, context: CommandContext):
+        """Called right before the command is written to the connection"""
+
+    def after_reply(self, context: CommandContext, response: Any):
+        """Called with the parsed response once the command completed"""
+
+    def on_error(self, context: CommandContext, error: BaseException):
+        """Called when the command raised ``error``"""
+
+
+def run_before_send(hooks: Sequence[CommandHook], context: CommandContext):
+    for hook in hooks:
+        hook.before_send(context)
+
+
+def run_after_reply(
+    hooks: Sequence[CommandHook], context: CommandContext, response: Any
+):
+    context.finish()
+    for hook in hooks:
+        hook.after_reply(context, response)
+
+
+def run_on_error(
+    hooks: Sequence[CommandHook], context: CommandContext, error: BaseException
+):
+    context.finish()
+    for hook in hooks:
+        hook.on_error(context, error)
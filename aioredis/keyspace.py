@@ -0,0 +1,127 @@
+"""
+Keyspace analysis.
+
+Auditing a keyspace with ``scan_iter`` and a ``TYPE``, ``TTL`` and
+``MEMORY USAGE`` call per key takes several round trips for every key.
+``analyze_keyspace`` scans page by page and looks up every key of a page in
+one pipeline, optionally split across several pool connections, while the
+next page is scanned and the previous one is consumed::
+
+    async for info in analyze_keyspace(redis, match="session:*", parallel=4):
+        if info.ttl is None:
+            print(info.key, info.type, info.memory)
+
+Keys are yielded as ``KeyInfo`` records, in the order SCAN returns them.
+Keys deleted between the SCAN and the lookups are skipped. Like SCAN itself,
+keys that exist for the whole scan are returned at least once.
+"""
+import asyncio
+from typing import TYPE_CHECKING, Any, AsyncIterator, List, NamedTuple, Optional
+
+from .exceptions import DataError
+from .utils import str_if_bytes
+
+if TYPE_CHECKING:
+    from .client import Redis
+
+
+class KeyInfo(NamedTuple):
+    key: Any
+    type: str
+    # seconds left before the key expires, None for keys without expiry
+    ttl: Optional[float]
+    # bytes used by the key and its value, None unless requested
+    memory: Optional[int]
+
+
+async def describe_keys(
+    redis: "Redis",
+    keys: List[Any],
+    memory: bool = True,
+    samples: Optional[int] = None,
+    parallel: int = 1,
+) -> List[KeyInfo]:
+    """
+    Look up the type, TTL and, with ``memory``, the ``MEMORY USAGE`` of
+    ``keys`` in one non-transactional pipeline, executed over ``parallel``
+    pool connections. ``samples`` is passed on to ``MEMORY USAGE``.
+    Keys that don't exist are left out.
+    """
+    if not keys:
+        return []
+    async with redis.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.type(key)
+            pipe.pttl(key)
+            if memory:
+                pipe.memory_usage(key, samples)
+        replies = await pipe.execute(parallel=parallel)
+    step = 3 if memory else 2
+    infos = []
+    for i, key in enumerate(keys):
+        type_, pttl = replies[i * step : i * step + 2]
+        type_ = str_if_bytes(type_)
+        # a key that expired or was deleted since it was scanned
+        if type_ == "none" or pttl == -2:
+            continue
+        infos.append(
+            KeyInfo(
+                key,
+                type_,
+                None if pttl < 0 else pttl / 1000,
+                replies[i * step + 2] if memory else None,
+            )
+        )
+    return infos
+
+
+async def analyze_keyspace(
+    redis: "Redis",
+    match: Optional[str] = None,
+    count: Optional[int] = 1000,
+    _type: Optional[str] = None,
+    memory: bool = True,
+    samples: Optional[int] = None,
+    parallel: int = 1,
+    target_latency: Optional[float] = None,
+    max_count: int = 10000,
+) -> AsyncIterator[KeyInfo]:
+    """
+    Scan the keys matching ``match`` and ``_type`` and yield a ``KeyInfo``
+    for each of them.
+
+    ``count``, ``target_latency`` and ``max_count`` size the SCAN pages as
+    in ``Redis.scan_batches``. The keys of each page are looked up with
+    ``describe_keys``, split over ``parallel`` pool connections. The
+    lookups of a page run while the records of the previous page are being
+    consumed, and the SCAN for the next page is sent ahead of time as well.
+    """
+    if parallel < 1:
+        raise DataError("parallel must be a positive integer")
+    current: Optional[asyncio.Future] = None
+    pending: Optional[asyncio.Future] = None
+    pages = redis.scan_batches(
+        match, count, _type, target_latency=target_latency, max_count=max_count
+    )
+    try:
+        async for keys in pages:
+            pending = asyncio.ensure_future(
+                describe_keys(redis, keys, memory, samples, parallel)
+            )
+            if current is not None:
+                # shielded, so that cancelling the caller doesn't leave
+                # unread replies on the lookup's connections
+                for info in await asyncio.shield(current):
+                    yield info
+            current, pending = pending, None
+        if current is not None:
+            for info in await asyncio.shield(current):
+                yield info
+    finally:
+        await pages.aclose()
+        lookups = [lookup for lookup in (current, pending) if lookup is not None]
+        if lookups:
+            await asyncio.wait(lookups)
+            for lookup in lookups:
+                if not lookup.cancelled():
+                    lookup.exception()
@@ -0,0 +1,434 @@
+"""
+Many logical pubsub subscribers sharing a few connections.
+
+Each :class:`~aioredis.client.PubSub` holds a connection of its own, which
+doesn't scale to thousands of subscribers. A :class:`PubSubMultiplexer`
+keeps a fixed number of shard connections instead: every channel and
+pattern is assigned to one shard by hash, subscribed to once no matter how
+many local consumers want it, and unsubscribed from when the last of them
+is gone. Messages are fanned out to a queue per consumer::
+
+    mux = PubSubMultiplexer(redis, connections=4)
+    subscription = await mux.subscribe("room:1", "room:2")
+    async for message in subscription:
+        print(message.channel, message.data)
+
+Consumers receive :class:`~aioredis.client.PubSubMessage` tuples; the same
+instance is shared by every consumer of a channel.
+
+Because shards keep reading while consumers fall behind, messages pile up
+in the consumers' queues rather than in Redis' output buffer for the
+connection. Queues can be bounded with ``max_queue_size``; ``overflow``
+then decides what happens to a message that doesn't fit:
+
+* ``"block"``: stop reading the shard until the consumer makes room, which
+  pushes back on Redis (and delays the shard's other consumers).
+* ``"drop_oldest"``: discard the oldest queued message.
+* ``"drop_newest"``: discard the new message.
+* ``"disconnect"``: close the subscription; ``get()`` raises
+  :class:`~aioredis.exceptions.PubSubError` from then on.
+
+Dropped messages are counted in ``Subscription.dropped`` and
+``PubSubMultiplexer.dropped``.
+"""
+import asyncio
+import zlib
+from collections import defaultdict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Union
+
+from .client import PubSubMessage
+from .exceptions import ConnectionError, PubSubError, TimeoutError
+from .log import logger
+
+if TYPE_CHECKING:
+    from .client import PubSub, Redis
+
+ChannelT = Union[bytes, str]
+
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest", "disconnect")
+
+
+class Subscription:
+    """
+    A consumer of a :class:`PubSubMultiplexer`. Messages published to any of
+    its channels or matching any of its patterns are queued until read with
+    ``get()`` or by iterating over the subscription.
+    """
+
+    def __init__(
+        self,
+        multiplexer: "PubSubMultiplexer",
+        max_queue_size: int = 0,
+        overflow: str = "block",
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise PubSubError(f"overflow must be one of {OVERFLOW_POLICIES!r}")
+        self.multiplexer = multiplexer
+        self.max_queue_size = max_queue_size
+        self.overflow = overflow
+        self.channels: Set[ChannelT] = set()
+        self.patterns: Set[ChannelT] = set()
+        self.closed = False
+        # set when the subscription was closed because its queue overflowed
+        self.overflowed = False
+        self.dropped = 0
+        self._queue: asyncio.Queue = asyncio.Queue(max_queue_size)
+        self._has_room = asyncio.Event()
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}<channels={len(self.channels)},"
+            f"patterns={len(self.patterns)},pending={self.pending}>"
+        )
+
+    @property
+    def pending(self) -> int:
+        """The number of messages waiting to be read"""
+        return self._queue.qsize()
+
+    async def subscribe(self, *channels: ChannelT):
+        await self.multiplexer._subscribe(self, channels, pattern=False)
+
+    async def psubscribe(self, *patterns: ChannelT):
+        await self.multiplexer._subscribe(self, patterns, pattern=True)
+
+    async def unsubscribe(self, *channels: ChannelT):
+        """Unsubscribe from ``channels``, or from all channels if empty"""
+        await self.multiplexer._unsubscribe(
+            self, channels or list(self.channels), pattern=False
+        )
+
+    async def punsubscribe(self, *patterns: ChannelT):
+        """Unsubscribe from ``patterns``, or from all patterns if empty"""
+        await self.multiplexer._unsubscribe(
+            self, patterns or list(self.patterns), pattern=True
+        )
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[PubSubMessage]:
+        """
+        Return the next message, waiting up to ``timeout`` seconds (forever
+        if None). Returns None on timeout or once the subscription is closed.
+        """
+        if self.overflowed:
+            raise PubSubError("Subscription was closed, its queue overflowed")
+        if self.closed and not self._queue.qsize():
+            return None
+        try:
+            message = await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._has_room.set()
+        return message
+
+    def get_nowait(self) -> Optional[PubSubMessage]:
+        """Return the next message if one is queued, otherwise None"""
+        if self.overflowed:
+            raise PubSubError("Subscription was closed, its queue overflowed")
+        try:
+            message = self._queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
+        self._has_room.set()
+        return message
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> PubSubMessage:
+        message = await self.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+    async def close(self):
+        """Unsubscribe from everything and stop iteration"""
+        if self.closed:
+            return
+        self.closed = True
+        self._wake()
+        await self._detach()
+
+    async def _detach(self):
+        multiplexer = self.multiplexer
+        await multiplexer._unsubscribe(self, list(self.channels), pattern=False)
+        await multiplexer._unsubscribe(self, list(self.patterns), pattern=True)
+        multiplexer._consumers.discard(self)
+
+    def _wake(self):
+        # wake up readers waiting for a message and a shard waiting for room
+        self._has_room.set()
+        try:
+            self._queue.put_nowait(None)
+        except asyncio.QueueFull:
+            # readers aren't waiting when there are messages
+            pass
+
+    async def __aenter__(self) -> "Subscription":
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def _deliver(self, message: PubSubMessage) -> bool:
+        """
+        Queue ``message``, applying the overflow policy if the queue is full.
+        Returns False if the message has to wait for room, see
+        ``_wait_for_room()``.
+        """
+        queue = self._queue
+        try:
+            queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            pass
+        overflow = self.overflow
+        if overflow == "block":
+            return False
+        if overflow == "drop_oldest":
+            queue.get_nowait()
+            queue.put_nowait(message)
+            self._drop()
+        elif overflow == "drop_newest":
+            self._drop()
+        elif not self.closed:
+            self._drop(queue.qsize() + 1)
+            self.closed = self.overflowed = True
+            while queue.qsize():
+                queue.get_nowait()
+            self._wake()
+            self.multiplexer._spawn(self._detach())
+        return True
+
+    def _drop(self, count: int = 1):
+        self.dropped += count
+        self.multiplexer.dropped += count
+
+    async def _wait_for_room(self, message: PubSubMessage):
+        while not self.closed:
+            try:
+                self._queue.put_nowait(message)
+                return
+            except asyncio.QueueFull:
+                self._has_room.clear()
+                await self._has_room.wait()
+
+
+class PubSubMultiplexer:
+    """
+    Spread the subscriptions of any number of :class:`Subscription`
+    consumers over at most ``connections`` pubsub connections of ``redis``.
+
+    A shard that loses its connection reconnects on its own, waiting
+    ``reconnect_delay`` seconds between attempts, and subscribes again to
+    its channels and patterns. Messages published in the meantime are lost.
+
+    ``max_queue_size`` (0 for unbounded) and ``overflow`` are the defaults
+    for the consumers' queues, see the module documentation.
+    """
+
+    def __init__(
+        self,
+        redis: "Redis",
+        connections: int = 1,
+        reconnect_delay: float = 1.0,
+        max_queue_size: int = 0,
+        overflow: str = "block",
+    ):
+        if connections < 1:
+            raise PubSubError("A multiplexer needs at least one connection")
+        if overflow not in OVERFLOW_POLICIES:
+            raise PubSubError(f"overflow must be one of {OVERFLOW_POLICIES!r}")
+        self.redis = redis
+        self.connections = connections
+        self.reconnect_delay = reconnect_delay
+        self.max_queue_size = max_queue_size
+        self.overflow = overflow
+        self.dropped = 0
+        self._tasks: Set[asyncio.Future] = set()
+        self._encoder = redis.connection_pool.get_encoder()
+        self._shards: List[Optional["PubSub"]] = [None] * connections
+        self._readers: List[Optional[asyncio.Task]] = [None] * connections
+        # channel/pattern -> consumers, keyed like the PubSub messages
+        self._channels: Dict[ChannelT, Set[Subscription]] = defaultdict(set)
+        self._patterns: Dict[ChannelT, Set[Subscription]] = defaultdict(set)
+        self._consumers: Set[Subscription] = set()
+        self._lock = asyncio.Lock()
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}<connections={self.connections},"
+            f"channels={len(self._channels)},patterns={len(self._patterns)},"
+            f"consumers={len(self._consumers)}>"
+        )
+
+    @property
+    def active_connections(self) -> int:
+        """The number of shard connections opened so far"""
+        return sum(shard is not None for shard in self._shards)
+
+    def subscription(
+        self, max_queue_size: Optional[int] = None, overflow: Optional[str] = None
+    ) -> Subscription:
+        """
+        Create a consumer without any subscriptions yet. Its queue options
+        default to the multiplexer's.
+        """
+        if max_queue_size is None:
+            max_queue_size = self.max_queue_size
+        subscription = Subscription(
+            self, max_queue_size=max_queue_size, overflow=overflow or self.overflow
+        )
+        self._consumers.add(subscription)
+        return subscription
+
+    async def subscribe(self, *channels: ChannelT, **options) -> Subscription:
+        """
+        Create a consumer subscribed to ``channels``. ``options`` are passed
+        to ``subscription()``.
+        """
+        subscription = self.subscription(**options)
+        if channels:
+            await subscription.subscribe(*channels)
+        return subscription
+
+    async def psubscribe(self, *patterns: ChannelT, **options) -> Subscription:
+        """
+        Create a consumer subscribed to ``patterns``. ``options`` are passed
+        to ``subscription()``.
+        """
+        subscription = self.subscription(**options)
+        if patterns:
+            await subscription.psubscribe(*patterns)
+        return subscription
+
+    async def close(self):
+        """Close every consumer and shard connection"""
+        for subscription in list(self._consumers):
+            subscription.closed = True
+            subscription._wake()
+        self._consumers.clear()
+        self._channels.clear()
+        self._patterns.clear()
+        readers = [r for r in self._readers if r is not None]
+        readers.extend(self._tasks)
+        for reader in readers:
+            reader.cancel()
+        if readers:
+            await asyncio.gather(*readers, return_exceptions=True)
+        for shard in self._shards:
+            if shard is not None:
+                await shard.close()
+        self._shards = [None] * self.connections
+        self._readers = [None] * self.connections
+
+    async def __aenter__(self) -> "PubSubMultiplexer":
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _key(self, name: ChannelT) -> ChannelT:
+        return self._encoder.decode(self._encoder.encode(name))
+
+    def _shard_index(self, key: ChannelT) -> int:
+        if isinstance(key, str):
+            key = key.encode("utf-8", errors="surrogateescape")
+        return zlib.crc32(key) % self.connections
+
+    def _shard(self, index: int) -> "PubSub":
+        shard = self._shards[index]
+        if shard is None:
+            shard = self.redis.pubsub(
+                ignore_subscribe_messages=True, message_format="compact"
+            )
+            self._shards[index] = shard
+        return shard
+
+    async def _subscribe(self, subscription: Subscription, names: Any, pattern: bool):
+        if subscription.closed:
+            raise PubSubError("Subscription is closed")
+        registry = self._patterns if pattern else self._channels
+        owned = subscription.patterns if pattern else subscription.channels
+        async with self._lock:
+            new: Dict[int, List[ChannelT]] = defaultdict(list)
+            for name in names:
+                key = self._key(name)
+                if key in owned:
+                    continue
+                owned.add(key)
+                consumers = registry[key]
+                if not consumers:
+                    new[self._shard_index(key)].append(key)
+                consumers.add(subscription)
+            for index, keys in new.items():
+                shard = self._shard(index)
+                if pattern:
+                    await shard.psubscribe(*keys)
+                else:
+                    await shard.subscribe(*keys)
+                if self._readers[index] is None:
+                    self._readers[index] = asyncio.ensure_future(self._read(shard))
+
+    async def _unsubscribe(self, subscription: Subscription, names: Any, pattern: bool):
+        registry = self._patterns if pattern else self._channels
+        owned = subscription.patterns if pattern else subscription.channels
+        async with self._lock:
+            gone: Dict[int, List[ChannelT]] = defaultdict(list)
+            for name in names:
+                key = self._key(name)
+                if key not in owned:
+                    continue
+                owned.discard(key)
+                consumers = registry.get(key)
+                if consumers is None:
+                    continue
+                consumers.discard(subscription)
+                if not consumers:
+                    del registry[key]
+                    gone[self._shard_index(key)].append(key)
+            for index, keys in gone.items():
+                shard = self._shards[index]
+                if shard is None or shard.connection is None:
+                    continue
+                if pattern:
+                    await shard.punsubscribe(*keys)
+                else:
+                    await shard.unsubscribe(*keys)
+
+    def _dispatch(self, message: PubSubMessage, blocked: list):
+        if message.type == "pmessage":
+            consumers = self._patterns.get(message.pattern)
+        else:
+            consumers = self._channels.get(message.channel)
+        if consumers:
+            for consumer in consumers:
+                if not consumer._deliver(message):
+                    blocked.append((consumer, message))
+
+    async def _read(self, shard: "PubSub"):
+        dispatch = self._dispatch
+        blocked: list = []
+        while True:
+            try:
+                for message in await shard.get_messages(timeout=None):
+                    dispatch(message, blocked)
+                # don't read any further until every consumer with the
+                # "block" policy took its messages
+                for consumer, message in blocked:
+                    await consumer._wait_for_room(message)
+                blocked.clear()
+            except asyncio.CancelledError:
+                raise
+            except (ConnectionError, TimeoutError) as e:
+                # the next read reconnects and subscribes again through the
+                # pubsub's connect callback
+                logger.warning("Pubsub multiplexer shard disconnected: %s", e)
+                await asyncio.sleep(self.reconnect_delay)
+            except Exception:
+                logger.exception("Error in pubsub multiplexer shard")
+                await asyncio.sleep(self.reconnect_delay)
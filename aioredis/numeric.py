@@ -0,0 +1,181 @@
+"""
+Compact numeric results.
+
+The regular command methods return one Python object per element, e.g. a
+``(member, score)`` tuple and a float for every member of ``ZRANGE ...
+WITHSCORES``. For large numeric replies the functions in this module parse
+the numbers in one pass into an ``array.array``, or a NumPy array when
+``use_numpy`` is set and NumPy is installed, which keeps 8 bytes per
+number instead of a full Python object::
+
+    members, scores = await zrange_with_scores(redis, "leaderboard", 0, -1)
+    counters = await mget_numbers(redis, keys, typecode="q", missing=0)
+
+``typecode`` is an ``array`` module typecode; ``"f"`` and ``"d"`` parse
+floats, the integer typecodes parse integers. Numbers are always parsed from
+the raw bytes, whatever the client's ``decode_responses``, while sorted set
+members are decoded like the replies of the regular commands.
+"""
+import array
+from typing import TYPE_CHECKING, Any, Iterable, List, Optional, Sequence, Tuple
+
+from .exceptions import DataError
+
+try:
+    import numpy
+
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+if TYPE_CHECKING:
+    from .client import Redis
+
+FLOAT_TYPECODES = frozenset("fd")
+# array typecodes that hold numbers; NumPy understands the same codes
+NUMERIC_TYPECODES = frozenset("bBhHiIlLqQfd")
+
+
+def parse_numbers(
+    values: Sequence[Any],
+    typecode: str = "d",
+    missing: Optional[float] = None,
+    use_numpy: bool = False,
+):
+    """
+    Parse ``values``, a list of numeric bulk strings or integers, into an
+    ``array.array`` of ``typecode``, or a NumPy array if ``use_numpy``.
+
+    ``None`` entries, such as missing keys in an MGET reply, are replaced
+    by ``missing``, which defaults to NaN for float typecodes. For integer
+    typecodes a ``None`` without a ``missing`` value raises ``DataError``.
+    """
+    if typecode not in NUMERIC_TYPECODES:
+        raise DataError(f"Unsupported typecode {typecode!r}")
+    if use_numpy and not NUMPY_AVAILABLE:
+        raise DataError("use_numpy requires numpy to be installed")
+    is_float = typecode in FLOAT_TYPECODES
+    convert = float if is_float else int
+    try:
+        return _to_array(map(convert, values), typecode, len(values), use_numpy)
+    except TypeError:
+        # only scan for missing values once a conversion has failed
+        if None not in values:
+            raise
+    if missing is None:
+        if not is_float:
+            raise DataError(
+                "Reply contains missing values, pass missing= to replace them"
+            )
+        missing = float("nan")
+    values = [missing if value is None else value for value in values]
+    return _to_array(map(convert, values), typecode, len(values), use_numpy)
+
+
+def _to_array(numbers: Iterable[Any], typecode: str, count: int, use_numpy: bool):
+    if use_numpy:
+        return numpy.fromiter(numbers, dtype=typecode, count=count)
+    return array.array(typecode, numbers)
+
+
+def parse_score_pairs(
+    response: List[Any], typecode: str = "d", use_numpy: bool = False
+) -> Tuple[List[Any], Any]:
+    """
+    Split a flat ``member, score, ...`` reply into a list of members and a
+    parallel array of scores
+    """
+    return response[0::2], parse_numbers(response[1::2], typecode, use_numpy=use_numpy)
+
+
+def _decode_members(redis: "Redis", members: List[Any]) -> List[Any]:
+    encoder = redis.connection_pool.get_encoder()
+    if not encoder.decode_responses and encoder.codec is None:
+        return members
+    return list(map(encoder.decode, members))
+
+
+async def zrange_with_scores(
+    redis: "Redis",
+    name: str,
+    start: int,
+    end: int,
+    desc: bool = False,
+    typecode: str = "d",
+    use_numpy: bool = False,
+) -> Tuple[List[Any], Any]:
+    """
+    Return the members of sorted set ``name`` between ``start`` and ``end``
+    and their scores as ``(members, scores)``
+    """
+    command = "ZREVRANGE" if desc else "ZRANGE"
+    response = await redis.execute_command(
+        command, name, start, end, "WITHSCORES", decode=False
+    )
+    members, scores = parse_score_pairs(response, typecode, use_numpy)
+    return _decode_members(redis, members), scores
+
+
+async def zrangebyscore_with_scores(
+    redis: "Redis",
+    name: str,
+    min: Any,
+    max: Any,
+    start: Optional[int] = None,
+    num: Optional[int] = None,
+    typecode: str = "d",
+    use_numpy: bool = False,
+) -> Tuple[List[Any], Any]:
+    """
+    Return the members of sorted set ``name`` with scores between ``min``
+    and ``max`` and their scores as ``(members, scores)``
+    """
+    if (start is None) != (num is None):
+        raise DataError("``start`` and ``num`` must both be specified")
+    pieces: List[Any] = ["ZRANGEBYSCORE", name, min, max, "WITHSCORES"]
+    if start is not None:
+        pieces.extend((b"LIMIT", start, num))
+    response = await redis.execute_command(*pieces, decode=False)
+    members, scores = parse_score_pairs(response, typecode, use_numpy)
+    return _decode_members(redis, members), scores
+
+
+async def mget_numbers(
+    redis: "Redis",
+    keys: Iterable[str],
+    typecode: str = "d",
+    missing: Optional[float] = None,
+    use_numpy: bool = False,
+):
+    """Return the numeric values of ``keys`` as an array"""
+    response = await redis.execute_command("MGET", *keys, decode=False)
+    return parse_numbers(response, typecode, missing, use_numpy)
+
+
+async def hmget_numbers(
+    redis: "Redis",
+    name: str,
+    fields: Iterable[str],
+    typecode: str = "d",
+    missing: Optional[float] = None,
+    use_numpy: bool = False,
+):
+    """Return the numeric values of ``fields`` of hash ``name`` as an array"""
+    response = await redis.execute_command("HMGET", name, *fields, decode=False)
+    return parse_numbers(response, typecode, missing, use_numpy)
+
+
+async def lrange_numbers(
+    redis: "Redis",
+    name: str,
+    start: int,
+    end: int,
+    typecode: str = "d",
+    use_numpy: bool = False,
+):
+    """
+    Return the numeric elements of list ``name`` between ``start`` and
+    ``end`` as an array
+    """
+    response = await redis.execute_command("LRANGE", name, start, end, decode=False)
+    return parse_numbers(response, typecode, use_numpy=use_numpy)
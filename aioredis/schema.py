@@ -0,0 +1,207 @@
+"""
+Schema-driven hash records.
+
+``HGETALL`` returns a dict of bulk strings that usually gets converted again
+into an application object. A ``HashSchema`` declares the fields of a kind
+of hash and their types once; reads return a compact ``namedtuple`` record
+with every value converted in one pass, and writes send the fields from a
+precomputed list of encoded field names::
+
+    User = HashSchema("User", {"name": str, "age": int, "active": bool})
+
+    await User.set(redis, "user:1", User.record("ann", 30, True))
+    user = await User.get(redis, "user:1")  # User(name='ann', age=30, ...)
+    users = await User.get_many(redis, ["user:1", "user:2"])
+
+Field types are ``str``, ``bytes``, ``int``, ``float`` and ``bool``, or any
+callable that converts the raw bytes value. Booleans are stored as ``1`` and
+``0``. Replies are always read as bytes, whatever the client's
+``decode_responses``.
+"""
+import codecs
+import collections
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+from .exceptions import DataError
+
+if TYPE_CHECKING:
+    from .client import Redis
+
+FALSE_VALUES = frozenset((b"", b"0", b"false", b"False"))
+
+
+def _load_bool(value: bytes) -> bool:
+    return value not in FALSE_VALUES
+
+
+def _dump_bool(value: Any) -> bytes:
+    return b"1" if value else b"0"
+
+
+def _make_readers(count: int, namespace: Dict[str, Any]):
+    variables = ", ".join(f"v{i}" for i in range(count))
+    record = "".join(
+        f"\n        _default{i} if v{i} is None else _load{i}(v{i}),"
+        for i in range(count)
+    )
+    getters = "".join(f"\n    v{i} = get(_key{i})" for i in range(count))
+    source = f"""
+def load(values):
+    \"\"\"
+    Build a record from raw values in field order, such as an HMGET reply
+    for ``fields``
+    \"\"\"
+    {variables}, = values
+    return _new(_record, ({record}
+    ))
+
+def from_mapping(data):
+    \"\"\"
+    Build a record from a raw HGETALL reply. Fields that aren't part of the
+    schema are ignored.
+    \"\"\"
+    get = data.get{getters}
+    return _new(_record, ({record}
+    ))
+"""
+    exec(source, namespace)
+    return namespace["load"], namespace["from_mapping"]
+
+
+class HashSchema:
+    """
+    Describes the fields of hashes holding one kind of record.
+
+    ``fields`` maps field names to their types, in the order of the
+    record's attributes. ``defaults`` gives the value of fields missing from
+    a hash, which is ``None`` otherwise. ``record`` is the generated
+    ``namedtuple`` class.
+
+    ``load(values)`` builds a record from raw values in field order, as
+    HMGET returns them, and ``from_mapping(data)`` from a raw HGETALL
+    reply, ignoring fields that aren't part of the schema. Use them to
+    convert replies read some other way, e.g. from a pipeline.
+    """
+
+    __slots__ = ("record", "fields", "load", "from_mapping", "_keys", "_dumpers")
+
+    def __init__(
+        self,
+        name: str,
+        fields: Mapping[str, Any],
+        defaults: Optional[Mapping[str, Any]] = None,
+        encoding: str = "utf-8",
+    ):
+        if not fields:
+            raise DataError("HashSchema requires at least one field")
+        defaults = defaults or {}
+        unknown = set(defaults) - set(fields)
+        if unknown:
+            raise DataError(f"Defaults for unknown fields: {sorted(unknown)!r}")
+        loaders: Dict[Any, Callable[[bytes], Any]] = {
+            str: bytes.decode,
+            bytes: bytes,
+            int: int,
+            float: float,
+            bool: _load_bool,
+        }
+        if codecs.lookup(encoding).name != "utf-8":
+            loaders[str] = lambda value: value.decode(encoding)
+        self.fields: Tuple[str, ...] = tuple(fields)
+        try:
+            self.record = collections.namedtuple(name, self.fields)
+        except ValueError as e:
+            raise DataError(str(e)) from e
+        self._keys = [field.encode(encoding) for field in self.fields]
+        self._dumpers: List[Optional[Callable[[Any], Any]]] = []
+        namespace: Dict[str, Any] = {
+            "_new": tuple.__new__,
+            "_record": self.record,
+        }
+        for i, (field, type_) in enumerate(fields.items()):
+            loader = loaders.get(type_, type_)
+            if not callable(loader):
+                raise DataError(f"Invalid type for field {field!r}: {type_!r}")
+            namespace[f"_load{i}"] = loader
+            namespace[f"_default{i}"] = defaults.get(field)
+            namespace[f"_key{i}"] = self._keys[i]
+            self._dumpers.append(_dump_bool if type_ is bool else None)
+        # Like namedtuple, the readers are generated for the schema so that
+        # a record is built without looping over the fields
+        self.load, self.from_mapping = _make_readers(len(self.fields), namespace)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}<{self.record.__name__}{self.fields}>"
+
+    def dump(self, record: Any) -> List[Any]:
+        """
+        Return the ``field, value, ...`` arguments of an HSET command that
+        stores ``record``, which may be a record, a tuple in field order, a
+        mapping or any object with the fields as attributes. ``None`` values
+        are skipped.
+        """
+        if isinstance(record, tuple):
+            values: Iterable[Any] = record
+        elif isinstance(record, Mapping):
+            values = map(record.get, self.fields)
+        else:
+            values = (getattr(record, field, None) for field in self.fields)
+        args: List[Any] = []
+        for key, dump, value in zip(self._keys, self._dumpers, values):
+            if value is not None:
+                args.append(key)
+                args.append(value if dump is None else dump(value))
+        return args
+
+    async def get(self, redis: "Redis", name: str):
+        """
+        Return hash ``name`` as a record, or ``None`` if it has none of the
+        schema's fields
+        """
+        values = await redis.execute_command("HMGET", name, *self._keys, decode=False)
+        if values.count(None) == len(values):
+            return None
+        return self.load(values)
+
+    async def get_many(self, redis: "Redis", names: Iterable[str]) -> List[Any]:
+        """
+        Return the hashes ``names`` as records, read with one pipeline.
+        Missing hashes are returned as ``None``.
+        """
+        async with redis.pipeline(transaction=False) as pipe:
+            for name in names:
+                pipe.execute_command("HMGET", name, *self._keys, decode=False)
+            replies = await pipe.execute()
+        return [
+            None if values.count(None) == len(values) else self.load(values)
+            for values in replies
+        ]
+
+    async def set(self, redis: "Redis", name: str, record: Any) -> int:
+        """
+        Store ``record`` in hash ``name``. Returns the number of fields that
+        were added.
+        """
+        args = self.dump(record)
+        if not args:
+            raise DataError("'HashSchema.set' with no field values")
+        return await redis.execute_command("HSET", name, *args)
+
+    async def set_many(self, redis: "Redis", records: Mapping[str, Any]) -> None:
+        """Store every record of ``records``, keyed by hash name, in one pipeline"""
+        async with redis.pipeline(transaction=False) as pipe:
+            for name, record in records.items():
+                args = self.dump(record)
+                if args:
+                    pipe.execute_command("HSET", name, *args)
+            await pipe.execute()
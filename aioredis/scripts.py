@@ -0,0 +1,143 @@
+from typing import TYPE_CHECKING, Dict, Hashable, Iterable, Optional, Set, Union
+
+from .exceptions import ResponseError
+
+if TYPE_CHECKING:
+    from .connection import Connection
+
+
+def server_address(connection: "Connection") -> Hashable:
+    """The address of the server ``connection`` talks to"""
+    path = getattr(connection, "path", None)
+    if path is not None:
+        return path
+    return connection.host, connection.port
+
+
+class ScriptRegistry:
+    """
+    The Lua scripts registered with a connection pool, and which of their
+    SHAs each of the pool's servers is known to have in its script cache.
+
+    Every pool owns a registry as ``pool.scripts``. ``register_script``
+    adds scripts to it. The first pipeline that calls scripts on a server
+    loads all registered scripts there in one round trip, and so do
+    connections to that server checked out of the pool, other than for
+    pubsub or MONITOR, when they connect. A reconnect forgets what the
+    server had, as it may have restarted in the meantime. Pipelines skip
+    the ``SCRIPT EXISTS`` round trip when all of their scripts are known
+    to be loaded on their connection's server.
+    ``SCRIPT FLUSH`` sent through ``Redis.script_flush`` or a pipeline and
+    ``NOSCRIPT`` errors, e.g. after a flush by another client, invalidate
+    what is known, so that the scripts are loaded again next time.
+
+    ``libraries`` holds the names of the Redis Functions libraries known to
+    be loaded on each server. Functions persist across restarts and are
+    replicated, so they are only forgotten once ``FUNCTION FLUSH`` or
+    ``FUNCTION DELETE`` has run, or after a "Function not found" error.
+    """
+
+    __slots__ = ("scripts", "loaded", "libraries")
+
+    def __init__(self):
+        self.scripts: Dict[str, Union[bytes, str]] = {}
+        # the SHAs known to be cached, by server address
+        self.loaded: Dict[Hashable, Set[str]] = {}
+        # the names of the libraries known to be loaded, by server address
+        self.libraries: Dict[Hashable, Set[str]] = {}
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}<scripts={len(self.scripts)},"
+            f"servers={len(self.loaded)}>"
+        )
+
+    def register(self, sha: str, script: Union[bytes, str]):
+        """Add ``script`` to the scripts preloaded on the pool's servers"""
+        self.scripts[sha] = script
+
+    def is_loaded(self, shas: Iterable[str], connection: "Connection") -> bool:
+        """
+        Whether all of ``shas`` are known to be in the cache of the server
+        ``connection`` talks to
+        """
+        loaded = self.loaded.get(server_address(connection))
+        return loaded is not None and loaded.issuperset(shas)
+
+    def mark_loaded(self, shas: Iterable[str], connection: "Connection"):
+        self.loaded.setdefault(server_address(connection), set()).update(shas)
+
+    def invalidate(self, connection: Optional["Connection"] = None):
+        """
+        Forget which scripts the server of ``connection`` has, or every
+        server if no connection is given, e.g. after SCRIPT FLUSH
+        """
+        if connection is None:
+            self.loaded.clear()
+        else:
+            self.loaded.pop(server_address(connection), None)
+
+    def has_library(self, name: str, connection: "Connection") -> bool:
+        """
+        Whether the library ``name`` is known to be loaded on the server
+        ``connection`` talks to
+        """
+        return name in self.libraries.get(server_address(connection), ())
+
+    def mark_library(self, name: str, connection: "Connection"):
+        self.libraries.setdefault(server_address(connection), set()).add(name)
+
+    def forget_libraries(
+        self, name: Optional[str] = None, connection: Optional["Connection"] = None
+    ):
+        """
+        Forget that the library ``name``, or every library if no name is
+        given, is loaded on the server of ``connection``, or on every server
+        if no connection is given, e.g. after FUNCTION DELETE or FUNCTION
+        FLUSH
+        """
+        if connection is None:
+            servers: Iterable[Set[str]] = self.libraries.values()
+        else:
+            servers = (self.libraries.get(server_address(connection), set()),)
+        for libraries in servers:
+            if name is None:
+                libraries.clear()
+            else:
+                libraries.discard(name)
+
+    async def on_connect(self, connection: "Connection", reconnect: bool):
+        """
+        Load the registered scripts on a freshly connected ``connection``
+        if its server has run any. After a reconnect the server may have
+        restarted in the meantime, so all of them are loaded again.
+        """
+        address = server_address(connection)
+        if address not in self.loaded:
+            # the first pipeline that calls scripts there loads them
+            return
+        if reconnect:
+            self.loaded[address] = set()
+        await self.preload(connection)
+
+    async def preload(self, connection: "Connection"):
+        """
+        Load the registered scripts that the server of ``connection`` isn't
+        known to have, with a single round trip
+        """
+        if not self.scripts or self.is_loaded(self.scripts, connection):
+            return
+        loaded = self.loaded.get(server_address(connection), ())
+        scripts = [item for item in self.scripts.items() if item[0] not in loaded]
+        await connection.send_packed_command(
+            connection.pack_commands([("SCRIPT LOAD", script) for _, script in scripts])
+        )
+        for sha, _ in scripts:
+            try:
+                await connection.read_response()
+            except ResponseError:
+                # a script that doesn't compile fails when it's called, and
+                # isn't sent again with every checkout
+                self.scripts.pop(sha, None)
+                continue
+            self.mark_loaded((sha,), connection)
@@ -55,9 +55,9 @@ class SentinelManagedConnection(Connection):
                     continue
             raise SlaveNotFoundError  # Never be here
 
-    async def read_response(self):
+    async def read_response(self, disable_decoding: bool = False):
         try:
-            return await super().read_response()
+            return await super().read_response(disable_decoding)
         except ReadOnlyError:
             if self.connection_pool.is_master:
                 # When talking to a master, a ReadOnlyError when likely
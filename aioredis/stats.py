@@ -0,0 +1,165 @@
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence
+
+# Upper bounds (in seconds) of the default latency buckets. Anything slower
+# than the last bound is counted in an implicit "+Inf" bucket.
+DEFAULT_LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+StatsListenerT = Callable[[str, float, Mapping[str, str]], Any]
+
+
+class Histogram:
+    """Fixed-bucket histogram of observed values (usually seconds)"""
+
+    __slots__ = "buckets", "counts", "count", "sum", "min", "max"
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        # one extra slot for values above the last bucket bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the histogram as a plain dict with cumulative buckets"""
+        cumulative: List[Any] = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "buckets": cumulative,
+        }
+
+
+class PoolStats:
+    """
+    Counters and latency histograms for a connection pool and the
+    connections it creates.
+
+    An instance is shared by reference between a pool and all of its
+    connections, so every recorded event is aggregated pool-wide. Listeners
+    registered with :meth:`add_listener` are called synchronously for every
+    recorded event with ``(metric, value, labels)``, which makes it easy to
+    forward observations to an external metrics system.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.checkouts = 0
+        self.checkout_errors = 0
+        self.waiting = 0
+        self.connects = 0
+        self.reconnects = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.checkout_wait = Histogram(self.buckets)
+        self.connect_latency = Histogram(self.buckets)
+        self.command_latency: Dict[str, Histogram] = {}
+        self._listeners: List[StatsListenerT] = []
+
+    def add_listener(self, callback: StatsListenerT):
+        """Register ``callback(metric, value, labels)`` for every event"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: StatsListenerT):
+        self._listeners.remove(callback)
+
+    def _emit(self, metric: str, value: float, labels: Mapping[str, str] = None):
+        for callback in self._listeners:
+            callback(metric, value, labels or {})
+
+    def record_checkout(self, duration: float):
+        self.checkouts += 1
+        self.checkout_wait.observe(duration)
+        if self._listeners:
+            self._emit("checkout_wait", duration)
+
+    def record_checkout_error(self):
+        self.checkout_errors += 1
+        if self._listeners:
+            self._emit("checkout_errors", 1)
+
+    def record_connect(self, duration: float, reconnect: bool = False):
+        self.connects += 1
+        self.connect_latency.observe(duration)
+        if reconnect:
+            self.reconnects += 1
+        if self._listeners:
+            self._emit("connect_latency", duration)
+            if reconnect:
+                self._emit("reconnects", 1)
+
+    def record_timeout(self):
+        self.timeouts += 1
+        if self._listeners:
+            self._emit("timeouts", 1)
+
+    def record_error(self):
+        self.errors += 1
+        if self._listeners:
+            self._emit("errors", 1)
+
+    def record_command(self, command_name: str, duration: float):
+        try:
+            histogram = self.command_latency[command_name]
+        except KeyError:
+            histogram = self.command_latency[command_name] = Histogram(self.buckets)
+        histogram.observe(duration)
+        if self._listeners:
+            self._emit("command_latency", duration, {"command": command_name})
+
+    def reset(self):
+        """Zero all counters and histograms, keeping registered listeners"""
+        listeners = self._listeners
+        self.__init__(self.buckets)
+        self._listeners = listeners
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "checkouts": self.checkouts,
+            "checkout_errors": self.checkout_errors,
+            "waiting": self.waiting,
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "checkout_wait": self.checkout_wait.snapshot(),
+            "connect_latency": self.connect_latency.snapshot(),
+            "command_latency": {
+                name: histogram.snapshot()
+                for name, histogram in self.command_latency.items()
+            },
+        }
@@ -53,6 +53,9 @@ setup(
     ],
     extras_require={
         "hiredis": 'hiredis>=1.0; implementation_name=="cpython"',
+        "lz4": "lz4",
+        "numpy": "numpy",
+        "zstd": "zstandard",
     },
     python_requires=">=3.6",
     include_package_data=True,
@@ -0,0 +1,285 @@
+"""
+An in-process, asyncio based server speaking the Redis protocol.
+
+It answers a handful of commands itself (enough for a client to connect,
+run simple GET/SET style workloads and use pubsub) and serves canned or
+scripted replies for everything else. Latency, fragmented writes and
+dropped connections can be injected to exercise timeout and reconnect
+paths deterministically, or to measure the client's own overhead without a
+real server in the way::
+
+    async with FakeRedisServer(latency=0.01) as server:
+        server.set_reply("GET", b"value")
+        client = aioredis.Redis.from_url(server.url)
+        assert await client.get("anything") == b"value"
+"""
+import asyncio
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+CRLF = b"\r\n"
+
+
+class Raw(bytes):
+    """A reply that's already RESP encoded and is written as-is"""
+
+
+class Error(str):
+    """A reply that's sent as a RESP error, e.g. ``Error("ERR nope")``"""
+
+
+def encode_reply(value: Any) -> bytes:
+    """Encode a Python value as a RESP reply"""
+    if isinstance(value, Raw):
+        return bytes(value)
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, Error):
+        return b"-" + value.encode() + CRLF
+    if isinstance(value, Exception):
+        return b"-" + str(value).encode() + CRLF
+    if isinstance(value, bool):
+        return b":1\r\n" if value else b":0\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, str):
+        return b"+" + value.encode() + CRLF
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return b"$%d\r\n%s\r\n" % (len(value), bytes(value))
+    if isinstance(value, (list, tuple)):
+        return b"*%d\r\n" % len(value) + b"".join(map(encode_reply, value))
+    raise TypeError(f"Can't encode {value!r} as a RESP reply")
+
+
+def parse_request(buffer: bytearray, pos: int = 0) -> Optional[Tuple[list, int]]:
+    """
+    Parse one request (a RESP array of bulk strings, or an inline command)
+    starting at ``pos``. Returns the arguments and the position after the
+    request, or None if the buffer doesn't hold a complete request yet.
+    """
+    end = buffer.find(CRLF, pos)
+    if end == -1:
+        return None
+    if buffer[pos : pos + 1] != b"*":
+        return bytes(buffer[pos:end]).split(), end + 2
+    count = int(buffer[pos + 1 : end])
+    pos = end + 2
+    args = []
+    for _ in range(count):
+        end = buffer.find(CRLF, pos)
+        if end == -1:
+            return None
+        length = int(buffer[pos + 1 : end])
+        start = end + 2
+        if len(buffer) < start + length + 2:
+            return None
+        args.append(bytes(buffer[start : start + length]))
+        pos = start + length + 2
+    return args, pos
+
+
+ReplyT = Union[Any, Callable[[List[bytes]], Any]]
+
+
+class FakeRedisServer:
+    """
+    A fake Redis server bound to ``host``/``port`` (port 0 picks a free one).
+
+    ``latency`` delays every batch of replies by that many seconds.
+    ``fragment_size`` splits every write into chunks of at most that many
+    bytes, pausing ``fragment_delay`` seconds between them. ``drop_after``
+    closes each client connection after it has sent that many commands.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        fragment_size: Optional[int] = None,
+        fragment_delay: float = 0.0,
+        drop_after: Optional[int] = None,
+        record: bool = False,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.fragment_size = fragment_size
+        self.fragment_delay = fragment_delay
+        self.drop_after = drop_after
+        self.record = record
+        self.commands: List[List[bytes]] = []
+        self.connections = 0
+        self.data: Dict[bytes, bytes] = {}
+        self._replies: Dict[bytes, ReplyT] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+        self._channels: Dict[bytes, Set[asyncio.StreamWriter]] = defaultdict(set)
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    async def start(self):
+        self._server = await asyncio.start_server(
+            self._handle_client, self.host, self.port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.drop_connections()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> "FakeRedisServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.stop()
+
+    def set_reply(self, command: str, reply: ReplyT):
+        """
+        Serve ``reply`` for ``command``. It's either a value that's encoded
+        with :func:`encode_reply`, or a callable receiving the command's
+        arguments (as bytes) and returning such a value.
+        """
+        self._replies[command.upper().encode()] = reply
+
+    def drop_connections(self):
+        """Close every client connection currently open"""
+        for writer in list(self._writers):
+            writer.close()
+        self._writers.clear()
+
+    async def _handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        self.connections += 1
+        self._writers.add(writer)
+        buffer = bytearray()
+        handled = 0
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                buffer += data
+                pos = 0
+                replies = []
+                drop = False
+                while True:
+                    parsed = parse_request(buffer, pos)
+                    if parsed is None:
+                        break
+                    args, pos = parsed
+                    if not args:
+                        continue
+                    handled += 1
+                    if self.drop_after is not None and handled > self.drop_after:
+                        drop = True
+                        break
+                    if self.record:
+                        self.commands.append(args)
+                    replies.append(self._reply(args, writer))
+                del buffer[:pos]
+                if replies:
+                    if self.latency:
+                        await asyncio.sleep(self.latency)
+                    # commands before the drop in the same batch are answered
+                    await self._write(writer, b"".join(replies))
+                if drop:
+                    return
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            for subscribers in self._channels.values():
+                subscribers.discard(writer)
+            writer.close()
+
+    async def _write(self, writer: asyncio.StreamWriter, data: bytes):
+        size = self.fragment_size
+        if not size:
+            writer.write(data)
+            await writer.drain()
+            return
+        for i in range(0, len(data), size):
+            if i and self.fragment_delay:
+                await asyncio.sleep(self.fragment_delay)
+            writer.write(data[i : i + size])
+            await writer.drain()
+
+    def _reply(self, args: List[bytes], writer: asyncio.StreamWriter) -> bytes:
+        command = args[0].upper()
+        if command in self._replies:
+            reply = self._replies[command]
+            if callable(reply):
+                reply = reply(args)
+            return encode_reply(reply)
+        handler = getattr(self, "_cmd_" + command.decode().lower(), None)
+        if handler is None:
+            return encode_reply(Error(f"ERR unknown command '{args[0].decode()}'"))
+        return encode_reply(handler(args[1:], writer))
+
+    # built-in commands
+
+    def _cmd_ping(self, args, writer):
+        return args[0] if args else "PONG"
+
+    def _cmd_echo(self, args, writer):
+        return args[0]
+
+    def _cmd_select(self, args, writer):
+        return "OK"
+
+    _cmd_auth = _cmd_client = _cmd_flushdb = _cmd_flushall = _cmd_select
+
+    def _cmd_quit(self, args, writer):
+        writer.close()
+        return "OK"
+
+    def _cmd_set(self, args, writer):
+        self.data[args[0]] = args[1]
+        return "OK"
+
+    def _cmd_get(self, args, writer):
+        return self.data.get(args[0])
+
+    def _cmd_mget(self, args, writer):
+        return [self.data.get(key) for key in args]
+
+    def _cmd_del(self, args, writer):
+        return sum(self.data.pop(key, None) is not None for key in args)
+
+    def _cmd_incr(self, args, writer):
+        value = int(self.data.get(args[0], 0)) + 1
+        self.data[args[0]] = b"%d" % value
+        return value
+
+    def _cmd_subscribe(self, args, writer):
+        replies = []
+        for channel in args:
+            self._channels[channel].add(writer)
+            count = sum(writer in s for s in self._channels.values())
+            replies.append(encode_reply([b"subscribe", channel, count]))
+        return Raw(b"".join(replies))
+
+    def _cmd_unsubscribe(self, args, writer):
+        replies = []
+        channels = args or [c for c, s in self._channels.items() if writer in s]
+        for channel in channels:
+            self._channels[channel].discard(writer)
+            count = sum(writer in s for s in self._channels.values())
+            replies.append(encode_reply([b"unsubscribe", channel, count]))
+        return Raw(b"".join(replies))
+
+    def _cmd_publish(self, args, writer):
+        channel, message = args
+        subscribers = self._channels.get(channel, ())
+        payload = encode_reply([b"message", channel, message])
+        for subscriber in subscribers:
+            subscriber.write(payload)
+        return len(subscribers)
@@ -0,0 +1,136 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+import aioredis
+from aioredis.broker import Broker, frame_end, request_args
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+async def broker(request):
+    url = request.config.getoption("--redis-url")
+    path = os.path.join(tempfile.mkdtemp(), "broker.sock")
+    broker = Broker.from_url(url, path, max_connections=2)
+    await broker.start()
+    yield broker
+    await broker.close()
+
+
+@pytest.fixture
+async def worker(broker):
+    client = aioredis.Redis(unix_socket_path=broker.path)
+    await client.flushdb()
+    yield client
+    await client.flushdb()
+    await client.connection_pool.disconnect()
+
+
+class TestBroker:
+    async def test_commands_are_relayed(self, worker):
+        assert await worker.set("a", "1")
+        assert await worker.get("a") == b"1"
+        assert await worker.mget("a", "b") == [b"1", None]
+        with pytest.raises(aioredis.ResponseError):
+            await worker.lpush("a", "x")
+
+    async def test_connections_are_shared(self, broker, worker):
+        clients = [aioredis.Redis(unix_socket_path=broker.path) for _ in range(10)]
+        await asyncio.gather(*(c.incr("counter") for c in clients for _ in range(10)))
+        assert await worker.get("counter") == b"100"
+        assert broker.connection_pool.get_stats()["created_connections"] <= 2
+        for client in clients:
+            await client.connection_pool.disconnect()
+
+    async def test_pipeline(self, worker):
+        async with worker.pipeline(transaction=False) as pipe:
+            pipe.set("a", "1").incr("a").get("a")
+            assert await pipe.execute() == [True, 2, b"2"]
+
+    async def test_transaction_with_watch(self, worker):
+        await worker.set("a", "1")
+        async with worker.pipeline() as pipe:
+            await pipe.watch("a")
+            value = int(await pipe.get("a"))
+            pipe.multi()
+            pipe.set("a", value + 1)
+            assert await pipe.execute() == [True]
+        assert await worker.get("a") == b"2"
+
+    async def test_pinned_connection_failure(self, request):
+        url = request.config.getoption("--redis-url")
+        path = os.path.join(tempfile.mkdtemp(), "broker.sock")
+        direct = aioredis.Redis.from_url(url)
+        async with Broker.from_url(url, path, max_connections=4) as broker:
+            pool = broker.connection_pool
+            worker = aioredis.Redis(unix_socket_path=path)
+            # leaves room in the pool's queue for a second release
+            held = await pool.get_connection("_")
+            async with worker.pipeline() as pipe:
+                await pipe.watch("a")
+                await direct.client_kill_filter(_id=await pipe.client_id())
+                with pytest.raises(aioredis.ResponseError, match="broker"):
+                    await pipe.get("a")
+            # the failed connection went back to the pool exactly once
+            queued = [c for c in pool.pool._queue if c is not None]
+            assert len(queued) == len(set(map(id, queued)))
+            await pool.release(held)
+            assert await worker.ping()
+            await worker.connection_pool.disconnect()
+        await direct.connection_pool.disconnect()
+
+    async def test_close_cancels_waiting_sessions(self, request):
+        url = request.config.getoption("--redis-url")
+        path = os.path.join(tempfile.mkdtemp(), "broker.sock")
+        broker = Broker.from_url(url, path, max_connections=1)
+        await broker.start()
+        held = await broker.connection_pool.get_connection("_")
+        worker = aioredis.Redis(unix_socket_path=path)
+        ping = asyncio.ensure_future(worker.ping())
+        while not broker.sessions:
+            await asyncio.sleep(0.01)
+        # the session waits for the pool's only connection until closed
+        await asyncio.wait_for(broker.close(), 1)
+        assert broker.sessions == 0
+        with pytest.raises(aioredis.ConnectionError):
+            await ping
+        await broker.connection_pool.release(held)
+        await worker.connection_pool.disconnect()
+
+    async def test_pubsub_is_bridged(self, worker):
+        pubsub = worker.pubsub()
+        await pubsub.subscribe("channel")
+        assert (await pubsub.get_message(timeout=1))["type"] == "subscribe"
+        assert await worker.publish("channel", "hello") == 1
+        message = await pubsub.get_message(timeout=1)
+        assert message["data"] == b"hello"
+        await pubsub.close()
+
+    async def test_select_other_database_fails(self, broker):
+        client = aioredis.Redis(unix_socket_path=broker.path, db=3)
+        with pytest.raises(aioredis.ResponseError, match="only serves database"):
+            await client.ping()
+        await client.connection_pool.disconnect()
+
+    async def test_client_name_and_auth_are_local(self, broker):
+        client = aioredis.Redis(
+            unix_socket_path=broker.path, client_name="worker", password="secret"
+        )
+        assert await client.ping()
+        await client.connection_pool.disconnect()
+
+
+def test_frame_end():
+    buffer = bytearray(b"*2\r\n$3\r\nfoo\r\n:1\r\n+OK\r\n$-1\r\n*1\r\n$3\r\nba")
+    assert frame_end(buffer, 0) == 17
+    assert frame_end(buffer, 17) == 22
+    assert frame_end(buffer, 22) == 27
+    assert frame_end(buffer, 27) is None
+
+
+def test_request_args():
+    assert request_args(b"*2\r\n$3\r\nGET\r\n$0\r\n\r\n") == [b"GET", b""]
+    assert request_args(b"PING hello\r\n") == [b"PING", b"hello"]
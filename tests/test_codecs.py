@@ -0,0 +1,156 @@
+import json
+import os
+import pickle
+
+import pytest
+
+import aioredis
+from aioredis.codecs import LZ4_AVAILABLE, MAGIC, ZSTD_AVAILABLE, Codec
+
+pytestmark = pytest.mark.asyncio
+
+COMPRESSIONS = [
+    "zlib",
+    pytest.param(
+        "lz4", marks=pytest.mark.skipif(not LZ4_AVAILABLE, reason="needs lz4")
+    ),
+    pytest.param(
+        "zstd", marks=pytest.mark.skipif(not ZSTD_AVAILABLE, reason="needs zstandard")
+    ),
+]
+
+
+class TestCodec:
+    def test_plain_values_pass_through(self):
+        codec = Codec(serializer=json, compression="zlib")
+        for value in (b"", b"short", "ünïcode".encode()):
+            assert codec.pack(value) is value
+            assert codec.loads(value) is value
+
+    def test_binary_values_pass_through(self):
+        codec = Codec(serializer=json)
+        jpeg = b"\xff\xd8\xff\xe0\x00\x10JFIF"
+        assert codec.pack(jpeg) is jpeg
+        assert codec.loads(jpeg) is jpeg
+
+    def test_values_starting_with_the_header_are_escaped(self):
+        codec = Codec()
+        packed = codec.pack(MAGIC + b"abc")
+        assert packed == MAGIC + b"\x00" + MAGIC + b"abc"
+        assert codec.loads(packed) == MAGIC + b"abc"
+
+    def test_undecodable_values_are_returned_as_is(self):
+        codec = Codec(serializer=json, compression="zlib")
+        for value in (MAGIC + b"\x01garbage", MAGIC + b"\x04{", MAGIC + b"\xff"):
+            assert codec.loads(value) is value
+
+    @pytest.mark.parametrize("compression", COMPRESSIONS)
+    def test_compression(self, compression):
+        codec = Codec(compression=compression, compress_threshold=100)
+        value = b"abcd" * 1000
+        packed = codec.pack(value)
+        assert len(packed) < len(value) // 10
+        assert codec.loads(packed) == value
+        # values under the threshold or that don't shrink are left alone
+        assert codec.pack(b"abcd" * 10) == b"abcd" * 10
+        incompressible = bytes(range(128))
+        assert codec.pack(incompressible) == incompressible
+
+    @pytest.mark.parametrize("serializer", [json, pickle])
+    def test_serializer(self, serializer):
+        codec = Codec(serializer=serializer)
+        value = {"a": [1, 2.5, None], "b": "text"}
+        assert codec.loads(codec.dumps(value)) == value
+
+    def test_invalid_options(self):
+        with pytest.raises(aioredis.DataError):
+            Codec(compression="brotli")
+        with pytest.raises(aioredis.DataError):
+            Codec(serializer=object())
+        with pytest.raises(aioredis.DataError):
+            Codec().dumps({"a": 1})
+        with pytest.raises(aioredis.DataError):
+            Codec().loads(Codec(serializer=json).dumps({"a": 1}))
+
+
+class TestCodecClient:
+    @pytest.fixture()
+    async def r(self, create_redis):
+        codec = Codec(serializer=json, compression="zlib", compress_threshold=100)
+        redis = await create_redis(codec=codec)
+        yield redis
+        await redis.flushall()
+
+    async def test_serialized_values(self, r):
+        await r.set("doc", {"a": [1, 2, 3]})
+        assert await r.get("doc") == {"a": [1, 2, 3]}
+        await r.rpush("list", {"a": 1}, [2], "three", 4, True)
+        assert await r.lrange("list", 0, -1) == [{"a": 1}, [2], b"three", b"4", True]
+
+    async def test_compressed_values(self, r):
+        blob = json.dumps({"items": list(range(2000))})
+        await r.set("blob", blob)
+        assert await r.strlen("blob") < len(blob) // 2
+        assert await r.get("blob") == blob.encode()
+        await r.hset("hash", mapping={"blob": blob, "small": "x"})
+        assert await r.hgetall("hash") == {b"blob": blob.encode(), b"small": b"x"}
+
+    async def test_mixed_values_in_pipeline(self, r):
+        async with r.pipeline() as pipe:
+            pipe.set("a", {"x": 1}).set("b", "y" * 1000).set("c", b"\xffbinary")
+            pipe.mget("a", "b", "c")
+            result = await pipe.execute()
+        assert result[-1] == [{"x": 1}, b"y" * 1000, b"\xffbinary"]
+
+    async def test_values_written_by_other_clients(self, r, create_redis):
+        plain = await create_redis()
+        jpeg = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00" + bytes(range(256))
+        await plain.set("jpeg", jpeg)
+        assert await r.get("jpeg") == jpeg
+        await r.set("jpeg2", jpeg)
+        assert await plain.get("jpeg2") == jpeg
+
+    async def test_partial_reads_of_compressed_values(self, r):
+        await r.set("blob", "x" * 1000)
+        # a slice of the compressed data can't be decoded and is returned raw
+        head = await r.getrange("blob", 0, 10)
+        assert isinstance(head, bytes) and head.startswith(MAGIC)
+
+    async def test_keys_and_fields_are_not_encoded(self, r, create_redis):
+        plain = await create_redis()
+        key = "k" * 1000
+        await r.set(key, "v")
+        await r.hset("hash", "f" * 1000, "v")
+        assert await plain.get(key) == b"v"
+        assert await plain.hkeys("hash") == [b"f" * 1000]
+
+    async def test_non_utf8_encoding(self, create_redis):
+        r = await create_redis(
+            codec=Codec(serializer=json), encoding="latin-1", decode_responses=True
+        )
+        await r.set("a", "\xf8text")
+        assert await r.get("a") == "\xf8text"
+
+    async def test_decode_responses(self, create_redis):
+        codec = Codec(serializer=json, compression="zlib", compress_threshold=100)
+        r = await create_redis(codec=codec, decode_responses=True)
+        await r.set("a", {"x": 1})
+        await r.set("b", "ü" * 1000)
+        assert await r.mget("a", "b") == [{"x": 1}, "ü" * 1000]
+        assert await r.ping() is True
+
+    async def test_scripts_are_sent_unencoded(self, r):
+        source = "-- " + "padding " * 50 + "\nreturn ARGV[1]"
+        script = r.register_script(source)
+        assert await script(args=["x" * 200]) == b"x" * 200
+        assert await r.eval(source, 0, "y") == b"y"
+        assert await r.script_exists(script.sha) == [True]
+
+    async def test_dump_and_restore(self, r, create_redis):
+        # hex digits don't compress with the server's LZF, but with zlib
+        value = os.urandom(1000).hex()
+        plain = await create_redis()
+        await plain.set("a", value)
+        payload = await r.dump("a")
+        await r.restore("b", 0, payload)
+        assert await r.get("b") == value.encode()
@@ -8,7 +8,13 @@ import pytest
 
 import aioredis
 from aioredis import exceptions
-from aioredis.client import parse_info
+from aioredis.client import (
+    LazyMapping,
+    diff_client_list,
+    diff_info,
+    parse_client_list,
+    parse_info,
+)
 from tests.conftest import (
     REDIS_6_VERSION,
     skip_if_server_version_gte,
@@ -344,6 +350,16 @@ class TestRedisCommands:
         assert isinstance(clients[0], dict)
         assert "addr" in clients[0]
 
+    async def test_client_list_fields(self, r: aioredis.Redis):
+        clients = await r.client_list(fields=["id", "addr", "unknown"])
+        assert clients
+        assert all(client.keys() == {"id", "addr"} for client in clients)
+
+    async def test_client_list_lazy(self, r: aioredis.Redis):
+        clients = await r.client_list(lazy=True)
+        assert isinstance(clients[0], LazyMapping)
+        assert clients == await r.client_list()
+
     @skip_if_server_version_lt("5.0.0")
     async def test_client_list_type(self, r: aioredis.Redis):
         with pytest.raises(exceptions.RedisError):
@@ -511,6 +527,19 @@ class TestRedisCommands:
         assert isinstance(info, dict)
         assert info["db9"]["keys"] == 2
 
+    async def test_info_fields(self, r: aioredis.Redis):
+        await r.set("a", "foo")
+        info = await r.info(fields={"redis_version", "db*"})
+        assert info.keys() == {"redis_version", "db9"}
+        assert info["db9"]["keys"] == 1
+
+    async def test_info_lazy(self, r: aioredis.Redis):
+        await r.set("a", "foo")
+        info = await r.info("keyspace", lazy=True)
+        assert isinstance(info["db9"], LazyMapping)
+        assert info["db9"]["keys"] == 1
+        assert info == await r.info("keyspace")
+
     async def test_lastsave(self, r: aioredis.Redis):
         assert isinstance(await r.lastsave(), datetime.datetime)
 
@@ -1236,6 +1265,53 @@ class TestRedisCommands:
         keys = [k async for k in r.scan_iter(match="a")]
         assert set(keys) == {b"a"}
 
+    @pytest.mark.parametrize("prefetch", [True, False])
+    async def test_scan_batches(self, r: aioredis.Redis, prefetch):
+        await r.mset({f"key:{i}": i for i in range(500)})
+        pages = [page async for page in r.scan_batches(count=50, prefetch=prefetch)]
+        assert len(pages) > 1
+        assert all(isinstance(page, list) and page for page in pages)
+        keys = [key for page in pages for key in page]
+        assert set(keys) == {f"key:{i}".encode() for i in range(500)}
+        pages = [page async for page in r.scan_batches(match="key:1", _type="string")]
+        assert pages == [[b"key:1"]]
+
+    async def test_scan_batches_adapts_count(self, r: aioredis.Redis, monkeypatch):
+        await r.mset({f"key:{i}": i for i in range(2000)})
+        counts = []
+        scan = r.scan
+
+        def record_count(cursor=0, match=None, count=None, _type=None):
+            counts.append(count)
+            return scan(cursor, match, count, _type)
+
+        monkeypatch.setattr(r, "scan", record_count)
+        # a target no SCAN can reach keeps halving the count
+        keys = [
+            key
+            async for page in r.scan_batches(target_latency=1e-9, count=400)
+            for key in page
+        ]
+        assert len(set(keys)) == 2000
+        assert counts[:4] == [400, 200, 100, 50]
+        assert min(counts) == 10
+
+        counts.clear()
+        async for _ in r.scan_batches(target_latency=60, max_count=1000):
+            pass
+        assert counts[:4] == [10, 20, 40, 80]
+        assert max(counts) == 1000
+
+    async def test_scan_batches_early_exit(self, r: aioredis.Redis):
+        await r.mset({f"key:{i}": i for i in range(500)})
+        batches = r.scan_batches(count=10)
+        async for _ in batches:
+            break
+        await batches.aclose()
+        # the prefetched SCAN was read, so the connections are still usable
+        assert await r.get("key:1") == b"1"
+        assert len(await r.keys()) == 500
+
     @skip_if_server_version_lt("2.8.0")
     async def test_sscan(self, r: aioredis.Redis):
         await r.sadd("a", 1, 2, 3)
@@ -1287,6 +1363,26 @@ class TestRedisCommands:
         pairs = [k async for k in r.zscan_iter("a", match="a")]
         assert set(pairs) == {(b"a", 1)}
 
+    async def test_collection_scan_batches(self, r: aioredis.Redis):
+        await r.sadd("s", *range(300))
+        await r.hset("h", mapping={f"f{i}": i for i in range(300)})
+        await r.zadd("z", {f"m{i}": i for i in range(300)})
+        members = [m async for page in r.sscan_batches("s", count=20) for m in page]
+        assert sorted(map(int, members)) == list(range(300))
+        fields = {}
+        async for page in r.hscan_batches("h", count=20):
+            assert isinstance(page, dict)
+            fields.update(page)
+        assert fields == {f"f{i}".encode(): str(i).encode() for i in range(300)}
+        pairs = [
+            pair
+            async for page in r.zscan_batches("z", count=20, score_cast_func=int)
+            for pair in page
+        ]
+        assert sorted(pairs, key=lambda pair: pair[1]) == [
+            (f"m{i}".encode(), i) for i in range(300)
+        ]
+
     # SET COMMANDS
     async def test_sadd(self, r: aioredis.Redis):
         members = {b"1", b"2", b"3"}
@@ -3026,6 +3122,59 @@ class TestBinarySave:
         assert "6" in parsed["allocation_stats"]
         assert ">=256" in parsed["allocation_stats"]
 
+    def test_parse_info_options(self):
+        info = (
+            "# Stats\r\n"
+            "total_connections_received:10\r\n"
+            "cmdstat_get:calls=5,usec=10,usec_per_call=2.00\r\n"
+            "cmdstat_set:calls=1,usec=3,usec_per_call=3.00\r\n"
+            "module:name=search,ver=20006\r\n"
+        )
+        full = parse_info(info)
+        assert full["modules"] == [{"name": "search", "ver": 20006}]
+        assert parse_info(info, fields={"cmdstat_*"}) == {
+            "cmdstat_get": {"calls": 5, "usec": 10, "usec_per_call": 2.0},
+            "cmdstat_set": {"calls": 1, "usec": 3, "usec_per_call": 3.0},
+        }
+        # fields may be any iterable
+        assert parse_info(info, fields=iter(["cmdstat_set", "total_*"])) == {
+            "total_connections_received": 10,
+            "cmdstat_set": {"calls": 1, "usec": 3, "usec_per_call": 3.0},
+        }
+        lazy = parse_info(info, lazy=True)
+        assert isinstance(lazy["cmdstat_get"], LazyMapping)
+        assert lazy == full
+
+    def test_diff_info(self):
+        before = parse_info(
+            "a:1\r\nb:x\r\ndb0:keys=1,expires=0\r\ndb1:keys=2,expires=0",
+            lazy=True,
+        )
+        after = parse_info("a:2\r\nb:x\r\ndb0:keys=1,expires=0\r\nc:3", lazy=True)
+        assert diff_info(before, after) == {
+            "a": (1, 2),
+            "c": (None, 3),
+            "db1": ({"keys": 2, "expires": 0}, None),
+        }
+
+    def test_parse_client_list_options(self):
+        response = (
+            "id=1 addr=127.0.0.1:1 name= cmd=get\n"
+            "id=2 addr=127.0.0.1:2 name=x=y cmd=client|list\n"
+            "id=3 addr=127.0.0.1:3 cmd=set"
+        )
+        clients = parse_client_list(response, fields=iter(["id", "name"]))
+        assert clients == [
+            {"id": "1", "name": ""},
+            {"id": "2", "name": "x=y"},
+            {"id": "3"},
+        ]
+        lazy = parse_client_list(response, lazy=True)
+        assert lazy == parse_client_list(response)
+        connected, disconnected = diff_client_list(lazy[:2], lazy[1:])
+        assert [client["id"] for client in connected] == ["3"]
+        assert [client["id"] for client in disconnected] == ["1"]
+
     async def test_large_responses(self, r: aioredis.Redis):
         """The PythonParser has some special cases for return values > 1MB"""
         # load up 5MB of data into a key
@@ -1,11 +1,15 @@
+import asyncio
 from typing import TYPE_CHECKING
 from unittest import mock
 
 import pytest
 
+import aioredis
 from aioredis.exceptions import InvalidResponse
 from aioredis.utils import HIREDIS_AVAILABLE
 
+from .fake_server import FakeRedisServer
+
 if TYPE_CHECKING:
     from aioredis.connection import PythonParser
 
@@ -19,3 +23,105 @@ async def test_invalid_response(r):
         with pytest.raises(InvalidResponse) as cm:
             await parser.read_response()
     assert str(cm.value) == "Protocol Error: %r" % raw
+
+
+@pytest.mark.asyncio
+async def test_canned_reply_from_fake_server():
+    async with FakeRedisServer(record=True) as server:
+        server.set_reply("HGETALL", [b"a", b"1"])
+        client = aioredis.Redis.from_url(server.url)
+        assert await client.hgetall("key") == {b"a": b"1"}
+        assert server.commands == [[b"HGETALL", b"key"]]
+        await client.connection_pool.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_fragmented_replies_are_reassembled():
+    async with FakeRedisServer(fragment_size=7) as server:
+        value = [b"x" * 100, 42, None, [b"nested", b""]]
+        server.set_reply("GET", value)
+        client = aioredis.Redis.from_url(server.url)
+        assert await client.get("key") == value
+        await client.connection_pool.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_buffered_reply_honours_disable_decoding():
+    async with FakeRedisServer() as server:
+        server.set_reply("GET", [b"\xc3\xbc", b"raw"])
+        client = aioredis.Redis.from_url(server.url, decode_responses=True)
+        connection = await client.connection_pool.get_connection("GET")
+        for disable_decoding, expected in (
+            (True, [b"\xc3\xbc", b"raw"]),
+            (False, ["\xfc", "raw"]),
+        ):
+            await connection.send_command("GET", "key")
+            # polling parses the reply and keeps it for read_response
+            while not connection.can_read_buffered():
+                await connection.can_read(timeout=0.1)
+            response = await connection.read_response(disable_decoding=disable_decoding)
+            assert response == expected
+        await client.connection_pool.release(connection)
+        await client.connection_pool.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_slow_server_raises_timeout():
+    async with FakeRedisServer(latency=0.2) as server:
+        client = aioredis.Redis.from_url(server.url, socket_timeout=0.05)
+        with pytest.raises(aioredis.TimeoutError):
+            await client.ping()
+        await client.connection_pool.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_reconnect_after_server_drops_connection():
+    async with FakeRedisServer() as server:
+        client = aioredis.Redis.from_url(server.url, collect_stats=True)
+        assert await client.ping()
+        server.drop_connections()
+        await asyncio.sleep(0.01)
+        assert await client.ping()
+        assert server.connections == 2
+        assert client.connection_pool.stats.reconnects == 1
+        await client.connection_pool.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_connection_lost_during_overlapped_pipeline():
+    async with FakeRedisServer() as server:
+        client = aioredis.Redis.from_url(server.url)
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.WRITE_CHUNK_SIZE = 1024
+            for i in range(50):
+                pipe.set(f"k{i}", b"x" * 1024)
+            pipe.execute_command("QUIT")
+            for i in range(500):
+                pipe.set(f"k{i}", b"x" * 1024)
+            with pytest.raises(aioredis.ConnectionError):
+                await pipe.execute()
+        assert await client.ping()
+        await client.connection_pool.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_server_drops_connection_after_answering_earlier_commands():
+    async with FakeRedisServer(drop_after=3) as server:
+        reader, writer = await asyncio.open_connection(server.host, server.port)
+        writer.write(b"PING\r\n" * 5)
+        # the commands before the drop are answered, then the connection closes
+        assert await reader.read() == b"+PONG\r\n" * 3
+        writer.close()
+
+
+@pytest.mark.asyncio
+async def test_fragment_delay_paces_replies():
+    async with FakeRedisServer(fragment_size=4, fragment_delay=0.02) as server:
+        server.set_reply("GET", b"x" * 20)
+        client = aioredis.Redis.from_url(server.url)
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+        # 26 bytes in 7 fragments, with a pause between each of them
+        assert await client.get("key") == b"x" * 20
+        assert loop.time() - started >= 0.1
+        await client.connection_pool.disconnect()
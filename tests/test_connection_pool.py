@@ -194,6 +194,68 @@ class TestBlockingConnectionPool:
         assert repr(pool) == expected
 
 
+class TestPoolStats:
+    async def test_stats_disabled_by_default(self, master_host):
+        pool = aioredis.ConnectionPool(host=master_host)
+        assert pool.stats is None
+        c1 = await pool.get_connection("_")
+        await pool.get_connection("_")
+        await pool.release(c1)
+        stats = pool.get_stats()
+        assert stats["created_connections"] == 2
+        assert stats["in_use_connections"] == 1
+        assert stats["idle_connections"] == 1
+        assert "checkout_wait" not in stats
+        await pool.disconnect()
+
+    async def test_command_and_checkout_stats(self, master_host):
+        pool = aioredis.ConnectionPool(host=master_host, collect_stats=True)
+        client = aioredis.Redis(connection_pool=pool)
+        events = []
+        pool.stats.add_listener(lambda *args: events.append(args))
+        await client.ping()
+        await client.ping()
+        stats = pool.get_stats()
+        assert stats["checkouts"] == 2
+        assert stats["connects"] == 1
+        assert stats["reconnects"] == 0
+        assert stats["command_latency"]["PING"]["count"] == 2
+        assert stats["checkout_wait"]["buckets"][-1][1] == 2
+        assert stats["bytes_sent"] == 2 * len(b"*1\r\n$4\r\nPING\r\n")
+        assert stats["bytes_received"] == 2 * len(b"+PONG\r\n")
+        assert ("command_latency", mock.ANY, {"command": "PING"}) in events
+        await pool.disconnect()
+
+    async def test_reconnects_are_counted(self, master_host):
+        pool = aioredis.ConnectionPool(host=master_host, collect_stats=True)
+        client = aioredis.Redis(connection_pool=pool)
+        await client.ping()
+        await pool.disconnect()
+        await client.ping()
+        assert pool.stats.connects == 2
+        assert pool.stats.reconnects == 1
+        await pool.disconnect()
+
+    async def test_blocking_pool_checkout_errors(self, master_host):
+        pool = aioredis.BlockingConnectionPool(
+            host=master_host, max_connections=1, timeout=0.01, collect_stats=True
+        )
+        await pool.get_connection("_")
+        with pytest.raises(aioredis.ConnectionError):
+            await pool.get_connection("_")
+        stats = pool.get_stats()
+        assert stats["checkouts"] == 1
+        assert stats["checkout_errors"] == 1
+        assert stats["waiting"] == 0
+        assert stats["in_use_connections"] == 1
+        await pool.disconnect()
+
+    def test_collect_stats_in_querystring(self):
+        pool = aioredis.ConnectionPool.from_url("redis://localhost?collect_stats=yes")
+        assert pool.stats is not None
+        assert "collect_stats" not in pool.connection_kwargs
+
+
 class TestConnectionPoolURLParsing:
     def test_hostname(self):
         pool = aioredis.ConnectionPool.from_url("redis://my.host")
@@ -1,6 +1,10 @@
+import enum
+import json
+
 import pytest
 
 import aioredis
+from aioredis.connection import Encoder
 
 pytestmark = pytest.mark.asyncio
 
@@ -86,6 +90,100 @@ class TestMemoryviewsAreNotPacked:
         assert cmds[3] is arg
 
 
+class TestPerCommandDecoding:
+    async def test_disable_decoding(self, create_redis):
+        r = await create_redis(decode_responses=True)
+        await r.set("binary", b"\xff\xfe")
+        await r.rpush("list", b"\xff", "text")
+        with pytest.raises(UnicodeDecodeError):
+            await r.get("binary")
+        assert await r.execute_command("GET", "binary", decode=False) == b"\xff\xfe"
+        assert await r.execute_command("LRANGE", "list", 0, -1, decode=False) == [
+            b"\xff",
+            b"text",
+        ]
+        # the connection keeps decoding other replies
+        assert await r.ping() is True
+        assert await r.execute_command("ECHO", "x") == "x"
+
+    async def test_decode_option_is_not_passed_to_callbacks(self, create_redis):
+        r = await create_redis(decode_responses=True)
+        info = await r.execute_command("INFO", "server", decode=False)
+        assert isinstance(info["redis_version"], str)
+        async with r.pipeline() as pipe:
+            pipe.execute_command("INFO", "server", decode=False)
+            assert "redis_version" in (await pipe.execute())[0]
+
+    async def test_enable_decoding(self, r):
+        await r.rpush("list", "a", "ü")
+        assert await r.execute_command("LRANGE", "list", 0, -1, decode=True) == [
+            "a",
+            "ü",
+        ]
+        assert await r.lrange("list", 0, -1) == [b"a", "ü".encode()]
+
+    @pytest.mark.parametrize("transaction", [True, False])
+    async def test_pipeline(self, create_redis, transaction):
+        r = await create_redis(decode_responses=True)
+        await r.set("binary", b"\xff")
+        await r.set("text", "ü")
+        async with r.pipeline(transaction=transaction) as pipe:
+            pipe.execute_command("GET", "binary", decode=False)
+            pipe.get("text")
+            pipe.execute_command("MGET", "text", "binary", decode=False)
+            pipe.llen("text")
+            result = await pipe.execute(raise_on_error=False)
+        assert result[:3] == [b"\xff", "ü", ["ü".encode(), b"\xff"]]
+        assert isinstance(result[3], aioredis.ResponseError)
+
+    async def test_codec_still_applies(self, create_redis):
+        r = await create_redis(
+            codec=aioredis.Codec(serializer=json, compression="zlib"),
+            decode_responses=True,
+        )
+        await r.set("doc", {"a": "b" * 2000})
+        await r.set("blob", b"\xff" * 2000)
+        assert await r.execute_command("GET", "blob", decode=False) == b"\xff" * 2000
+        assert await r.execute_command("GET", "doc", decode=False) == {"a": "b" * 2000}
+
+
+class TestEncoderFastPath:
+    def test_numbers_match_repr(self):
+        encoder = Encoder("utf-8", "strict", False)
+        values = [0, 1, -1, -256, -257, 4095, 4096, 1 << 70, -(1 << 70)]
+        values += [0.0, -0.0, 0.1, 1.5, 1e100, 1e-100, float("inf"), float("-inf")]
+        for value in values:
+            assert encoder.encode(value) == repr(value).encode()
+
+    def test_subclasses_take_the_slow_path(self):
+        class Key(str, enum.Enum):
+            USER = "user"
+
+        encoder = Encoder("utf-8", "strict", False)
+        assert encoder.encode(Key.USER) == b"user"
+        with pytest.raises(aioredis.DataError):
+            encoder.encode(False)
+
+    def test_non_default_encoding(self):
+        encoder = Encoder("latin-1", "strict", False)
+        assert encoder.encode("\xfc") == b"\xfc"
+        assert Encoder("UTF8", "strict", False).encode("\xfc") == b"\xc3\xbc"
+
+    async def test_custom_encoder_class(self):
+        class UpperEncoder(Encoder):
+            def __init__(self, encoding, encoding_errors, decode_responses):
+                super().__init__(encoding, encoding_errors, decode_responses)
+
+            def encode(self, value):
+                return super().encode(value).upper()
+
+        pool = aioredis.ConnectionPool(encoder_class=UpperEncoder)
+        assert pool.get_encoder().encode("key") == b"KEY"
+        connection = pool.make_connection()
+        assert connection.encoder.encode("key") == b"KEY"
+        await pool.disconnect()
+
+
 class TestCommandsAreNotEncoded:
     @pytest.fixture()
     async def r(self, create_redis):
@@ -0,0 +1,120 @@
+import pytest
+
+import aioredis
+from aioredis.hooks import CommandHook, command_key_count
+
+pytestmark = pytest.mark.asyncio
+
+
+class RecordingHook(CommandHook):
+    def __init__(self):
+        self.events = []
+
+    def before_send(self, context):
+        self.events.append(("before", context.command_name))
+
+    def after_reply(self, context, response):
+        self.events.append(("after", context.command_name, response))
+        self.context = context
+
+    def on_error(self, context, error):
+        self.events.append(("error", context.command_name, type(error)))
+        self.context = context
+
+
+class TestCommandHooks:
+    async def test_hooks_wrap_command(self, r):
+        hook = RecordingHook()
+        r.add_command_hook(hook)
+        await r.set("a", "1")
+        assert hook.events == [("before", "SET"), ("after", "SET", True)]
+        context = hook.context
+        assert context.key_count == 1
+        assert context.duration >= 0
+        assert context.bytes_sent == len(b"*3\r\n$3\r\nSET\r\n$1\r\na\r\n$1\r\n1\r\n")
+        assert context.bytes_received == len(b"+OK\r\n")
+        assert context.pipeline_size == 0
+
+    async def test_hooks_on_error(self, r):
+        hook = RecordingHook()
+        r.add_command_hook(hook)
+        await r.set("a", "1")
+        with pytest.raises(aioredis.ResponseError):
+            await r.lpush("a", "b")
+        assert hook.events[-1] == ("error", "LPUSH", aioredis.ResponseError)
+        assert hook.context.bytes_received > 0
+
+    async def test_hooks_wrap_pipeline(self, r):
+        hook = RecordingHook()
+        r.add_command_hook(hook)
+        async with r.pipeline() as pipe:
+            pipe.set("a", "1").get("a")
+            assert await pipe.execute() == [True, b"1"]
+        assert hook.events == [
+            ("before", "MULTI"),
+            ("after", "MULTI", [True, b"1"]),
+        ]
+        assert hook.context.pipeline_size == 2
+
+    async def test_hooks_wrap_streamed_commands(self, r):
+        hook = RecordingHook()
+        r.add_command_hook(hook)
+        await r.set("a", "1")
+        hook.events.clear()
+        pipe = r.pipeline(transaction=False)
+        commands = [("GET", "a"), ("LPUSH", "a", "b")]
+        results = [
+            result async for result in pipe.stream(commands, raise_on_error=False)
+        ]
+        assert results[0] == b"1"
+        assert hook.events == [
+            ("before", "GET"),
+            ("before", "LPUSH"),
+            ("after", "GET", b"1"),
+            ("error", "LPUSH", aioredis.ResponseError),
+        ]
+
+    @pytest.mark.parametrize("pipeline", [False, True])
+    async def test_hooks_before_send_error(self, r, pipeline):
+        class FailingHook(RecordingHook):
+            def before_send(self, context):
+                super().before_send(context)
+                raise ValueError("rejected")
+
+        hook = FailingHook()
+        r.add_command_hook(hook)
+        pool = r.connection_pool
+        in_use = len(pool._in_use_connections)
+        with pytest.raises(ValueError):
+            if pipeline:
+                await r.pipeline().get("a").execute()
+            else:
+                await r.get("a")
+        r.remove_command_hook(hook)
+        assert hook.events[-1][0::2] == ("error", ValueError)
+        # the connection was returned to the pool
+        assert len(pool._in_use_connections) == in_use
+
+    async def test_remove_hook(self, r):
+        hook = RecordingHook()
+        r.add_command_hook(hook)
+        r.remove_command_hook(hook)
+        await r.ping()
+        assert hook.events == []
+
+
+@pytest.mark.parametrize(
+    "args,expected",
+    [
+        (("PING",), 0),
+        (("GET", "a"), 1),
+        (("DEL", "a", "b", "c"), 3),
+        (("MSET", "a", 1, "b", 2), 2),
+        (("BLPOP", "a", "b", 0), 2),
+        (("EVALSHA", "abc", 2, "a", "b", "arg"), 2),
+        (("CONFIG GET", "*"), 0),
+        ((b"mget", b"a", b"b"), 2),
+    ],
+)
+def test_command_key_count(args, expected):
+    assert command_key_count(args) == expected
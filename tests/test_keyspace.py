@@ -0,0 +1,68 @@
+import pytest
+
+import aioredis
+from aioredis.keyspace import KeyInfo, analyze_keyspace, describe_keys
+
+from .conftest import skip_if_server_version_lt
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestKeyspace:
+    @skip_if_server_version_lt("4.0.0")
+    async def test_describe_keys(self, create_redis):
+        r = await create_redis(decode_responses=True)
+        await r.set("a", "1")
+        await r.rpush("b", "x", "y")
+        await r.set("c", "1", px=60000)
+        infos = await describe_keys(r, ["a", "b", "missing", "c"], parallel=2)
+        assert [info[:2] for info in infos] == [
+            ("a", "string"),
+            ("b", "list"),
+            ("c", "string"),
+        ]
+        assert infos[0].ttl is None
+        assert 0 < infos[2].ttl <= 60
+        assert all(info.memory > 0 for info in infos)
+
+        infos = await describe_keys(r, ["a"], memory=False)
+        assert infos == [KeyInfo("a", "string", None, None)]
+        assert await describe_keys(r, []) == []
+
+    @skip_if_server_version_lt("4.0.0")
+    @pytest.mark.parametrize("parallel", [1, 3])
+    async def test_analyze_keyspace(self, r, parallel):
+        await r.mset({f"key:{i}": i for i in range(200)})
+        await r.sadd("set", "member")
+        await r.expire("key:0", 100)
+        infos = [
+            info
+            async for info in analyze_keyspace(
+                r, match="key:*", count=20, parallel=parallel
+            )
+        ]
+        by_key = {info.key: info for info in infos}
+        assert set(by_key) == {f"key:{i}".encode() for i in range(200)}
+        assert {info.type for info in infos} == {"string"}
+        assert by_key[b"key:0"].ttl > 0
+        assert by_key[b"key:1"].ttl is None
+
+        infos = [info async for info in analyze_keyspace(r, _type="set")]
+        assert [info.key for info in infos] == [b"set"]
+
+    async def test_analyze_keyspace_early_exit(self, r):
+        await r.mset({f"key:{i}": i for i in range(100)})
+        pool = r.connection_pool
+        in_use = len(pool._in_use_connections)
+        pages = analyze_keyspace(r, count=10, memory=False)
+        async for info in pages:
+            break
+        await pages.aclose()
+        # every connection was returned to the pool
+        assert len(pool._in_use_connections) == in_use
+        assert await r.dbsize() == 100
+
+    async def test_invalid_parallel(self, r):
+        with pytest.raises(aioredis.DataError):
+            async for _ in analyze_keyspace(r, parallel=0):
+                pass
@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+
+from aioredis.client import PubSubMessage
+from aioredis.exceptions import PubSubError
+from aioredis.multiplexer import PubSubMultiplexer
+
+pytestmark = pytest.mark.asyncio
+
+
+async def wait_for_subscribers(r, channel, count):
+    for _ in range(100):
+        if (await r.pubsub_numsub(channel))[0][1] == count:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"{channel} never had {count} subscribers")
+
+
+class TestPubSubMultiplexer:
+    async def test_fan_out(self, r):
+        async with PubSubMultiplexer(r, connections=2) as mux:
+            first = await mux.subscribe("foo")
+            second = await mux.subscribe("foo", "bar")
+            await r.publish("foo", "hello")
+            await r.publish("bar", "world")
+            expected = PubSubMessage("message", None, b"foo", b"hello")
+            assert await first.get(timeout=1) == expected
+            assert await second.get(timeout=1) == expected
+            assert (await second.get(timeout=1)).data == b"world"
+            assert await first.get(timeout=0.01) is None
+
+    async def test_patterns(self, r):
+        async with PubSubMultiplexer(r) as mux:
+            subscription = await mux.psubscribe("f*")
+            await r.publish("foo", "hello")
+            assert await subscription.get(timeout=1) == PubSubMessage(
+                "pmessage", b"f*", b"foo", b"hello"
+            )
+
+    async def test_subscriptions_are_reference_counted(self, r):
+        async with PubSubMultiplexer(r, connections=3) as mux:
+            consumers = [await mux.subscribe("foo") for _ in range(50)]
+            assert mux.active_connections == 1
+            await wait_for_subscribers(r, "foo", 1)
+            for consumer in consumers[:-1]:
+                await consumer.close()
+            await r.publish("foo", "hello")
+            assert (await consumers[-1].get(timeout=1)).data == b"hello"
+            await consumers[-1].unsubscribe("foo")
+            await wait_for_subscribers(r, "foo", 0)
+
+    async def test_channels_spread_over_connections(self, r):
+        async with PubSubMultiplexer(r, connections=4) as mux:
+            subscription = await mux.subscribe(*(f"channel:{i}" for i in range(100)))
+            assert mux.active_connections == 4
+            clients = [c for c in await r.client_list() if c["cmd"] == "subscribe"]
+            assert len(clients) == 4
+            await r.publish("channel:42", "hello")
+            assert (await subscription.get(timeout=1)).channel == b"channel:42"
+
+    async def test_iteration_ends_on_close(self, r):
+        async with PubSubMultiplexer(r) as mux:
+            subscription = await mux.subscribe("foo")
+            await r.publish("foo", "hello")
+            while not subscription.pending:
+                await asyncio.sleep(0.01)
+
+            async def consume():
+                return [m.data async for m in subscription]
+
+            task = asyncio.ensure_future(consume())
+            await subscription.close()
+            assert await task == [b"hello"]
+
+    async def test_resubscribes_after_reconnect(self, r):
+        async with PubSubMultiplexer(r, reconnect_delay=0.01) as mux:
+            subscription = await mux.subscribe("foo")
+            await wait_for_subscribers(r, "foo", 1)
+            for client in await r.client_list():
+                if client["cmd"] == "subscribe":
+                    await r.client_kill_filter(_id=client["id"])
+            await wait_for_subscribers(r, "foo", 1)
+            await r.publish("foo", "hello")
+            assert (await subscription.get(timeout=1)).data == b"hello"
+
+
+async def publish_many(r, channel, count):
+    pipe = r.pipeline(transaction=False)
+    for i in range(count):
+        pipe.publish(channel, i)
+    await pipe.execute()
+
+
+async def wait_for_pending(subscription, count):
+    for _ in range(100):
+        if subscription.pending >= count:
+            return
+        await asyncio.sleep(0.01)
+
+
+class TestOverflowPolicies:
+    async def test_drop_oldest(self, r):
+        async with PubSubMultiplexer(r) as mux:
+            sub = await mux.subscribe("foo", max_queue_size=3, overflow="drop_oldest")
+            await publish_many(r, "foo", 5)
+            while sub.dropped < 2:
+                await asyncio.sleep(0.01)
+            assert [sub.get_nowait().data for _ in range(3)] == [b"2", b"3", b"4"]
+            assert mux.dropped == 2
+
+    async def test_drop_newest(self, r):
+        async with PubSubMultiplexer(r) as mux:
+            sub = await mux.subscribe("foo", max_queue_size=3, overflow="drop_newest")
+            await publish_many(r, "foo", 5)
+            while sub.dropped < 2:
+                await asyncio.sleep(0.01)
+            assert [sub.get_nowait().data for _ in range(3)] == [b"0", b"1", b"2"]
+
+    async def test_disconnect(self, r):
+        async with PubSubMultiplexer(r) as mux:
+            sub = await mux.subscribe("foo", max_queue_size=3, overflow="disconnect")
+            other = await mux.subscribe("foo")
+            await publish_many(r, "foo", 5)
+            await wait_for_pending(other, 5)
+            assert sub.overflowed
+            assert sub.dropped == 4
+            with pytest.raises(PubSubError):
+                await sub.get()
+            assert other.pending == 5
+
+    async def test_block(self, r):
+        async with PubSubMultiplexer(r, max_queue_size=2) as mux:
+            slow = await mux.subscribe("foo")
+            fast = await mux.subscribe("foo", max_queue_size=0)
+            await publish_many(r, "foo", 5)
+            await wait_for_pending(fast, 5)
+            await r.publish("foo", 5)
+            await asyncio.sleep(0.05)
+            # the shard stopped reading until the slow consumer makes room
+            assert slow.pending == 2
+            assert fast.pending == 5
+            received = [(await slow.get(timeout=1)).data for _ in range(6)]
+            assert received == [b"%d" % i for i in range(6)]
+            await wait_for_pending(fast, 6)
+            assert fast.pending == 6
+            assert slow.dropped == 0
+
+    async def test_invalid_policy(self, r):
+        with pytest.raises(PubSubError):
+            PubSubMultiplexer(r, overflow="ignore")
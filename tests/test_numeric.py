@@ -0,0 +1,78 @@
+import array
+import math
+
+import pytest
+
+import aioredis
+from aioredis.numeric import (
+    NUMPY_AVAILABLE,
+    hmget_numbers,
+    lrange_numbers,
+    mget_numbers,
+    parse_numbers,
+    zrange_with_scores,
+    zrangebyscore_with_scores,
+)
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestParseNumbers:
+    def test_floats_and_integers(self):
+        assert parse_numbers([b"1.5", b"-2", b"inf"]) == array.array(
+            "d", [1.5, -2.0, math.inf]
+        )
+        assert parse_numbers([b"1", 2, b"-3"], "q") == array.array("q", [1, 2, -3])
+
+    def test_missing_values(self):
+        parsed = parse_numbers([b"1", None])
+        assert parsed[0] == 1.0 and math.isnan(parsed[1])
+        assert parse_numbers([None, b"2"], "q", missing=0) == array.array("q", [0, 2])
+        with pytest.raises(aioredis.DataError):
+            parse_numbers([None], "q")
+
+    def test_invalid_typecode(self):
+        with pytest.raises(aioredis.DataError):
+            parse_numbers([b"1"], "u")
+
+    @pytest.mark.skipif(not NUMPY_AVAILABLE, reason="needs numpy")
+    def test_numpy(self):
+        parsed = parse_numbers([b"1", b"2.5", None], use_numpy=True)
+        assert parsed.dtype.name == "float64"
+        assert parsed[:2].tolist() == [1.0, 2.5]
+        assert parse_numbers([b"7"], "i", use_numpy=True).dtype.name == "int32"
+
+
+class TestNumericCommands:
+    async def test_zrange_with_scores(self, create_redis):
+        r = await create_redis(decode_responses=True)
+        await r.zadd("z", {"a": 1, "b": 2.5, "c": -3})
+        members, scores = await zrange_with_scores(r, "z", 0, -1)
+        assert members == ["c", "a", "b"]
+        assert scores == array.array("d", [-3, 1, 2.5])
+        members, scores = await zrange_with_scores(r, "z", 0, 0, desc=True)
+        assert (members, list(scores)) == (["b"], [2.5])
+        members, scores = await zrangebyscore_with_scores(r, "z", 0, "+inf", 1, 1)
+        assert (members, list(scores)) == (["b"], [2.5])
+        assert await r.zrange("z", 0, 0, withscores=True) == [("c", -3.0)]
+
+    async def test_zrange_with_scores_bytes(self, r):
+        await r.zadd("z", {"a": 1})
+        assert await zrange_with_scores(r, "z", 0, -1) == (
+            [b"a"],
+            array.array("d", [1]),
+        )
+
+    async def test_mget_and_hmget(self, r):
+        await r.mset({"a": 1, "b": 2})
+        await r.hset("h", mapping={"x": 10, "y": 20})
+        assert await mget_numbers(r, ["a", "missing", "b"], "q", missing=-1) == (
+            array.array("q", [1, -1, 2])
+        )
+        assert await hmget_numbers(r, "h", ["y", "x"], "l") == array.array(
+            "l", [20, 10]
+        )
+
+    async def test_lrange(self, r):
+        await r.rpush("l", 1.5, 2, 3)
+        assert await lrange_numbers(r, "l", 0, -1, "f") == array.array("f", [1.5, 2, 3])
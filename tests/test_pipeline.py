@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 
 import aioredis
@@ -360,3 +362,204 @@ class TestPipeline:
 
             assert pipe == pipe2
             assert response == [True, [0, 0, 15, 15, 14], b"1"]
+
+    async def test_pipeline_callbacks_resolved_when_queued(self, r):
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.set("a", "1").get("a").execute_command("PING")
+            assert len(pipe._callbacks) == 3
+            assert pipe._callbacks[0] == (r.response_callbacks["SET"], True)
+            assert pipe._callbacks[1] is None
+            assert await pipe.execute() == [True, b"1", True]
+            assert pipe._callbacks == []
+
+    @pytest.mark.parametrize("transaction", [True, False])
+    async def test_async_response_callback(self, r, transaction):
+        async def parse_int(response, **options):
+            return int(response)
+
+        r.set_response_callback("GET", parse_int)
+        async with r.pipeline(transaction=transaction) as pipe:
+            pipe.set("a", "1").get("a")
+            assert await pipe.execute() == [True, 1]
+
+    @pytest.mark.parametrize("transaction", [True, False])
+    async def test_lazy_callbacks(self, r, transaction):
+        calls = []
+
+        def parse_int(response, **options):
+            calls.append(response)
+            return int(response)
+
+        async with r.pipeline(transaction=transaction) as pipe:
+            pipe.set("a", "1").incr("a").zadd("z", {"z1": 1}).zscore("z", "z1")
+            pipe.lpush("a", "x")
+            pipe._callbacks[1] = (parse_int, True)
+            result = await pipe.execute(raise_on_error=False, lazy_callbacks=True)
+        assert isinstance(result, aioredis.client.PipelineResults)
+        assert len(result) == 5
+        assert calls == []
+        assert result[1] == 2
+        assert result[1] == 2
+        assert calls == [2]
+        assert result[-2] == 1.0
+        assert isinstance(result[4], aioredis.ResponseError)
+        assert result[:2] == [True, 2]
+        assert result == [True, 2, 1, 1.0, result[4]]
+
+    @pytest.mark.parametrize("chunk_size", [100, 65536])
+    async def test_large_pipeline_overlaps_writes_and_reads(self, r, chunk_size):
+        value = b"x" * 1024
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.WRITE_CHUNK_SIZE = chunk_size
+            for i in range(300):
+                pipe.set(f"k{i}", value)
+                pipe.get(f"k{i}")
+            pipe.lpush("k0", "a")
+            pipe.strlen("k1")
+            result = await pipe.execute(raise_on_error=False)
+        assert result[:600] == [True, value] * 300
+        assert isinstance(result[600], aioredis.ResponseError)
+        assert result[601] == 1024
+
+    @pytest.mark.parametrize("parallel", [2, 3, 8])
+    async def test_parallel_pipeline(self, r, parallel):
+        in_use = set(r.connection_pool._in_use_connections)
+        async with r.pipeline(transaction=False) as pipe:
+            for i in range(10):
+                pipe.set(f"k{i}", i).get(f"k{i}")
+            pipe.lpush("k0", "a").zadd("z", {"z1": 1}).zscore("z", "z1")
+            result = await pipe.execute(raise_on_error=False, parallel=parallel)
+        assert result[:20] == [
+            item for i in range(10) for item in (True, str(i).encode())
+        ]
+        assert isinstance(result[20], aioredis.ResponseError)
+        assert result[21:] == [1, 1.0]
+        assert r.connection_pool._in_use_connections == in_use
+
+    async def test_parallel_pipeline_raises_first_error(self, r):
+        await r.set("a", "1")
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.get("a").get("a").llen("a").llen("a")
+            with pytest.raises(aioredis.ResponseError) as ex:
+                await pipe.execute(parallel=2)
+        assert str(ex.value).startswith("Command # 3 (LLEN a) of pipeline")
+
+    async def test_parallel_pipeline_slice_failure(self, r):
+        await r.set("a", "1")
+        async with r.pipeline(transaction=False) as pipe:
+            pipeline_replies = pipe._pipeline_replies
+
+            async def fail_after_sending(connection, commands, callbacks):
+                if connection is pipe.connection:
+                    return await pipeline_replies(connection, commands, callbacks)
+                await connection.send_packed_command(
+                    connection.pack_commands([args for args, _ in commands])
+                )
+                raise RuntimeError("slice failed")
+
+            pipe._pipeline_replies = fail_after_sending
+            pipe.get("a").get("a")
+            with pytest.raises(RuntimeError):
+                await pipe.execute(parallel=2)
+        # the failed slice's reply was never read, so its connection was closed
+        pool = r.connection_pool
+        assert not all(c.is_connected for c in pool._available_connections)
+        assert await r.get("a") == b"1"
+
+    async def test_parallel_pipeline_is_capped_by_pool_size(self, request):
+        url = request.config.getoption("--redis-url")
+        pool = aioredis.BlockingConnectionPool.from_url(
+            url, max_connections=2, timeout=1
+        )
+        r = aioredis.Redis(connection_pool=pool)
+        async with r.pipeline(transaction=False) as pipe:
+            for i in range(8):
+                pipe.echo(i)
+            assert await pipe.execute(parallel=8) == [str(i).encode() for i in range(8)]
+        await pool.disconnect()
+
+    async def test_parallel_requires_non_transactional_pipeline(self, r):
+        async with r.pipeline() as pipe:
+            pipe.get("a")
+            with pytest.raises(aioredis.DataError):
+                await pipe.execute(parallel=2)
+        async with r.pipeline(transaction=False) as pipe:
+            with pytest.raises(aioredis.DataError):
+                await pipe.get("a").execute(parallel=0)
+
+
+class TestPipelineStream:
+    async def test_stream(self, r):
+        commands = [("SET", f"k{i}", i) for i in range(50)]
+        commands += [("GET", f"k{i}") for i in range(50)]
+        pipe = r.pipeline(transaction=False)
+        results = [result async for result in pipe.stream(commands, window=8)]
+        assert results == [True] * 50 + [str(i).encode() for i in range(50)]
+
+    async def test_stream_async_iterable(self, r):
+        async def commands():
+            for i in range(20):
+                yield ("INCR", "counter")
+
+        pipe = r.pipeline()
+        results = [result async for result in pipe.stream(commands(), window=3)]
+        assert results == list(range(1, 21))
+
+    async def test_stream_bounds_in_flight_commands(self, r):
+        pulled = []
+
+        def commands():
+            for i in range(100):
+                pulled.append(i)
+                yield ("PING",)
+
+        pipe = r.pipeline()
+        received = 0
+        async for _ in pipe.stream(commands(), window=10):
+            received += 1
+            assert len(pulled) - received <= 10
+        assert received == 100
+
+    async def test_stream_errors(self, r):
+        await r.set("a", "1")
+        commands = [("LLEN", "a"), ("GET", "a")]
+        pipe = r.pipeline()
+        results = [
+            result async for result in pipe.stream(commands, raise_on_error=False)
+        ]
+        assert isinstance(results[0], aioredis.ResponseError)
+        assert results[1] == b"1"
+
+        with pytest.raises(aioredis.ResponseError) as ex:
+            async for _ in pipe.stream(commands):
+                pass
+        assert str(ex.value).startswith("Command # 1 (LLEN a) of pipeline")
+
+    async def test_stream_passes_options_to_callbacks(self, r):
+        await r.geoadd("barcelona", 2.1909389952632, 41.433791470673, "place1")
+        builder = r.pipeline(transaction=False)
+        builder.georadius("barcelona", 2.191, 41.433, 1000, withdist=True)
+        builder.execute_command("GET", "missing", decode=True)
+        pipe = r.pipeline(transaction=False)
+        results = [result async for result in pipe.stream(builder.command_stack)]
+        assert results == [[[b"place1", 88.0506]], None]
+
+    async def test_stream_rejects_none(self, r):
+        pipe = r.pipeline(transaction=False)
+        with pytest.raises(aioredis.DataError):
+            async for _ in pipe.stream([("PING",), None, ("PING",)]):
+                pass
+
+    async def test_stream_closed_early(self, r):
+        pipe = r.pipeline()
+        stream = pipe.stream([("PING",)] * 100, window=50)
+        assert await stream.__anext__() is True
+        await stream.aclose()
+        # the connection was dropped rather than returned with unread replies
+        async for result in pipe.stream([("ECHO", "x")]):
+            assert result == b"x"
+
+    async def test_stream_invalid_window(self, r):
+        with pytest.raises(aioredis.DataError):
+            async for _ in r.pipeline().stream([("PING",)], window=0):
+                pass
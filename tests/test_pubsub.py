@@ -1,10 +1,12 @@
 import asyncio
+import functools
 import threading
 import time
 
 import pytest
 
 import aioredis
+from aioredis.client import AsyncHandler, PubSubMessage
 from aioredis.exceptions import ConnectionError
 
 from .compat import mock
@@ -554,6 +556,273 @@ class TestPubSubTimeouts:
         assert await p.get_message(timeout=0.01) is None
 
 
+class TestPubSubBatches:
+    async def test_get_messages_drains_buffered_messages(self, r):
+        p = r.pubsub(ignore_subscribe_messages=True)
+        await p.subscribe("foo")
+        assert await p.get_messages(timeout=1) == []
+        for i in range(10):
+            await r.publish("foo", i)
+        messages = await p.get_messages(timeout=1)
+        while len(messages) < 10:
+            messages += await p.get_messages(timeout=1)
+        assert [m["data"] for m in messages] == [b"%d" % i for i in range(10)]
+        assert await p.get_messages(timeout=0.01) == []
+
+    async def test_get_messages_limits(self, r):
+        p = r.pubsub(ignore_subscribe_messages=True)
+        await p.subscribe("foo")
+        pipe = r.pipeline(transaction=False)
+        for _ in range(10):
+            pipe.publish("foo", "x" * 10)
+        await pipe.execute()
+        assert len(await p.get_messages(max_messages=3, timeout=1)) == 3
+        assert len(await p.get_messages(max_bytes=25, timeout=1)) <= 3
+
+    async def test_listen_batches(self, r):
+        p = r.pubsub()
+        await p.subscribe("foo")
+        await r.publish("foo", "hello")
+        received = []
+        async for batch in p.listen_batches():
+            received += batch
+            if any(m["type"] == "message" for m in received):
+                break
+        assert received[0] == make_message("subscribe", "foo", 1)
+        assert received[-1] == make_message("message", "foo", "hello")
+
+
+class TestPubSubMessageFormats:
+    async def test_compact_messages(self, r):
+        p = r.pubsub(message_format="compact")
+        await p.subscribe("foo")
+        assert await wait_for_message(p) == PubSubMessage("subscribe", None, b"foo", 1)
+        await r.publish("foo", "hello")
+        message = await wait_for_message(p)
+        assert isinstance(message, PubSubMessage)
+        assert message.type == "message"
+        assert message.channel == b"foo"
+        assert message.data == b"hello"
+
+    async def test_raw_messages(self, r):
+        p = r.pubsub(message_format="raw")
+        await p.psubscribe("f*")
+        assert await wait_for_message(p) == [b"psubscribe", b"f*", 1]
+        await r.publish("foo", "hello")
+        assert await wait_for_message(p) == [b"pmessage", b"f*", b"foo", b"hello"]
+        await p.punsubscribe("f*")
+        assert await wait_for_message(p) == [b"punsubscribe", b"f*", 0]
+        assert not p.subscribed
+
+    async def test_handlers_receive_configured_format(self, r):
+        received = []
+        p = r.pubsub(message_format="compact", ignore_subscribe_messages=True)
+        await p.subscribe(foo=received.append)
+        await wait_for_message(p)
+        await r.publish("foo", "hello")
+        assert await wait_for_message(p) is None
+        assert received == [PubSubMessage("message", None, b"foo", b"hello")]
+
+    async def test_invalid_format(self, r):
+        with pytest.raises(aioredis.DataError):
+            r.pubsub(message_format="xml")
+
+
+class TestPubSubAsyncHandlers:
+    async def test_async_handler_is_awaited(self, r):
+        received = []
+
+        async def handler(message):
+            await asyncio.sleep(0)
+            received.append(message["data"])
+
+        p = r.pubsub(ignore_subscribe_messages=True)
+        await p.subscribe(foo=handler)
+        assert isinstance(p.channels[b"foo"], AsyncHandler)
+        await wait_for_message(p)
+        await r.publish("foo", "hello")
+        assert await wait_for_message(p) is None
+        await p.join_handlers()
+        assert received == [b"hello"]
+        await p.close()
+
+    async def test_async_callables_are_awaited(self, r):
+        received = []
+
+        async def handler(prefix, message):
+            await asyncio.sleep(0)
+            received.append(prefix + message["data"])
+
+        class Handler:
+            async def __call__(self, message):
+                await handler(b"call:", message)
+
+        calls = []
+
+        def returns_coroutine(message):
+            calls.append(message["data"])
+            return handler(b"plain:", message)
+
+        p = r.pubsub(ignore_subscribe_messages=True)
+        await p.subscribe(
+            foo=functools.partial(handler, b"partial:"),
+            bar=Handler(),
+            baz=returns_coroutine,
+        )
+        assert isinstance(p.channels[b"foo"], AsyncHandler)
+        assert isinstance(p.channels[b"bar"], AsyncHandler)
+        await wait_for_message(p)
+        for channel in ("foo", "bar", "baz", "baz"):
+            await r.publish(channel, "x")
+            assert await wait_for_message(p) is None
+        # a handler found to return coroutines is switched to a worker
+        assert isinstance(p.channels[b"baz"], AsyncHandler)
+        await p.join_handlers()
+        assert sorted(received) == [b"call:x", b"partial:x", b"plain:x", b"plain:x"]
+        # the first message's coroutine was awaited, not made a second time
+        assert calls == [b"x", b"x"]
+        await p.close()
+
+    async def test_concurrent_dispatch(self, r):
+        calls = running = peak = 0
+
+        async def handle(message):
+            nonlocal calls, running, peak
+            calls += 1
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        handler = AsyncHandler(handle, concurrency=4)
+        p = r.pubsub(ignore_subscribe_messages=True)
+        await p.subscribe(foo=handler)
+        for i in range(8):
+            await r.publish("foo", i)
+        while calls + handler.pending < 8:
+            await p.get_messages(timeout=0.1)
+        await p.join_handlers()
+        assert calls == 8
+        assert peak == 4
+        await p.close()
+
+    async def test_ordered_per_channel(self, r):
+        received = []
+
+        async def handler(message):
+            await asyncio.sleep(0.001 * (int(message["data"]) % 3))
+            received.append((message["channel"], message["data"]))
+
+        p = r.pubsub(ignore_subscribe_messages=True)
+        await p.psubscribe(**{"ch*": AsyncHandler(handler, 4, ordered=True)})
+        expected = []
+        for i in range(20):
+            channel = b"ch%d" % (i % 3)
+            expected.append((channel, b"%d" % i))
+            await r.publish(channel, i)
+        while len(expected) > len(received) + p.patterns[b"ch*"].pending:
+            await p.get_messages(timeout=0.1)
+        await p.join_handlers()
+        for channel in (b"ch0", b"ch1", b"ch2"):
+            assert [m for m in received if m[0] == channel] == [
+                m for m in expected if m[0] == channel
+            ]
+        await p.close()
+
+    async def test_backpressure(self, r):
+        release = asyncio.Event()
+
+        async def handler(message):
+            await release.wait()
+
+        handler = AsyncHandler(handler, max_pending=2)
+        p = r.pubsub(ignore_subscribe_messages=True)
+        await p.subscribe(foo=handler)
+        await wait_for_message(p)
+        for i in range(5):
+            await r.publish("foo", i)
+        while handler.pending < 3:
+            await p.get_messages(timeout=0.1)
+        # the handler's queue is full, so reading blocks until it has room
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(p.get_message(timeout=0.1), 0.2)
+        release.set()
+        await p.join_handlers()
+        assert handler.pending == 0
+        await p.close()
+
+    async def test_handler_errors_are_logged(self, r, caplog):
+        async def handler(message):
+            raise ValueError("boom")
+
+        p = r.pubsub(ignore_subscribe_messages=True)
+        await p.subscribe(foo=handler)
+        await wait_for_message(p)
+        await r.publish("foo", "hello")
+        await wait_for_message(p)
+        await p.join_handlers()
+        assert "Error in pubsub message handler" in caplog.text
+        await p.close()
+
+
+class TestPubSubWorker:
+    async def test_run_in_task(self, r):
+        received = []
+        p = r.pubsub()
+        await p.subscribe(foo=received.append)
+        worker = p.run_in_task(poll_timeout=0.01)
+        assert worker.is_running
+        await r.publish("foo", "hello")
+        while not received:
+            await asyncio.sleep(0.01)
+        assert received[0]["data"] == b"hello"
+        worker.stop()
+        await worker.join()
+        assert not worker.is_running
+        assert p.connection is None
+
+    async def test_run_in_task_requires_handlers(self, r):
+        p = r.pubsub()
+        await p.subscribe("foo")
+        with pytest.raises(aioredis.PubSubError):
+            p.run_in_task()
+        await p.close()
+
+    @pytest.mark.parametrize("use_async", [False, True])
+    async def test_exception_handler(self, r, use_async):
+        errors = []
+
+        def exception_handler(e, pubsub, worker):
+            errors.append(e)
+            worker.stop()
+
+        async def async_exception_handler(e, pubsub, worker):
+            exception_handler(e, pubsub, worker)
+
+        handler = async_exception_handler if use_async else exception_handler
+        p = r.pubsub()
+        await p.subscribe(foo=lambda m: m)
+        with mock.patch.object(p, "get_message", side_effect=Exception("error")):
+            worker = p.run_in_task(exception_handler=handler)
+            await worker.join()
+        assert [str(e) for e in errors] == ["error"]
+        assert p.connection is None
+
+    async def test_exception_ends_task_without_handler(self, r):
+        p = r.pubsub()
+        await p.subscribe(foo=lambda m: m)
+        with mock.patch.object(p, "get_message", side_effect=ValueError("error")):
+            worker = p.run_in_task()
+            with pytest.raises(ValueError):
+                await worker.join()
+
+    async def test_run_in_thread_is_deprecated(self, r):
+        p = r.pubsub()
+        with pytest.warns(DeprecationWarning):
+            with mock.patch.object(aioredis.client.PubSubWorkerThread, "start"):
+                p.run_in_thread()
+
+
 @pytest.mark.skip(
     "TODO: This is pretty broken " "and if run causes the test session to never end..."
 )
@@ -0,0 +1,69 @@
+import pytest
+
+import aioredis
+from aioredis.schema import HashSchema
+
+pytestmark = pytest.mark.asyncio
+
+User = HashSchema(
+    "User",
+    {"name": str, "age": int, "score": float, "active": bool, "avatar": bytes},
+    defaults={"score": 0.0},
+)
+
+
+class TestHashSchema:
+    def test_load(self):
+        user = User.load([b"ann", b"30", None, b"1", b"\xff"])
+        assert user == User.record("ann", 30, 0.0, True, b"\xff")
+        assert user.age == 30
+
+    def test_from_mapping(self):
+        data = {b"name": b"bob", b"active": b"0", b"unknown": b"x"}
+        assert User.from_mapping(data) == ("bob", None, 0.0, False, None)
+
+    def test_dump(self):
+        class Person:
+            def __init__(self, name, active):
+                self.name = name
+                self.active = active
+
+        expected = [b"name", "ann", b"active", b"1"]
+        assert User.dump(User.record("ann", None, None, True, None)) == expected
+        assert User.dump({"active": True, "name": "ann", "other": 1}) == expected
+        assert User.dump(Person("ann", True)) == expected
+
+    def test_custom_type(self):
+        schema = HashSchema("Point", {"xy": lambda value: value.split(b",")})
+        assert schema.load([b"1,2"]).xy == [b"1", b"2"]
+
+    def test_invalid_schema(self):
+        with pytest.raises(aioredis.DataError):
+            HashSchema("Empty", {})
+        with pytest.raises(aioredis.DataError):
+            HashSchema("Bad", {"a": 1})
+        with pytest.raises(aioredis.DataError):
+            HashSchema("Bad", {"a": int}, defaults={"b": 0})
+
+
+class TestHashSchemaCommands:
+    async def test_get_and_set(self, create_redis):
+        r = await create_redis(decode_responses=True)
+        user = User.record("ann", 30, 1.5, True, b"\x00\xff")
+        assert await User.set(r, "user:1", user) == 5
+        assert await User.get(r, "user:1") == user
+        assert await r.hget("user:1", "active") == "1"
+        assert await User.get(r, "user:missing") is None
+        with pytest.raises(aioredis.DataError):
+            await User.set(r, "user:2", {})
+
+    async def test_get_many_and_set_many(self, r):
+        await User.set_many(
+            r, {f"user:{i}": {"name": f"user{i}", "age": i} for i in range(3)}
+        )
+        users = await User.get_many(r, ["user:0", "user:missing", "user:2"])
+        assert users == [
+            User.record("user0", 0, 0.0, None, None),
+            None,
+            User.record("user2", 2, 0.0, None, None),
+        ]
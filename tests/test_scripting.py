@@ -1,6 +1,11 @@
 import pytest
 
 from aioredis import exceptions
+from aioredis.client import Library, parse_function_list
+from aioredis.connection import BaseParser, Connection
+from aioredis.scripts import ScriptRegistry
+
+from .conftest import skip_if_server_version_lt
 
 multiply_script = """
 local value = redis.call('GET', KEYS[1])
@@ -17,6 +22,23 @@ local message = cmsgpack.unpack(ARGV[1])
 local names = message['name']
 return "hello " .. name
 """
+library_code = """#!lua name=mylib
+redis.register_function('echo', function(keys, args) return args[1] end)
+redis.register_function{
+    function_name='get',
+    callback=function(keys, args) return redis.call('GET', keys[1]) end,
+    flags={'no-writes'}
+}
+"""
+
+
+async def has_library(r, name):
+    """Whether the pool's registry knows the server has the library ``name``"""
+    conn = await r.connection_pool.get_connection("_")
+    try:
+        return r.connection_pool.scripts.has_library(name, conn)
+    finally:
+        await r.connection_pool.release(conn)
 
 
 class TestScripting:
@@ -128,3 +150,307 @@ class TestScripting:
         with pytest.raises(exceptions.ResponseError) as excinfo:
             await pipe.execute()
         assert excinfo.type == exceptions.ResponseError
+
+    @pytest.mark.asyncio(forbid_global_loop=True)
+    @pytest.mark.parametrize("transaction", [True, False])
+    async def test_pipeline_skips_script_exists_for_known_scripts(self, r, transaction):
+        await r.set("a", 2)
+        multiply = r.register_script(multiply_script)
+        pipe = r.pipeline(transaction=transaction)
+        await multiply(keys=["a"], args=[3], client=pipe)
+        assert await pipe.execute() == [6]
+        conn = await r.connection_pool.get_connection("_")
+        assert r.connection_pool.scripts.is_loaded([multiply.sha], conn)
+        await r.connection_pool.release(conn)
+
+        async def no_round_trips(*args, **options):
+            raise AssertionError(f"unexpected {args[0]}")
+
+        pipe = r.pipeline(transaction=transaction)
+        pipe.immediate_execute_command = no_round_trips
+        await multiply(keys=["a"], args=[3], client=pipe)
+        assert await pipe.execute() == [6]
+
+    @pytest.mark.asyncio(forbid_global_loop=True)
+    async def test_first_scripted_pipeline_preloads_registered_scripts(self, r):
+        await r.set("a", 2)
+        multiply = r.register_script(multiply_script)
+        msgpack_hello = r.register_script(msgpack_hello_script)
+        # neither plain commands nor pubsub connections load scripts
+        async with r.pubsub() as p:
+            await p.subscribe("foo")
+            assert p.connection.scripts is None
+        assert await r.script_exists(multiply.sha, msgpack_hello.sha) == [
+            False,
+            False,
+        ]
+
+        pipe = r.pipeline(transaction=False)
+        await multiply(keys=["a"], args=[3], client=pipe)
+        assert await pipe.execute() == [6]
+        assert await r.script_exists(multiply.sha, msgpack_hello.sha) == [
+            True,
+            True,
+        ]
+
+    @pytest.mark.asyncio(forbid_global_loop=True)
+    async def test_reconnects_preload_registered_scripts(self, r):
+        await r.set("a", 2)
+        multiply = r.register_script(multiply_script)
+        pipe = r.pipeline()
+        await multiply(keys=["a"], args=[3], client=pipe)
+        assert await pipe.execute() == [6]
+        msgpack_hello = r.register_script(msgpack_hello_script)
+        shas = [multiply.sha, msgpack_hello.sha]
+
+        # as after a server restart
+        await r.execute_command("SCRIPT FLUSH")
+        conn = await r.connection_pool.get_connection("_")
+        await conn.disconnect()
+        await conn.connect()
+        assert r.connection_pool.scripts.is_loaded(shas, conn)
+        await r.connection_pool.release(conn)
+        assert await r.script_exists(*shas) == [True, True]
+
+    @pytest.mark.asyncio(forbid_global_loop=True)
+    @pytest.mark.parametrize("transaction", [True, False])
+    async def test_pipeline_raises_for_lost_scripts(self, r, transaction):
+        await r.set("a", 2)
+        multiply = r.register_script(multiply_script)
+        pipe = r.pipeline(transaction=transaction)
+        await multiply(keys=["a"], args=[3], client=pipe)
+        assert await pipe.execute() == [6]
+
+        # a flush the registry doesn't know about, e.g. from another client
+        await r.execute_command("SCRIPT FLUSH")
+        pipe = r.pipeline(transaction=transaction)
+        pipe.incr("a")
+        await multiply(keys=["a"], args=[3], client=pipe)
+        pipe.get("a")
+        with pytest.raises(exceptions.NoScriptError):
+            await pipe.execute()
+        # the commands around the failed call have run, and aren't rerun
+        assert await r.get("a") == b"3"
+
+        # the next pipeline loads the scripts again
+        pipe = r.pipeline(transaction=transaction)
+        await multiply(keys=["a"], args=[3], client=pipe)
+        results = await pipe.execute(raise_on_error=False, lazy_callbacks=True)
+        assert list(results) == [9]
+        assert await r.script_exists(multiply.sha) == [True]
+
+    @pytest.mark.asyncio(forbid_global_loop=True)
+    async def test_script_flush_invalidates_the_registry(self, r):
+        await r.set("a", 2)
+        multiply = r.register_script(multiply_script)
+        registry = r.connection_pool.scripts
+        conn = await r.connection_pool.get_connection("_")
+        pipe = r.pipeline(transaction=False)
+        await multiply(keys=["a"], args=[3], client=pipe)
+        assert await pipe.execute() == [6]
+        assert registry.is_loaded([multiply.sha], conn)
+
+        pipe.script_flush()
+        # not before the flush has run
+        assert registry.is_loaded([multiply.sha], conn)
+        assert await pipe.execute() == [True]
+        assert not registry.is_loaded([multiply.sha], conn)
+
+        assert await multiply(keys=["a"], args=[3]) == 6
+        registry.mark_loaded([multiply.sha], conn)
+        await r.script_flush()
+        assert not registry.is_loaded([multiply.sha], conn)
+
+        # NOSCRIPT outside of a pipeline forgets every server
+        registry.mark_loaded([multiply.sha], conn)
+        await r.execute_command("SCRIPT FLUSH")
+        assert await multiply(keys=["a"], args=[3]) == 6
+        assert not registry.is_loaded([multiply.sha], conn)
+        await r.connection_pool.release(conn)
+
+
+class TestLibrary:
+    def test_library_name(self, r):
+        assert Library(r, library_code).name == "mylib"
+        assert Library(r, b"#!lua name=other\nreturn 1").name == "other"
+        with pytest.raises(exceptions.DataError):
+            Library(r, "redis.register_function('f', function() end)")
+
+    def test_function_not_found_error(self):
+        error = BaseParser(socket_read_size=65536).parse_error("ERR Function not found")
+        assert isinstance(error, exceptions.NoFunctionError)
+
+    def test_parse_function_list(self):
+        response = [
+            [
+                b"library_name",
+                b"mylib",
+                b"engine",
+                b"LUA",
+                b"functions",
+                [[b"name", b"echo", b"description", None, b"flags", []]],
+            ]
+        ]
+        assert parse_function_list(response) == [
+            {
+                "library_name": b"mylib",
+                "engine": b"LUA",
+                "functions": [{"name": b"echo", "description": None, "flags": []}],
+            }
+        ]
+
+    def test_registry_tracks_libraries_per_server(self):
+        registry = ScriptRegistry()
+        first, second = Connection(port=6379), Connection(port=6380)
+        registry.mark_library("mylib", first)
+        assert registry.has_library("mylib", first)
+        assert not registry.has_library("mylib", second)
+        registry.mark_library("mylib", second)
+        registry.forget_libraries(connection=first)
+        assert not registry.has_library("mylib", first)
+        assert registry.has_library("mylib", second)
+        registry.forget_libraries("mylib")
+        assert not registry.has_library("mylib", second)
+
+    @pytest.mark.asyncio(forbid_global_loop=True)
+    async def test_pipeline_matches_library_names_exactly(self, r):
+        library = Library(r, library_code)
+        pipe = r.pipeline()
+        pipe.libraries.add(library)
+        pipe.connection = await r.connection_pool.get_connection("_")
+        sent = []
+
+        async def immediate(*args, **options):
+            sent.append(args[0])
+            if args[0] == "FUNCTION LIST":
+                # LIBRARYNAME is a case-insensitive glob pattern
+                return [{"library_name": b"MYLIB", "engine": b"LUA", "functions": []}]
+            return b"mylib"
+
+        pipe.immediate_execute_command = immediate
+        await pipe.load_libraries()
+        assert sent == ["FUNCTION LIST", "FUNCTION LOAD"]
+        assert r.connection_pool.scripts.has_library("mylib", pipe.connection)
+        await pipe.reset()
+
+
+@skip_if_server_version_lt("7.0.0")
+class TestFunctions:
+    @pytest.fixture
+    async def r(self, create_redis):
+        redis = await create_redis()
+        await redis.function_flush()
+        yield redis
+        await redis.function_flush()
+
+    @pytest.mark.asyncio(forbid_global_loop=True)
+    async def test_function_load_list_delete(self, r):
+        assert await r.function_load(library_code) == "mylib"
+        with pytest.raises(exceptions.ResponseError):
+            await r.function_load(library_code)
+        assert await r.function_load(library_code, replace=True) == "mylib"
+        [library] = await r.function_list()
+        assert library["library_name"] == b"mylib"
+        assert {f["name"] for f in library["functions"]} == {b"echo", b"get"}
+        [library] = await r.function_list(library="my*", withcode=True)
+        assert library["library_code"] == library_code.encode()
+        assert await r.function_list(library="other") == []
+        assert await r.function_delete("mylib") is True
+        assert await r.function_list() == []
+
+    @pytest.mark.asyncio(forbid_global_loop=True)
+    async def test_fcall(self, r):
+        await r.function_load(library_code)
+        await r.set("a", 1)
+        assert await r.fcall("echo", 0, "hello") == b"hello"
+        assert await r.fcall_ro("get", 1, "a") == b"1"
+        with pytest.raises(exceptions.NoFunctionError):
+            await r.fcall("missing", 0)
+
+    @pytest.mark.asyncio(forbid_global_loop=True)
+    async def test_function_dump_restore(self, r):
+        await r.function_load(library_code)
+        payload = await r.function_dump()
+        assert isinstance(payload, bytes)
+        await r.function_flush()
+        assert await r.function_restore(payload) is True
+        assert await r.function_restore(payload, policy="REPLACE") is True
+        [library] = await r.function_list()
+        assert library["library_name"] == b"mylib"
+        with pytest.raises(exceptions.DataError):
+            await r.function_restore(payload, policy="MERGE")
+
+    @pytest.mark.asyncio(forbid_global_loop=True)
+    async def test_library_object(self, r):
+        library = r.register_library(library_code)
+        assert await library.fcall("echo", args=["x"]) == b"x"
+        await r.set("a", 2)
+        assert await library.fcall_ro("get", keys=["a"]) == b"2"
+
+        # the library is reloaded on servers that lost it
+        other = r.register_library(library_code.replace("mylib", "otherlib"))
+        await other.load()
+        await r.execute_command("FUNCTION FLUSH")
+        assert await library.fcall("echo", args=["y"]) == b"y"
+        # and libraries that were lost along with it are forgotten
+        assert not await has_library(r, "otherlib")
+
+    @pytest.mark.asyncio(forbid_global_loop=True)
+    async def test_library_object_in_pipeline(self, r):
+        library = r.register_library(library_code)
+        pipe = r.pipeline()
+        await library.fcall("echo", args=["x"], client=pipe)
+        pipe.set("a", 1)
+        await library.fcall_ro("get", keys=["a"], client=pipe)
+        assert await pipe.execute() == [b"x", True, b"1"]
+        assert await has_library(r, "mylib")
+
+        await r.function_flush()
+        assert not await has_library(r, "mylib")
+        await library.fcall("echo", args=["z"], client=pipe)
+        assert await pipe.execute() == [b"z"]
+
+    @pytest.mark.asyncio(forbid_global_loop=True)
+    @pytest.mark.parametrize("transaction", [True, False])
+    async def test_pipeline_function_flush(self, r, transaction):
+        library = r.register_library(library_code)
+        pipe = r.pipeline(transaction=transaction)
+        await library.fcall("echo", args=["x"], client=pipe)
+        assert await pipe.execute() == [b"x"]
+        assert await has_library(r, "mylib")
+        pipe.function_flush()
+        # not before the flush has run
+        assert await has_library(r, "mylib")
+        assert await pipe.execute() == [True]
+        assert not await has_library(r, "mylib")
+
+        await library.fcall("echo", args=["x"], client=pipe)
+        assert await pipe.execute() == [b"x"]
+        pipe.function_delete("mylib")
+        assert await has_library(r, "mylib")
+        assert await pipe.execute() == [True]
+        assert not await has_library(r, "mylib")
+
+    @pytest.mark.asyncio(forbid_global_loop=True)
+    @pytest.mark.parametrize("transaction", [True, False])
+    async def test_pipeline_raises_for_lost_libraries(self, r, transaction):
+        library = r.register_library(library_code)
+        pipe = r.pipeline(transaction=transaction)
+        await library.fcall("echo", args=["x"], client=pipe)
+        assert await pipe.execute() == [b"x"]
+        assert await has_library(r, "mylib")
+
+        # a flush the registry doesn't know about, e.g. from another client
+        await r.execute_command("FUNCTION FLUSH")
+        pipe.set("a", 1)
+        await library.fcall("echo", args=["y"], client=pipe)
+        with pytest.raises(exceptions.NoFunctionError):
+            await pipe.execute()
+        # the commands around the failed call have run, and aren't rerun
+        assert await r.get("a") == b"1"
+        assert not await has_library(r, "mylib")
+
+        # the next pipeline loads the library again
+        await library.fcall("echo", args=["z"], client=pipe)
+        await library.fcall_ro("get", keys=["a"], client=pipe)
+        assert await pipe.execute() == [b"z", b"1"]
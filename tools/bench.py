@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for aioredis hot paths.
+
+Covers reply parsing (PythonParser and, when installed, HiredisParser),
+command packing, pool checkout, pipeline throughput and pubsub fan-in.
+Parser and packer benchmarks run fully in-process; the others need a Redis
+server reachable at ``--redis-url``, or run against the in-process fake
+server from ``tests/fake_server.py`` with ``--fake-server``, which isolates
+the client's own cost per command.
+
+Results are written as JSON so two runs can be compared::
+
+    $ python tools/bench.py --output before.json
+    $ python tools/bench.py --output after.json --compare before.json
+"""
+
+import argparse
+import asyncio
+import fnmatch
+import json
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import aioredis  # noqa: E402
+from aioredis.connection import (  # noqa: E402
+    HIREDIS_AVAILABLE,
+    Connection,
+    Encoder,
+    HiredisParser,
+    PythonParser,
+)
+from aioredis.keyspace import analyze_keyspace  # noqa: E402
+from aioredis.numeric import zrange_with_scores  # noqa: E402
+from aioredis.schema import HashSchema  # noqa: E402
+from tests.fake_server import FakeRedisServer, encode_reply  # noqa: E402
+
+BENCHMARKS = []
+
+
+def benchmark(name, **params):
+    """Register ``func(ctx, **params) -> number of operations`` as a benchmark"""
+
+    def decorator(func):
+        BENCHMARKS.append((name, params, func))
+        return func
+
+    return decorator
+
+
+def nested(depth, width):
+    if depth == 0:
+        return b"leaf"
+    return [nested(depth - 1, width) for _ in range(width)]
+
+
+REPLIES = {
+    "small": encode_reply(b"x" * 16),
+    "large": encode_reply(b"x" * 1024 * 1024),
+    "array": encode_reply([b"member:%d" % i for i in range(1000)]),
+    "deep": encode_reply(nested(4, 8)),
+}
+
+PARSERS = {"python": PythonParser}
+if HIREDIS_AVAILABLE:
+    PARSERS["hiredis"] = HiredisParser
+
+
+async def parse_replies(ctx, parser, reply, count):
+    reader = asyncio.StreamReader()
+    reader.feed_data(REPLIES[reply] * count)
+    reader.feed_eof()
+    parser = PARSERS[parser](socket_read_size=65536)
+    parser.on_connect(
+        SimpleNamespace(
+            _reader=reader,
+            socket_timeout=None,
+            encoder=Encoder("utf-8", "strict", False),
+        )
+    )
+    for _ in range(count):
+        await parser.read_response()
+    parser.on_disconnect()
+    return count
+
+
+for _parser in PARSERS:
+    for _reply, _count in (("small", 20000), ("large", 50), ("array", 200)):
+        benchmark("parser", parser=_parser, reply=_reply, count=_count)(parse_replies)
+    benchmark("parser", parser=_parser, reply="deep", count=200)(parse_replies)
+
+
+PACK_ARGS = {
+    "get": ("GET", "some:key"),
+    "set-large": ("SET", "some:key", b"x" * 100000),
+    "zadd-1k": ("ZADD", "zset") + tuple(v for i in range(1000) for v in (i * 0.5, i)),
+    "mset-100": ("MSET",) + tuple(v for i in range(100) for v in (f"k{i}", i)),
+}
+
+
+@benchmark("pack_command", command="get", count=50000)
+@benchmark("pack_command", command="set-large", count=2000)
+@benchmark("pack_command", command="zadd-1k", count=200)
+@benchmark("pack_command", command="mset-100", count=2000)
+async def pack_command(ctx, command, count):
+    connection = Connection()
+    args = PACK_ARGS[command]
+    for _ in range(count):
+        connection.pack_command(*args)
+    return count
+
+
+@benchmark("handle_message", message_format="dict", count=200000)
+@benchmark("handle_message", message_format="compact", count=200000)
+@benchmark("handle_message", message_format="raw", count=200000)
+async def handle_message(ctx, message_format, count):
+    pool = aioredis.ConnectionPool()
+    pubsub = aioredis.client.PubSub(pool, message_format=message_format)
+    handle = pubsub.handle_message
+    response = [b"message", b"channel", b"payload"]
+    for _ in range(count):
+        handle(response)
+    return count
+
+
+@benchmark("pool_checkout", concurrency=1, count=5000)
+@benchmark("pool_checkout", concurrency=10, count=5000)
+@benchmark("pool_checkout", concurrency=100, count=5000)
+async def pool_checkout(ctx, concurrency, count):
+    pool = aioredis.ConnectionPool.from_url(ctx.redis_url)
+
+    async def worker(n):
+        for _ in range(n):
+            connection = await pool.get_connection("_")
+            await pool.release(connection)
+
+    try:
+        await asyncio.gather(
+            *(worker(count // concurrency) for _ in range(concurrency))
+        )
+    finally:
+        await pool.disconnect()
+    return count // concurrency * concurrency
+
+
+@benchmark("command", concurrency=1, count=5000)
+@benchmark("command", concurrency=50, count=20000)
+async def command(ctx, concurrency, count):
+    client = aioredis.Redis.from_url(ctx.redis_url)
+
+    async def worker(n):
+        for _ in range(n):
+            await client.get("bench:key")
+
+    try:
+        await asyncio.gather(
+            *(worker(count // concurrency) for _ in range(concurrency))
+        )
+    finally:
+        await client.connection_pool.disconnect()
+    return count // concurrency * concurrency
+
+
+@benchmark("pipeline", size=10, count=500)
+@benchmark("pipeline", size=100, count=100)
+@benchmark("pipeline", size=1000, count=20)
+@benchmark("pipeline", size=10000, count=3)
+@benchmark("pipeline", size=10000, count=3, lazy=True)
+@benchmark("pipeline", size=1000, count=20, value_size=16384)
+@benchmark("pipeline", size=10000, count=3, parallel=4)
+async def pipeline(ctx, size, count, lazy=False, value_size=0, parallel=1):
+    client = aioredis.Redis.from_url(ctx.redis_url)
+    value = b"x" * value_size
+    try:
+        for _ in range(count):
+            pipe = client.pipeline(transaction=False)
+            for i in range(size):
+                pipe.set(f"bench:pipe:{i}", value or i)
+            await pipe.execute(lazy_callbacks=lazy, parallel=parallel)
+    finally:
+        await client.connection_pool.disconnect()
+    return size * count
+
+
+@benchmark("scripted_pipeline", size=10, count=1000)
+async def scripted_pipeline(ctx, size, count):
+    client = aioredis.Redis.from_url(ctx.redis_url)
+    incr = client.register_script("return redis.call('INCR', KEYS[1])")
+    try:
+        for _ in range(count):
+            pipe = client.pipeline(transaction=False)
+            for i in range(size):
+                await incr(keys=[f"bench:script:{i}"], client=pipe)
+            await pipe.execute()
+    finally:
+        await client.connection_pool.disconnect()
+    return size * count
+
+
+@benchmark("pipeline_stream", window=100, count=100000)
+@benchmark("pipeline_stream", window=1000, count=100000)
+async def pipeline_stream(ctx, window, count):
+    client = aioredis.Redis.from_url(ctx.redis_url)
+    commands = (("SET", f"bench:pipe:{i}", i) for i in range(count))
+    try:
+        async for _ in client.pipeline().stream(commands, window=window):
+            pass
+    finally:
+        await client.connection_pool.disconnect()
+    return count
+
+
+@benchmark("scan", mode="iter", size=100000, passes=3)
+@benchmark("scan", mode="batches", size=100000, passes=3)
+@benchmark("scan", mode="prefetch", size=100000, passes=3)
+@benchmark("scan", mode="adaptive", size=100000, passes=3)
+async def scan(ctx, mode, size, passes):
+    client = aioredis.Redis.from_url(ctx.redis_url)
+    match = "bench:scan:*"
+    try:
+        for start in range(0, size, 10000):
+            await client.mset(
+                {f"bench:scan:{i}": i for i in range(start, start + 10000)}
+            )
+        for _ in range(passes):
+            # every page of keys is processed with one more round trip
+            if mode == "iter":
+                page = []
+                async for key in client.scan_iter(match=match, count=1000):
+                    page.append(key)
+                    if len(page) == 1000:
+                        await client.exists(*page)
+                        page = []
+                if page:
+                    await client.exists(*page)
+            else:
+                pages = client.scan_batches(
+                    match=match,
+                    count=1000,
+                    prefetch=mode != "batches",
+                    target_latency=0.005 if mode == "adaptive" else None,
+                )
+                async for page in pages:
+                    await client.exists(*page)
+        async for keys in client.scan_batches(match=match, count=1000):
+            await client.delete(*keys)
+    finally:
+        await client.connection_pool.disconnect()
+    return size * passes
+
+
+@benchmark("keyspace", mode="per_key", size=20000)
+@benchmark("keyspace", mode="analyze", size=20000, parallel=1)
+@benchmark("keyspace", mode="analyze", size=20000, parallel=4)
+async def keyspace(ctx, mode, size, parallel=1):
+    client = aioredis.Redis.from_url(ctx.redis_url)
+    match = "bench:keyspace:*"
+    try:
+        for start in range(0, size, 10000):
+            await client.mset(
+                {f"bench:keyspace:{i}": i for i in range(start, start + 10000)}
+            )
+        if mode == "per_key":
+            async for key in client.scan_iter(match=match, count=1000):
+                await client.type(key)
+                await client.pttl(key)
+                await client.memory_usage(key)
+        else:
+            async for _ in analyze_keyspace(
+                client, match=match, count=1000, parallel=parallel
+            ):
+                pass
+        async for keys in client.scan_batches(match=match, count=1000):
+            await client.delete(*keys)
+    finally:
+        await client.connection_pool.disconnect()
+    return size
+
+
+@benchmark("zrange_scores", mode="tuples", size=100000, count=5)
+@benchmark("zrange_scores", mode="array", size=100000, count=5)
+async def zrange_scores(ctx, mode, size, count):
+    client = aioredis.Redis.from_url(ctx.redis_url)
+    try:
+        await client.delete("bench:zset")
+        for start in range(0, size, 10000):
+            await client.zadd(
+                "bench:zset", {f"m{i}": i * 0.5 for i in range(start, start + 10000)}
+            )
+        for _ in range(count):
+            if mode == "array":
+                await zrange_with_scores(client, "bench:zset", 0, -1)
+            else:
+                await client.zrange("bench:zset", 0, -1, withscores=True)
+    finally:
+        await client.connection_pool.disconnect()
+    return size * count
+
+
+@benchmark("info", mode="full", count=2000)
+@benchmark("info", mode="fields", count=2000)
+@benchmark("info", mode="lazy", count=2000)
+async def info(ctx, mode, count):
+    client = aioredis.Redis.from_url(ctx.redis_url)
+    options = {
+        "full": {},
+        "fields": {"fields": {"used_memory", "connected_clients", "cmdstat_*"}},
+        "lazy": {"lazy": True},
+    }[mode]
+    try:
+        for _ in range(count):
+            await client.info("all", **options)
+    finally:
+        await client.connection_pool.disconnect()
+    return count
+
+
+@benchmark("hash_records", mode="dicts", count=10000)
+@benchmark("hash_records", mode="schema", count=10000)
+async def hash_records(ctx, mode, count):
+    client = aioredis.Redis.from_url(ctx.redis_url)
+    schema = HashSchema("Item", {"name": str, "count": int, "price": float})
+    names = [f"bench:item:{i}" for i in range(count)]
+    try:
+        await schema.set_many(
+            client, {name: ("item", i, i * 0.5) for i, name in enumerate(names)}
+        )
+        if mode == "schema":
+            await schema.get_many(client, names)
+        else:
+            async with client.pipeline(transaction=False) as pipe:
+                for name in names:
+                    pipe.hgetall(name)
+                for data in await pipe.execute():
+                    schema.record(
+                        data[b"name"].decode(),
+                        int(data[b"count"]),
+                        float(data[b"price"]),
+                    )
+        await client.delete(*names)
+    finally:
+        await client.connection_pool.disconnect()
+    return count
+
+
+@benchmark("pubsub_fan_in", publishers=1, count=10000, batch=False)
+@benchmark("pubsub_fan_in", publishers=10, count=10000, batch=False)
+@benchmark("pubsub_fan_in", publishers=10, count=10000, batch=True)
+async def pubsub_fan_in(ctx, publishers, count, batch):
+    client = aioredis.Redis.from_url(ctx.redis_url)
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe("bench:channel")
+    per_publisher = count // publishers
+    total = per_publisher * publishers
+
+    async def publish():
+        pipe = client.pipeline(transaction=False)
+        for i in range(per_publisher):
+            pipe.publish("bench:channel", i)
+        await pipe.execute()
+
+    async def consume():
+        received = 0
+        while received < total:
+            if batch:
+                received += len(await pubsub.get_messages(timeout=1.0))
+                continue
+            message = await pubsub.get_message(timeout=1.0)
+            if message is not None:
+                received += 1
+
+    try:
+        await asyncio.gather(consume(), *(publish() for _ in range(publishers)))
+    finally:
+        await pubsub.close()
+        await client.connection_pool.disconnect()
+    return total
+
+
+def result_key(result):
+    params = ",".join(f"{k}={v}" for k, v in sorted(result["params"].items()))
+    return f"{result['name']}[{params}]"
+
+
+async def run_benchmark(ctx, name, params, func):
+    timings = []
+    ops = 0
+    for _ in range(ctx.repeat):
+        started = time.perf_counter()
+        ops = await func(ctx, **params)
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+    return {
+        "name": name,
+        "params": params,
+        "ops": ops,
+        "timings": timings,
+        "best": best,
+        "median": statistics.median(timings),
+        "ops_per_sec": ops / best if best else None,
+    }
+
+
+async def run(ctx):
+    if ctx.fake_server:
+        server = FakeRedisServer(latency=ctx.fake_latency)
+        await server.start()
+        ctx.redis_url = server.url
+        try:
+            return await run_benchmarks(ctx)
+        finally:
+            await server.stop()
+    return await run_benchmarks(ctx)
+
+
+async def run_benchmarks(ctx):
+    results = []
+    for name, params, func in BENCHMARKS:
+        key = result_key({"name": name, "params": params})
+        if ctx.only and not any(fnmatch.fnmatch(key, p) for p in ctx.only):
+            continue
+        try:
+            result = await run_benchmark(ctx, name, params, func)
+        except (OSError, aioredis.ConnectionError, aioredis.ResponseError) as e:
+            # e.g. a command the fake server doesn't implement
+            print(f"{key:<60} skipped: {e}", file=sys.stderr)
+            continue
+        results.append(result)
+        line = f"{key:<60} {result['ops_per_sec']:>14,.0f} ops/s"
+        baseline = ctx.baseline.get(key)
+        if baseline and baseline.get("ops_per_sec"):
+            line += f"  ({result['ops_per_sec'] / baseline['ops_per_sec']:.2f}x)"
+        print(line)
+    return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--redis-url",
+        default="redis://localhost:6379/9",
+        help="server used by the network benchmarks (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--fake-server",
+        action="store_true",
+        help="run the network benchmarks against an in-process fake server",
+    )
+    parser.add_argument(
+        "--fake-latency",
+        type=float,
+        default=0.0,
+        metavar="SECONDS",
+        help="latency the fake server adds to every batch of replies",
+    )
+    parser.add_argument(
+        "--only",
+        action="append",
+        default=[],
+        metavar="PATTERN",
+        help="only run benchmarks whose key matches this glob, e.g. 'parser*'",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="runs per benchmark (default: 3)"
+    )
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    ctx = parser.parse_args(argv[1:])
+
+    ctx.baseline = {}
+    if ctx.compare:
+        with open(ctx.compare) as f:
+            ctx.baseline = {result_key(r): r for r in json.load(f)["results"]}
+
+    results = asyncio.get_event_loop().run_until_complete(run(ctx))
+    if ctx.output:
+        report = {
+            "meta": {
+                "aioredis": aioredis.__version__,
+                "python": platform.python_version(),
+                "implementation": platform.python_implementation(),
+                "platform": platform.platform(),
+                "hiredis": HIREDIS_AVAILABLE,
+                "redis_url": ctx.redis_url,
+                "fake_server": ctx.fake_server,
+                "fake_latency": ctx.fake_latency,
+                "time": time.time(),
+            },
+            "results": results,
+        }
+        with open(ctx.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))